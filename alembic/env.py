@@ -1,6 +1,7 @@
 from __future__ import with_statement
 
 import os
+import re
 from logging.config import fileConfig
 
 from alembic import context
@@ -22,6 +23,8 @@ fileConfig(config.config_file_name)
 
 from app.models.checks import Base  # noqa
 
+PARTITION_NAME = re.compile(r'^(checks|items)_(\d{4}_\d{2}|default)$')
+
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -30,6 +33,20 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names):
+    # The check partitions are maintained by app/infra/partitions.py, only their parent tables are compared
+    if type_ == 'table':
+        return not PARTITION_NAME.match(name)
+    return True
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Postgres backs a foreign key referencing a partitioned table with a constraint per partition
+    if type_ == 'foreign_key_constraint' and reflected:
+        return not PARTITION_NAME.match(object.referred_table.name)
+    return True
+
+
 def get_url():
     return 'postgresql://{PGUSER}:{PGPASSWORD}@{PGHOST}:{PGPORT}/{PGDATABASE}'.format(**os.environ)
 
@@ -48,7 +65,8 @@ def run_migrations_offline():
     """
     url = get_url()
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True
+        url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True,
+        include_name=include_name, include_object=include_object
     )
 
     with context.begin_transaction():
@@ -70,7 +88,8 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata, compare_type=True
+            connection=connection, target_metadata=target_metadata, compare_type=True,
+            include_name=include_name, include_object=include_object
         )
 
         with context.begin_transaction():
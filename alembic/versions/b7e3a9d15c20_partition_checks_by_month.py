@@ -0,0 +1,136 @@
+"""Partition checks by month
+
+Revision ID: b7e3a9d15c20
+Revises: 8f2b6d0c4e91
+Create Date: 2025-03-07 15:22:09.417356
+
+"""
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3a9d15c20'
+down_revision = '8f2b6d0c4e91'
+branch_labels = None
+depends_on = None
+
+PARTITIONS_AHEAD = 3  # months created ahead of the current one, the application keeps creating them afterwards
+CHECK_COLUMNS = ('id', 'creator_id', 'payment_method', 'paid_amount', 'total_amount', 'change', 'additional_info',
+                 'repr', 'created_at')
+ITEM_COLUMNS = ('id', 'check_id', 'title', 'price', 'quantity', 'amount', 'created_at')
+CHECK_INDEXES = (
+    ('idx_checks_creator_payment_method_date', ['creator_id', 'payment_method', 'created_at']),
+    ('idx_checks_creator_total_amount_date', ['creator_id', 'total_amount', 'created_at']),
+    ('idx_checks_creator_total_amount_date_payment_method', ['creator_id', 'total_amount', 'created_at',
+                                                             'payment_method']),
+    ('ix_checks_payment_method', ['payment_method']),
+    ('ix_checks_total_amount', ['total_amount']),
+    ('idx_checks_creator_date_id', ['creator_id', 'created_at', 'id']),
+)
+
+
+def create_checks_table(name, *constraints, **kwargs):
+    op.create_table(name,
+    sa.Column('creator_id', sa.Uuid(), nullable=False),
+    sa.Column('payment_method', postgresql.ENUM('CASH', 'CREDIT_CARD', name='payment_method_enum',
+                                                create_type=False), nullable=False),
+    sa.Column('paid_amount', sa.DECIMAL(precision=10, scale=2), nullable=False),
+    sa.Column('total_amount', sa.DECIMAL(precision=10, scale=2), nullable=False),
+    sa.Column('change', sa.DECIMAL(precision=10, scale=2), nullable=False),
+    sa.Column('additional_info', sa.String(length=512), nullable=True),
+    sa.Column('repr', sa.String(), nullable=True),
+    sa.Column('id', sa.Uuid(), server_default=sa.text('uuid_generate_v4()'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['creator_id'], ['users.id'], name='checks_creator_id_fkey', ondelete='CASCADE'),
+    *constraints,
+    **kwargs
+    )
+
+
+def create_items_table(name, *constraints, **kwargs):
+    op.create_table(name,
+    sa.Column('check_id', sa.Uuid(), nullable=False),
+    sa.Column('title', sa.String(length=512), nullable=False),
+    sa.Column('price', sa.DECIMAL(precision=10, scale=2), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.DECIMAL(precision=10, scale=2), nullable=False),
+    sa.Column('id', sa.Uuid(), server_default=sa.text('uuid_generate_v4()'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    *constraints,
+    **kwargs
+    )
+
+
+def copy_rows(source, target, columns, select_columns=None, joins=''):
+    op.execute(f'INSERT INTO {target} ({", ".join(columns)}) '
+               f'SELECT {", ".join(select_columns or columns)} FROM {source} {joins}')
+
+
+def swap_tables(old_table, new_table):
+    op.drop_table(old_table)
+    op.rename_table(new_table, old_table)
+    op.execute(f'ALTER TABLE {old_table} RENAME CONSTRAINT {new_table}_pkey TO {old_table}_pkey')
+
+
+def add_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def create_partitions():
+    '''
+    Monthly partitions (UTC) from the month of the oldest check up to the months ahead, and the default partitions
+    catching the rows out of their bounds
+    '''
+    now = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    oldest = op.get_bind().execute(sa.text(
+        "SELECT date_trunc('month', min(created_at) AT TIME ZONE 'UTC') FROM checks")).scalar()
+    month, last = min(oldest or now, now), now
+    for _ in range(PARTITIONS_AHEAD):
+        last = add_month(last)
+    while month <= last:
+        for table in ('checks', 'items'):
+            op.execute(f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table}_partitioned "
+                       f"FOR VALUES FROM ('{month:%Y-%m-%d}+00') TO ('{add_month(month):%Y-%m-%d}+00')")
+        month = add_month(month)
+    for table in ('checks', 'items'):
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table}_partitioned DEFAULT')
+
+
+def upgrade():
+    # Items take the creation time of their check, which makes them share its partition and references it
+    # along with the ID. The tables are rewritten, plan for a maintenance window on the large databases
+    create_checks_table('checks_partitioned', sa.PrimaryKeyConstraint('id', 'created_at'),
+                        postgresql_partition_by='RANGE (created_at)')
+    create_items_table('items_partitioned', sa.PrimaryKeyConstraint('id', 'created_at'),
+                       sa.ForeignKeyConstraint(['check_id', 'created_at'], ['checks_partitioned.id',
+                                                                            'checks_partitioned.created_at'],
+                                               name='items_check_id_created_at_fkey', ondelete='CASCADE',
+                                               onupdate='CASCADE'),
+                       postgresql_partition_by='RANGE (created_at)')
+    create_partitions()
+    copy_rows('checks', 'checks_partitioned', CHECK_COLUMNS)
+    copy_rows('items', 'items_partitioned', ITEM_COLUMNS, [f'items.{column}' for column in ITEM_COLUMNS[:-1]] + [
+        'checks.created_at'], 'JOIN checks ON checks.id = items.check_id')
+    swap_tables('items', 'items_partitioned')
+    swap_tables('checks', 'checks_partitioned')
+    for name, columns in CHECK_INDEXES:
+        op.create_index(name, 'checks', columns, unique=False)
+    op.create_index('idx_items_check_date', 'items', ['check_id', 'created_at'], unique=False)
+    op.execute('ANALYZE checks, items')
+
+
+def downgrade():
+    # The partitions are dropped along with the tables, the archived ones (see app/infra/partitions.py) are kept
+    create_checks_table('checks_unpartitioned', sa.PrimaryKeyConstraint('id'))
+    create_items_table('items_unpartitioned', sa.PrimaryKeyConstraint('id'),
+                       sa.ForeignKeyConstraint(['check_id'], ['checks_unpartitioned.id'], name='items_check_id_fkey',
+                                               ondelete='CASCADE'))
+    copy_rows('checks', 'checks_unpartitioned', CHECK_COLUMNS)
+    copy_rows('items', 'items_unpartitioned', ITEM_COLUMNS)
+    swap_tables('items', 'items_unpartitioned')
+    swap_tables('checks', 'checks_unpartitioned')
+    for name, columns in CHECK_INDEXES:
+        op.create_index(name, 'checks', columns, unique=False)
@@ -1,11 +1,99 @@
 
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime
 from uuid import UUID
 
-from fastapi import Request
+from fastapi import Request, Response
 from pydantic import AnyHttpUrl
 from pydantic_core import Url
+from starlette import status
 
 
 def get_response_url(request: Request, id: UUID) -> AnyHttpUrl:
     path = request.app.url_path_for('get_check_text_repr_by_id', id=id)
     return AnyHttpUrl(str(request.base_url.replace(path=str(path))))
+
+
+CHECK_MAX_AGE = int(os.getenv('CHECK_MAX_AGE', 86400))
+
+
+def json_response(content: bytes, response: Response, status_code: int = status.HTTP_200_OK) -> Response:
+    '''
+    Response of the already serialized JSON, which FastAPI neither validates nor serializes again. It keeps the headers
+    (and cookies) set by the dependencies on their response, which FastAPI only copies into the responses it builds
+    '''
+    serialized_response = Response(content=content, status_code=status_code, media_type='application/json')
+    serialized_response.raw_headers.extend(response.headers.raw)
+    return serialized_response
+
+
+def validator_headers(etag: str, last_modified: datetime, cache_control: str) -> dict[str, str]:
+    return {
+        'ETag': etag,
+        'Last-Modified': format_datetime(last_modified.astimezone(timezone.utc), usegmt=True),
+        'Cache-Control': cache_control,
+    }
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    '''
+    Whether the If-None-Match header matches the ETag, with the weak comparison required for GET requests
+    '''
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def quality_values(header: str) -> list[tuple[str, float]]:
+    '''
+    The elements of an Accept or Accept-Encoding header, lowercased and without their parameters, with their quality
+    values: 1 when not given, 0 when invalid
+    '''
+    values = []
+    for element in header.split(','):
+        value, *params = [part.strip() for part in element.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, param_value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    quality = 0.0
+        values.append((value.lower(), quality))
+    return values
+
+
+def negotiate(accept: str, media_types: list[str]) -> str | None:
+    '''
+    The media type preferred by the Accept header among the available ones (the first of them by default), following
+    the quality values and the specificity of the ranges. None when the client accepts none of them
+    '''
+    if not accept.strip():
+        return media_types[0]
+    media_ranges = quality_values(accept)
+    best, best_rank = None, (0.0, 0, 0)
+    for index, media_type in enumerate(media_types):
+        type_, _, _ = media_type.partition('/')
+        quality, specificity = 0.0, -1
+        for range_, range_quality in media_ranges:
+            range_specificity = {media_type: 2, f'{type_}/*': 1, '*/*': 0}.get(range_, -1)
+            if range_specificity > specificity:  # the most specific range applies
+                specificity, quality = range_specificity, range_quality
+        rank = (quality, specificity, -index)
+        if quality > 0 and (best is None or rank > best_rank):
+            best, best_rank = media_type, rank
+    return best
+
+
+def accepts_gzip(request: Request) -> bool:
+    '''
+    Whether the Accept-Encoding header lists gzip, unless with the quality value of zero, which refuses it
+    '''
+    for coding, quality in quality_values(request.headers.get('accept-encoding', '')):
+        if coding == 'gzip':
+            return quality > 0
+    return False
@@ -1,12 +1,14 @@
 from typing import cast
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi_pagination import Page, Params
 from sqlalchemy.orm import Session
 from starlette import status
 
 from app.infra.database import get_db
+from app.infra.enums import CountStrategy
+from app.infra.pagination import COUNT_DESCRIPTION
 from app.repositories import check
 from app.repositories import user as user_repo
 from app.schemas import user
@@ -27,8 +29,10 @@ def get_user_by_id(id: UUID, db: Session = Depends(get_db),
 @router.get('/users', status_code=status.HTTP_200_OK)
 def get_all_users(db: Session = Depends(get_db),
                   fake_valitaton: None = Depends(admin_token),
-                  pagination_params: Params = Depends()) -> Page[user.UserResponse]:
-    return cast(Page[user.UserResponse], user_repo.get_all(db, pagination_params))
+                  pagination_params: Params = Depends(),
+                  count: CountStrategy = Query(CountStrategy.EXACT, description=COUNT_DESCRIPTION)
+                  ) -> Page[user.UserResponse]:
+    return cast(Page[user.UserResponse], user_repo.get_all(db, pagination_params, count))
 
 
 @router.delete('/users/{id}', status_code=status.HTTP_200_OK)
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from app.infra.database import get_db
-from app.models import users
+from app.infra.database import get_async_db
+from app.repositories import async_user as user_repo
 from app.services import auth
 from app.services.hashing import Hash
 
@@ -14,16 +14,13 @@ router = APIRouter(
 
 
 @router.post('/login')
-def login(request: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
-          ) -> dict[str, str]:
+async def login(request: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
+                ) -> dict[str, str]:
     '''
     Login with the user's username (login) and password to obtain an access token
     '''
-    user = db.query(users.User).filter(users.User.login == request.username.lower()).first()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f'There is no user with such login: {request.username}')
-    if not Hash.verify(user.password, request.password):
+    user = await user_repo.get_by_login(request.username, db)
+    if not await Hash.verify(user.password, request.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail=f'Invalid password for user with login: {request.username}')
 
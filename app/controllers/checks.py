@@ -1,22 +1,33 @@
-from datetime import date
+import json
+from datetime import date, datetime
 from decimal import Decimal
-from typing import cast
+from html import escape
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi_pagination import Page, Params
-from sqlalchemy.orm import Session
+from fastapi_pagination.cursor import CursorPage, CursorParams
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, with_expression
 from starlette import status
 
-from app.controllers import get_response_url
-from app.infra.database import get_db
-from app.infra.enums import PaymentMethod
+from app.controllers import (
+    CHECK_MAX_AGE, accepts_gzip, get_response_url, is_not_modified, json_response, negotiate, validator_headers
+)
+from app.infra.database import get_async_db, get_db, routed_session
+from app.infra.enums import CountStrategy, ExportFormat, PaymentMethod, StatsPeriod
+from app.infra.pagination import COUNT_DESCRIPTION
+from app.infra.request_stats import phase, query_budget
+from app.models.checks import Check
 from app.models.users import User
-from app.repositories import check as check_repo
+from app.repositories import async_check as check_repo
+from app.repositories.check import FINGERPRINT
 from app.schemas import check
+from app.schemas.user import Principal
+from app.services import check_export, check_ingestion, check_renderers, check_serializer, check_texts
 from app.services.auth import get_current_user
-from app.services.check_builder import built_text_representation
 
 router = APIRouter(
     prefix='/checks',
@@ -24,65 +35,184 @@ router = APIRouter(
 )
 
 
-@router.post('', status_code=status.HTTP_201_CREATED)
-def create_check(request: check.CreateCheckRequest, fastapi_request: Request,
-                 response: Response, db: Session = Depends(get_db),
-                 current_user: User = Depends(get_current_user)) -> check.CheckResponse:
+@router.post('', status_code=status.HTTP_201_CREATED, response_model=check.CheckResponse)
+async def create_check(request: check.CreateCheckRequest, fastapi_request: Request,
+                       response: Response, db: AsyncSession = Depends(get_async_db),
+                       current_user: Principal = Depends(get_current_user)) -> Response:
     '''
     Create a new check
     '''
-    schema = check.CreateCheck(**request.model_dump(), creator_id=current_user.id)
+    schema = check.CreateCheck(**request.model_dump(), creator_id=current_user.id, creator_name=current_user.name)
     # TODO: consider validation for cases when change is less than zero
-    new_check = check_repo.create(db, schema)
+    new_check = await check_repo.create(db, schema)
     response.headers['X-Check-Text-Link'] = jsonable_encoder(get_response_url(fastapi_request, new_check.id))
-    return check.CheckResponse.model_validate(new_check)
-
+    return json_response(check_serializer.dump_check(new_check), response, status.HTTP_201_CREATED)
 
-@router.get('/own', status_code=status.HTTP_200_OK)
-def get_own_checks(db: Session = Depends(get_db),
-                   current_user: User = Depends(get_current_user),
-                   pagination_params: Params = Depends(),
-                   period_start: date = Query(None, description='Filter by check creation date start (included)',
-                                              examples=['2025-02-14']),
-                   period_end: date = Query(None, description='Filter by check creation date end (included)',
-                                            examples=['2025-04-15']),
-                   total_amount_ge: Decimal = Query(None, description='Filter by total amount (greater or equal)',
-                                                    examples=['149.99']),
-                   total_amount_le: Decimal = Query(None, description='Filter by total amount (less or equal)',
-                                                    examples=['500.00']),
 
-                   payment_method: PaymentMethod = Query(None, description='Filter by payment method')
-                   ) -> Page[check.CheckResponse]:
+# The statements of the bulk creation and the export grow with the number of chunks and batches by design
+@router.post('/bulk', status_code=status.HTTP_200_OK, openapi_extra={'requestBody': {'required': True, 'content': {
+    'application/json': {'schema': {'type': 'array', 'items': {'$ref': '#/components/schemas/CreateCheckRequest'}}},
+    check_ingestion.NDJSON_MEDIA_TYPE: {'schema': {'$ref': '#/components/schemas/CreateCheckRequest'}},
+}}}, dependencies=[Depends(query_budget(0))])
+async def create_checks_bulk(request: Request, db: Session = Depends(get_db),
+                             current_user: Principal = Depends(get_current_user)) -> check.BulkCreateChecksResponse:
     '''
-    Retrieve all checks for the current user
+    Create many checks at once from a JSON array or an NDJSON stream (one check per line).
+    Valid checks are persisted even if some others fail, the outcome is reported for each check
     '''
-    filters = check.CheckFilters(
+    return await check_ingestion.ingest(check_ingestion.read_records(request), current_user, db)
+
+
+def get_check_filters(period_start: date = Query(None, description='Filter by check creation date start (included)',
+                                                 examples=['2025-02-14']),
+                      period_end: date = Query(None, description='Filter by check creation date end (included)',
+                                               examples=['2025-04-15']),
+                      total_amount_ge: Decimal = Query(None, description='Filter by total amount (greater or equal)',
+                                                       examples=['149.99']),
+                      total_amount_le: Decimal = Query(None, description='Filter by total amount (less or equal)',
+                                                       examples=['500.00']),
+
+                      payment_method: PaymentMethod = Query(None, description='Filter by payment method')
+                      ) -> check.CheckFilters:
+    return check.CheckFilters(
         period_start=period_start,
         period_end=period_end,
         total_amount_ge=total_amount_ge,
         total_amount_le=total_amount_le,
         payment_method=payment_method,
     )
-    return cast(Page[check.CheckResponse], check_repo.get_all_by_user(db, current_user.id, pagination_params, filters))
 
 
-@router.get('/{id}', status_code=status.HTTP_200_OK)
-def get_check_by_id(id: UUID, request: Request, response: Response, db: Session = Depends(get_db),
-                    current_user: User = Depends(get_current_user)) -> check.CheckResponse:
+@router.get('/own', status_code=status.HTTP_200_OK, response_model=Page[check.CheckResponse])
+async def get_own_checks(response: Response, db: AsyncSession = Depends(get_async_db),
+                         current_user: Principal = Depends(get_current_user),
+                         pagination_params: Params = Depends(),
+                         filters: check.CheckFilters = Depends(get_check_filters),
+                         count: CountStrategy = Query(CountStrategy.EXACT, description=COUNT_DESCRIPTION)
+                         ) -> Response:
+    '''
+    Retrieve all checks for the current user
+    '''
+    page = await check_repo.get_all_by_user(db, current_user.id, pagination_params, filters, count)
+    return json_response(check_serializer.dump_page(page), response)
+
+
+@router.get('/own/cursor', status_code=status.HTTP_200_OK, response_model=CursorPage[check.CheckResponse])
+async def get_own_checks_by_cursor(response: Response, db: AsyncSession = Depends(get_async_db),
+                                   current_user: Principal = Depends(get_current_user),
+                                   pagination_params: CursorParams = Depends(),
+                                   filters: check.CheckFilters = Depends(get_check_filters),
+                                   include_total: bool = Query(False, description='Count the total number of checks')
+                                   ) -> Response:
+    '''
+    Retrieve the checks for the current user newest first, paging with the returned next/previous page cursors.
+    Unlike offset pagination, deep pages are as fast as the first one
+    '''
+    page = await check_repo.get_keyset_page_by_user(db, current_user.id, pagination_params, filters, include_total)
+    return json_response(check_serializer.dump_page(page), response)
+
+
+@router.get('/own/stats', status_code=status.HTTP_200_OK)
+async def get_own_checks_stats(db: AsyncSession = Depends(get_async_db),
+                               current_user: Principal = Depends(get_current_user),
+                               filters: check.CheckFilters = Depends(get_check_filters),
+                               period: StatsPeriod = Query(StatsPeriod.DAY, description='Group the totals by day '
+                                                                                        '(UTC), month or for the '
+                                                                                        'whole time'),
+                               by_payment_method: bool = Query(False, description='Group the totals by payment method')
+                               ) -> list[check.CheckStatsResponse]:
+    '''
+    Retrieve the revenue, number of checks, average basket and change given for the current user
+    '''
+    return await check_repo.get_stats(db, current_user.id, filters, period, by_payment_method)
+
+
+@router.get('/own/export', status_code=status.HTTP_200_OK, response_class=StreamingResponse, responses={
+    status.HTTP_200_OK: {'content': {media_type: {} for media_type in check_export.MEDIA_TYPES.values()}}},
+    dependencies=[Depends(query_budget(0))])
+async def export_own_checks(request: Request, current_user: Principal = Depends(get_current_user),
+                            filters: check.CheckFilters = Depends(get_check_filters),
+                            format: ExportFormat = Query(ExportFormat.NDJSON, description='One check per line '
+                                                         '(NDJSON) or one check item per row (CSV)')
+                            ) -> StreamingResponse:
+    '''
+    Export all the checks for the current user oldest first, streamed as they are read from the DB.
+    Gzip compressed for the clients accepting it
+    '''
+    compress = accepts_gzip(request)
+    headers = {'Content-Disposition': f'attachment; filename="checks.{check_export.FILE_EXTENSIONS[format]}"',
+               'Vary': 'Accept-Encoding'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(check_export.export_checks(request, current_user.id, filters, format, compress),
+                             media_type=check_export.MEDIA_TYPES[format], headers=headers)
+
+
+TEXTS_BATCH_MEDIA_TYPES = [check_renderers.HTML_MEDIA_TYPE, check_ingestion.NDJSON_MEDIA_TYPE]
+
+
+@router.post('/text:batch', status_code=status.HTTP_200_OK, responses={
+    status.HTTP_200_OK: {'content': {media_type: {} for media_type in TEXTS_BATCH_MEDIA_TYPES}},
+    status.HTTP_406_NOT_ACCEPTABLE: {"description": "None of the formats is accepted"},
+})
+async def get_check_texts_batch(request: check.CheckTextsRequest, fastapi_request: Request) -> Response:
+    '''
+    Retrieve the textual representations of many checks at once, as a single HTML document in the requested order,
+    or as NDJSON (one check per line) when requested by the Accept header
+    '''
+    ids = list(dict.fromkeys(request.ids))
+    if len(ids) > check_texts.CHECK_TEXTS_BATCH_LIMIT:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f'No more than {check_texts.CHECK_TEXTS_BATCH_LIMIT} checks are accepted '
+                                   'per request')
+    media_type = negotiate(fastapi_request.headers.get('accept', ''), TEXTS_BATCH_MEDIA_TYPES)
+    if media_type is None:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                            detail=f'Available formats: {", ".join(TEXTS_BATCH_MEDIA_TYPES)}')
+    # A read despite the method, the only write is the idempotent backfill of the missing texts, hence the session
+    # doesn't pin the client to the primary
+    async with await routed_session(fastapi_request) as db:
+        texts = await load_check_texts(ids, db)
+    if media_type == check_ingestion.NDJSON_MEDIA_TYPE:
+        return Response(content=''.join(json.dumps({'id': str(id), 'etag': texts[id].etag,
+                                                    'content': texts[id].content.decode()}) + '\n' for id in ids),
+                        media_type=check_ingestion.NDJSON_MEDIA_TYPE)
+    return Response(content=''.join(f'<pre>{escape(texts[id].content.decode())}</pre>\n' for id in ids),
+                    media_type=check_renderers.CONTENT_TYPES[check_renderers.HTML_MEDIA_TYPE])
+
+
+@router.get('/{id}', status_code=status.HTTP_200_OK, response_model=check.CheckResponse)
+async def get_check_by_id(id: UUID, request: Request, response: Response,
+                          db: AsyncSession = Depends(get_async_db),
+                          current_user: Principal = Depends(get_current_user)) -> Response:
     '''
     Retrieve a specific check by its ID
     '''
-    response.headers['X-Check-Text-Link'] = jsonable_encoder(get_response_url(request, id))
-    return check.CheckResponse.model_validate(check_repo.get_by_id(db, id))
+    if request.headers.get('if-none-match'):
+        fingerprint, created_at = await check_repo.get_fingerprint(db, id)
+        headers = check_headers(request, id, fingerprint, created_at)
+        if is_not_modified(request, headers['ETag']):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    existing_check = await check_repo.get_by_id(db, id, with_expression(Check.fingerprint, FINGERPRINT))
+    response.headers.update(check_headers(request, id, existing_check.fingerprint, existing_check.created_at))
+    return json_response(check_serializer.dump_check(existing_check), response)
+
+
+def check_headers(request: Request, id: UUID, fingerprint: str, created_at: datetime) -> dict[str, str]:
+    headers = validator_headers(f'"{id.hex}-{fingerprint}"', created_at, f'private, max-age={CHECK_MAX_AGE}')
+    headers['X-Check-Text-Link'] = jsonable_encoder(get_response_url(request, id))
+    return headers
 
 
 @router.get('/{id}/text', responses={
     status.HTTP_200_OK: {
-        "description": "Successful check text representation",
+        "description": "Successful check representation, in the format requested by the Accept header "
+                       "(semantic HTML by default)",
         "content": {
-            "text/html": {
+            check_renderers.HTML_MEDIA_TYPE: {},
+            check_renderers.TEXT_MEDIA_TYPE: {
                 "example":
-                '<pre>Temperature-resistant Weather-resistant '
+                'Temperature-resistant Weather-resistant '
                 '\n           Products 1562 LLC            '
                 '\n========================================'
                 '\n10.00 x 40.52'
@@ -97,20 +227,67 @@ def get_check_by_id(id: UUID, request: Request, response: Response, db: Session
                 '\n========================================'
                 '\n'
                 '            19.02.2025 16:09            \n'
-                '      Thank you for your purchase!      </pre>'
-            }
+                '      Thank you for your purchase!      '
+            },
+            check_renderers.ESCPOS_MEDIA_TYPE: {},
+            check_renderers.PDF_MEDIA_TYPE: {},
         }
-    }
+    },
+    status.HTTP_406_NOT_ACCEPTABLE: {"description": "None of the formats is accepted"},
 })
-def get_check_text_repr_by_id(id: UUID, db: Session = Depends(get_db)) -> Response:
-    '''
-    Retrieve the textual representation of a specific check by its ID
-    '''
-    existing_check = check_repo.get_by_id(db, id)
-    text = existing_check.repr
-    if not text:
-        text = built_text_representation(existing_check)
-        existing_check.repr = text
-        db.add(existing_check)
-        db.commit()
-    return Response(content=f'<pre>{text}</pre>', media_type='text/html; charset=utf-8')
+async def get_check_text_repr_by_id(id: UUID, request: Request) -> Response:
+    '''
+    Retrieve the representation of a specific check by its ID: semantic HTML, plain text, ESC/POS commands for
+    receipt printers or PDF
+    '''
+    media_type = negotiate(request.headers.get('accept', ''), check_renderers.MEDIA_TYPES)
+    if media_type is None:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                            detail=f'Available formats: {", ".join(check_renderers.MEDIA_TYPES)}')
+    # Cache hits are served without a session
+    check_text = check_texts.get_check_text(id, media_type)
+    if check_text is None:
+        check_text = await load_check_text(id, request, media_type)
+    # Not immutable: once stale, the shared caches revalidate it by the ETag, so a deleted check stops being served
+    headers = validator_headers(check_text.etag, check_text.created_at, f'public, max-age={CHECK_MAX_AGE}')
+    headers['Vary'] = 'Accept'
+    if is_not_modified(request, check_text.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=check_text.content,
+                    media_type=check_renderers.CONTENT_TYPES.get(media_type, media_type), headers=headers)
+
+
+async def load_check_text(id: UUID, request: Request, media_type: str) -> check_texts.CheckText:
+    async with await routed_session(request) as db:
+        try:
+            content, created_at = await render_check_text(db, id, media_type)
+        except HTTPException as e:
+            # The route is anonymous, so its reads aren't pinned to the primary after the creation of the check,
+            # which the replica may not have replayed yet
+            if e.status_code != status.HTTP_404_NOT_FOUND or db.info.get('replica') is None:
+                raise
+            await db.rollback()
+            db.info['replica'] = None
+            content, created_at = await render_check_text(db, id, media_type)
+    check_text = check_texts.build_check_text(id, content, created_at)
+    check_texts.cache_check_text(id, check_text, media_type)
+    return check_text
+
+
+async def render_check_text(db: AsyncSession, id: UUID, media_type: str) -> tuple[bytes, datetime]:
+    if render_check := check_renderers.CHECK_RENDERERS.get(media_type):
+        selected_check = await check_repo.get_by_id(db, id, joinedload(Check.creator).load_only(User.name))
+        with phase('render'):
+            return render_check(selected_check), selected_check.created_at
+    text, created_at = await check_repo.get_text_by_id(db, id)
+    with phase('render'):
+        return check_renderers.TEXT_RENDERERS[media_type](text), created_at
+
+
+async def load_check_texts(ids: list[UUID], db: AsyncSession) -> dict[UUID, check_texts.CheckText]:
+    texts = {id: check_text for id in ids if (check_text := check_texts.get_check_text(id))}
+    if missing_ids := [id for id in ids if id not in texts]:
+        for id, (text, created_at) in (await check_repo.get_texts_by_ids(db, missing_ids)).items():
+            texts[id] = check_texts.build_check_text(id, check_renderers.render_plain_text(text), created_at)
+            check_texts.cache_check_text(id, texts[id])
+    return texts
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from starlette import status
 
-from app.infra.database import get_db
+from app.infra.database import get_async_db
 from app.models.users import User
-from app.repositories import user as user_repo
+from app.repositories import async_user as user_repo
 from app.schemas import user
 from app.services.auth import get_current_user
 
@@ -15,17 +16,20 @@ router = APIRouter(
 
 
 @router.post('', status_code=status.HTTP_201_CREATED)
-def create_user(request: user.CreateUserRequest, db: Session = Depends(get_db)) -> user.UserResponse:
+async def create_user(request: user.CreateUserRequest,
+                      db: AsyncSession = Depends(get_async_db)) -> user.UserResponse:
     '''
     Register a new user
     '''
-    return user.UserResponse.model_validate(user_repo.create(request, db))
+    return user.UserResponse.model_validate(await user_repo.create(request, db))
 
 
 @router.get('/profile', status_code=status.HTTP_200_OK)
-def get_current_user_profile(db: Session = Depends(get_db),
-                             current_user: User = Depends(get_current_user)) -> user.UserResponseWithChecks:
+async def get_current_user_profile(db: AsyncSession = Depends(get_async_db),
+                                   current_user: user.Principal = Depends(get_current_user)
+                                   ) -> user.UserResponseWithChecks:
     '''
     Retrieve the current user's registration data and checks
     '''
-    return user.UserResponseWithChecks.model_validate(user_repo.get_by_id(current_user.id, db))
+    return user.UserResponseWithChecks.model_validate(
+        await user_repo.get_by_id(current_user.id, db, selectinload(User.checks)))
@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Generic, Hashable, Protocol, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+K_contra = TypeVar('K_contra', bound=Hashable, contravariant=True)
+V = TypeVar('V')
+
+
+class CacheBackend(Protocol[K_contra, V]):
+    '''
+    Interface of the application caches, so that a shared cache can replace the in-process one
+    '''
+    def get(self, key: K_contra) -> V | None:
+        '''
+        The cached value, none if it's missing or expired
+        '''
+
+    def set(self, key: K_contra, value: V) -> None:
+        '''
+        Cache the value, the backend may evict it at any time
+        '''
+
+    def delete(self, key: K_contra) -> None:
+        '''
+        Invalidate the value
+        '''
+
+    def clear(self) -> None:
+        '''
+        Invalidate all values
+        '''
+
+
+class LRUCache(Generic[K, V]):
+    '''
+    Thread-safe in-process LRU cache with an optional per-entry TTL (in seconds).
+    The maxsize bounds the number of entries, or their total weight (i.e. bytes) when a weigher is given.
+    A cache with the maxsize of zero stores nothing, which allows disabling it via configuration
+    '''
+    def __init__(self, maxsize: int, ttl: float | None = None, weigher: Callable[[V], int] | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigher = weigher or (lambda value: 1)
+        self.weight = 0
+        self._entries: OrderedDict[K, tuple[float, int, V]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        weight = self.weigher(value)
+        if weight > self.maxsize:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (expires_at, weight, value)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+    def _pop(self, key: K) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[1]
@@ -1,14 +1,53 @@
 # import logging
+import asyncio
+import io
+import itertools
 import os
+import time
 from contextlib import contextmanager
-from typing import Generator
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Generator, Iterator
+from uuid import UUID, uuid4
 
-from sqlalchemy import MetaData, create_engine
-from sqlalchemy.orm import Session, scoped_session, sessionmaker
+import psycopg2
+from fastapi import Request
+from sqlalchemy import Engine, MetaData, Table, create_engine, event, make_url, text
+from sqlalchemy.engine import Connection, ExceptionContext
+from sqlalchemy.exc import DBAPIError, TimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, NullPool, QueuePool
 
+from app.infra.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_WAIT, DB_POOL_OVERFLOW, DB_POOL_TIMEOUTS
+from app.infra.query_plans import log_slow_queries
 
-def get_db_url() -> str:
-    return 'postgresql://%s:%s@%s:%s/%s' % (
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 80))
+DB_SYNC_CONNECTIONS = int(os.getenv('DB_SYNC_CONNECTIONS', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_EXTERNAL_POOLER = os.getenv('DB_EXTERNAL_POOLER', 'false').lower() == 'true'
+DB_REPLICA_URLS = [url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()]
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 1))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 1))
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Seconds the replica is behind the primary, none when it has replayed everything it has received. NULL when it
+# hasn't replayed any transaction yet, i.e. right after it has started, so its lag is unknown
+REPLICA_LAG = text('''
+    SELECT CASE WHEN pg_is_in_recovery() AND pg_last_wal_receive_lsn() IS DISTINCT FROM pg_last_wal_replay_lsn()
+    THEN extract(epoch FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END
+''')
+# The pins of the principals to the primary (see pin_primary), kept in the primary_pins table of the primary
+PIN_PRIMARY = text('''
+    INSERT INTO primary_pins (id, pinned_until) VALUES (:id, now() + make_interval(secs => :seconds))
+    ON CONFLICT (id) DO UPDATE SET pinned_until = excluded.pinned_until
+''')
+IS_PINNED = text('SELECT pinned_until > now() FROM primary_pins WHERE id = :id')
+
+
+def get_db_url(driver: str = 'postgresql') -> str:
+    return driver + '://%s:%s@%s:%s/%s' % (
         os.getenv('PGUSER', 'postgres'),
         os.getenv('PGPASSWORD', 'password'),
         os.getenv('PGHOST', 'localhost'),
@@ -17,7 +56,162 @@ def get_db_url() -> str:
     )
 
 
-engine = create_engine(get_db_url(), pool_size=500, max_overflow=0, pool_pre_ping=True)
+def pool_sizes(max_connections: int, workers: int, sync_connections: int) -> tuple[int, int]:
+    '''
+    Split the connections the application may open, across all the workers, into the per worker limits
+    of the sync and async engines
+    '''
+    worker_connections = max(max_connections // workers, 2)
+    sync = max(min(sync_connections, worker_connections // 2), 1)
+    return sync, worker_connections - sync
+
+
+class InstrumentedQueuePool(QueuePool):
+    '''
+    Reports the time checkouts wait for a connection, the checkouts timed out and the connections in use
+    '''
+    label = 'sync'
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.label).observe(time.perf_counter() - started)
+        DB_POOL_CHECKED_OUT.labels(self.label).inc()
+        DB_POOL_OVERFLOW.labels(self.label).set(max(self.overflow(), 0))
+        return connection
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        DB_POOL_CHECKED_OUT.labels(self.label).dec()
+        DB_POOL_OVERFLOW.labels(self.label).set(max(self.overflow(), 0))
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    label = 'async'
+
+
+class InstrumentedReplicaQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    label = 'replica'
+
+
+def pool_args(connections: int, poolclass: type[QueuePool]) -> dict[str, Any]:
+    if DB_EXTERNAL_POOLER:
+        # Connections are pooled by the external pooler (i.e. PgBouncer), so each checkout takes a new one from it
+        return {'poolclass': NullPool}
+    # Half of the connections is kept open, the rest is opened for the load spikes and closed once returned
+    pool_size = max(connections // 2, 1)
+    return {'poolclass': poolclass, 'pool_size': pool_size, 'max_overflow': connections - pool_size,
+            'pool_timeout': DB_POOL_TIMEOUT, 'pool_pre_ping': True}
+
+
+# Transaction pooling may hand each transaction to another server connection, so asyncpg must not rely
+# on the statements prepared (and named) on the previous one
+ASYNCPG_POOLER_ARGS: dict[str, Any] = {'statement_cache_size': 0, 'prepared_statement_cache_size': 0,
+                                       'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__'}
+
+# Sized after the connections budget rather than the expected concurrency: the requests beyond the pool capacity
+# wait for a connection (up to DB_POOL_TIMEOUT), instead of every worker opening as many as Postgres accepts
+SYNC_CONNECTIONS, ASYNC_CONNECTIONS = pool_sizes(DB_MAX_CONNECTIONS, WEB_CONCURRENCY, DB_SYNC_CONNECTIONS)
+engine = create_engine(get_db_url(), **pool_args(SYNC_CONNECTIONS, InstrumentedQueuePool))
+# Serves the async endpoints, the sync engine remains for the threadpool code (COPY ingestion, admin panel, utils)
+async_engine = create_async_engine(
+    get_db_url('postgresql+asyncpg'), **pool_args(ASYNC_CONNECTIONS, InstrumentedAsyncQueuePool),
+    connect_args=ASYNCPG_POOLER_ARGS if DB_EXTERNAL_POOLER else {},
+)
+log_slow_queries(engine)
+log_slow_queries(async_engine.sync_engine)
+
+
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    healthy: bool = False
+    checked_at: float = float('-inf')
+
+    async def check(self) -> None:
+        '''
+        Tell whether the replica is reachable and not lagging behind the primary more than allowed
+        '''
+        self.checked_at = time.monotonic()  # set beforehand, so the concurrent requests don't check as well
+        try:
+            async with asyncio.timeout(DB_REPLICA_CHECK_INTERVAL), self.engine.connect() as conn:
+                lag = await conn.scalar(REPLICA_LAG)
+            self.healthy = lag is not None and lag <= DB_REPLICA_MAX_LAG
+        except (DBAPIError, OSError, asyncio.TimeoutError):
+            self.healthy = False
+
+    def on_error(self, context: ExceptionContext) -> None:
+        if context.is_disconnect:
+            self.healthy = False
+
+
+def create_replica(url: str) -> Replica:
+    replica = Replica(create_async_engine(
+        make_url(url).set(drivername='postgresql+asyncpg'),
+        **pool_args(ASYNC_CONNECTIONS, InstrumentedReplicaQueuePool),
+        connect_args={**(ASYNCPG_POOLER_ARGS if DB_EXTERNAL_POOLER else {}), 'timeout': DB_REPLICA_CHECK_INTERVAL},
+    ))
+    # A replica failing amid a request is taken out of the rotation until it's checked again
+    event.listen(replica.engine.sync_engine, 'handle_error', replica.on_error)
+    log_slow_queries(replica.engine.sync_engine)
+    return replica
+
+
+replicas = [create_replica(url) for url in DB_REPLICA_URLS]
+_replica_turns = itertools.count()
+
+
+async def choose_replica() -> Replica | None:
+    '''
+    Next healthy replica in turn, if any. The health of a replica is trusted for DB_REPLICA_CHECK_INTERVAL
+    '''
+    turn = next(_replica_turns)
+    for i in range(len(replicas)):
+        replica = replicas[(turn + i) % len(replicas)]
+        if time.monotonic() - replica.checked_at >= DB_REPLICA_CHECK_INTERVAL:
+            await replica.check()
+        if replica.healthy:
+            return replica
+    return None
+
+
+async def dispose_engines() -> None:
+    await async_engine.dispose()
+    for replica in replicas:
+        await replica.engine.dispose()
+
+
+class RoutingSession(Session):
+    '''
+    Sends the statements to the replica chosen for the session, if any, or to the primary, which they fall back to
+    if the replica goes away
+    '''
+    def get_bind(self, mapper: Any = None, **kw: Any) -> Engine | Connection:
+        replica: Replica | None = self.info.get('replica')
+        if replica is not None:
+            return replica.engine.sync_engine
+        return super().get_bind(mapper, **kw)
+
+    def _execute_internal(self, *args: Any, **kw: Any) -> Any:
+        try:
+            return super()._execute_internal(*args, **kw)
+        except (DBAPIError, OSError) as e:
+            replica: Replica | None = self.info.get('replica')
+            if replica is None or isinstance(e, DBAPIError) and not e.connection_invalidated:
+                raise
+        # The replica has failed amid the request, which is safe (read only), so the statement is repeated on the
+        # primary, as are the next ones. The objects loaded from the replica are detached: their loaded attributes
+        # are kept, yet they can't lazy load or be flushed anymore
+        replica.healthy = False
+        self.info['replica'] = None
+        self.expunge_all()
+        self.rollback()
+        return super()._execute_internal(*args, **kw)
 
 
 metadata = MetaData(naming_convention={
@@ -29,7 +223,12 @@ metadata = MetaData(naming_convention={
 })
 
 
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+# A plain (not thread-scoped) factory: the threadpool runs a request's dependencies and endpoint on arbitrary
+# threads, so a thread-local session would end up shared between concurrent requests
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects aren't expired on commit, since their attributes can't be lazily refreshed outside of an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False,
+                                       sync_session_class=RoutingSession)
 # logger = logging.getLogger(__name__)
 
 
@@ -50,5 +249,118 @@ def session_scope() -> Generator[Session, None, None]:
     yield from session_manager()
 
 
+@dataclass
+class ExecutedStatements:
+    statements: list[str] = field(default_factory=list)
+    rows: int = 0
+
+
+@contextmanager
+def count_statements() -> Iterator[ExecutedStatements]:
+    '''
+    Record every statement executed by the application engines and the number of rows it has fetched, for the tests
+    and the benchmarks
+    '''
+    executed = ExecutedStatements()
+
+    def after_cursor_execute(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        executed.statements.append(statement)
+        if statement.lstrip().upper().startswith('SELECT'):
+            executed.rows += max(cursor.rowcount, 0)
+
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, 'after_cursor_execute', after_cursor_execute)
+    try:
+        yield executed
+    finally:
+        for target in (engine, async_engine.sync_engine):
+            event.remove(target, 'after_cursor_execute', after_cursor_execute)
+
+
+async def pin_primary(session: AsyncSession, principal_id: UUID) -> None:
+    '''
+    Direct the principal's reads to the primary for DB_REPLICA_PIN_SECONDS after a request that may have written, so
+    they read their own writes despite the replication lag. The pin is kept by the primary, hence it holds whichever
+    worker serves the reads, whether the client keeps cookies or not. It's upserted by the session of the request,
+    which is on the primary already
+    '''
+    await session.execute(PIN_PRIMARY, {'id': principal_id, 'seconds': DB_REPLICA_PIN_SECONDS})
+    await session.commit()
+
+
+async def route_principal(session: AsyncSession, principal_id: UUID) -> None:
+    '''
+    Tell the session the principal of the request, once authenticated. Their reads are moved to the primary if they
+    have written lately, and their writes pin them to it when the request succeeds (see get_async_db)
+    '''
+    session.info['principal_id'] = principal_id
+    if session.info.get('replica') is None:
+        return
+    # The pins are unlogged, so not readable on the replica the session is connected to. The lookup takes a primary
+    # connection for its own duration only, hence a request still holds at most one connection of each pool
+    async with async_engine.connect() as conn:
+        pinned = await conn.scalar(IS_PINNED, {'id': principal_id})
+    if pinned:
+        # The principal may have been loaded from the replica already
+        session.expunge_all()
+        await session.rollback()
+        session.info['replica'] = None
+
+
+async def routed_session(request: Request, principal_id: UUID | None = None) -> AsyncSession:
+    '''
+    Session reading from a replica for the safe requests, unless its principal has written lately. The principal
+    is passed by the sessions opened after the authentication, get_current_user routes the dependency one
+    '''
+    session = AsyncSessionLocal()
+    if replicas and request.method in SAFE_METHODS:
+        session.info['replica'] = await choose_replica()
+    if principal_id is not None:
+        await route_principal(session, principal_id)
+    return session
+
+
 def get_db() -> Generator[Session, None, None]:
     yield from session_manager()
+
+
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    session = await routed_session(request)
+    try:
+        yield session
+    except Exception as e:
+        await session.rollback()
+        raise e
+    else:
+        # After the endpoint has committed, yet before the response is sent
+        if replicas and request.method not in SAFE_METHODS and 'principal_id' in session.info:
+            await pin_primary(session, session.info['principal_id'])
+    finally:
+        await session.close()
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return str(value)
+
+
+def copy_rows(db: Session, table: Table, rows: list[dict[str, Any]]) -> None:
+    '''
+    Load the rows (sharing the same keys) into the table with COPY, which is considerably faster than
+    multi-row INSERT statements for large batches
+    '''
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(row[column]) for column in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+    statement = f'COPY {table.name} ({", ".join(columns)}) FROM STDIN'
+    cursor: Any = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except psycopg2.Error as e:  # raised by the raw DBAPI cursor, hence wrapped the same way SQLAlchemy does
+        raise DBAPIError.instance(statement, None, e, psycopg2.Error)
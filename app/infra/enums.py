@@ -4,3 +4,26 @@ from enum import StrEnum
 class PaymentMethod(StrEnum):
     CASH = 'CASH'
     CREDIT_CARD = 'CREDIT_CARD'
+
+
+class CountStrategy(StrEnum):
+    EXACT = 'EXACT'
+    SKIP = 'SKIP'
+    ESTIMATE = 'ESTIMATE'
+    CACHED = 'CACHED'
+
+
+class StatsPeriod(StrEnum):
+    DAY = 'DAY'
+    MONTH = 'MONTH'
+    ALL = 'ALL'
+
+
+class ExportFormat(StrEnum):
+    NDJSON = 'NDJSON'
+    CSV = 'CSV'
+
+
+class QueryBudgetAction(StrEnum):
+    WARN = 'WARN'
+    FAIL = 'FAIL'
@@ -0,0 +1,113 @@
+import os
+import time
+from contextlib import AbstractContextManager
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Any, Callable, TypeVar, cast
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Set for the gunicorn workers (see gunicorn.conf.py), each of them writes its metrics to the files in there and
+# the ones served by any worker are aggregated from all of them. Gauges state how their values are aggregated
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Password hashing
+HASHING_PENDING = Gauge('hashing_pending_operations', 'Password hashing operations queued or running in the pool',
+                        multiprocess_mode='livesum')
+HASHING_REJECTED = Counter('hashing_rejected_operations', 'Password hashing operations rejected by a full pool')
+HASHING_DURATION = Histogram('hashing_duration_seconds', 'Password hashing operation duration', ['operation'])
+
+# DB connection pools, labeled by the engine (sync or async)
+DB_POOL_CHECKOUT_WAIT = Histogram('db_pool_checkout_wait_seconds', 'Time spent waiting for a pool connection',
+                                  ['engine'], buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+DB_POOL_TIMEOUTS = Counter('db_pool_timeouts', 'Checkouts that gave up waiting for a pool connection', ['engine'])
+DB_POOL_CHECKED_OUT = Gauge('db_pool_checked_out_connections', 'Pool connections in use', ['engine'],
+                            multiprocess_mode='livesum')
+DB_POOL_OVERFLOW = Gauge('db_pool_overflow_connections', 'Pool connections open beyond the pool size', ['engine'],
+                         multiprocess_mode='livesum')
+
+# HTTP requests, labeled by the route template rather than the path, so the number of series stays bounded
+HTTP_REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request duration, until the whole response '
+                                  'is sent', ['method', 'route', 'status'])
+HTTP_REQUESTS_IN_PROGRESS = Gauge('http_requests_in_progress', 'HTTP requests being served', ['method'],
+                                  multiprocess_mode='livesum')
+UNMATCHED_ROUTE = '<unmatched>'
+
+# Hot functions
+FUNCTION_DURATION = Histogram('function_duration_seconds', 'Duration of the timed functions', ['function'])
+
+
+def timing_decorator(timer: Callable[[], AbstractContextManager[Any]]) -> Callable[[F], F]:
+    '''
+    Decorator running every call of the decorated function (or coroutine function) within a new context of the timer
+    '''
+    def decorator(fn: F) -> F:
+        if iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with timer():
+                    return await fn(*args, **kwargs)
+            return cast(F, async_wrapper)
+
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with timer():
+                return fn(*args, **kwargs)
+        return cast(F, wrapper)
+    return decorator
+
+
+def timed(name: str) -> Callable[[F], F]:
+    '''
+    Observe the duration of every call of the decorated function (or coroutine function)
+    '''
+    return timing_decorator(FUNCTION_DURATION.labels(name).time)
+
+
+class MetricsMiddleware:
+    '''
+    Request durations and the requests in progress. A plain ASGI middleware, so the streamed responses aren't
+    buffered and are timed until their end
+    '''
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # unless a response is started
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(scope['method'])
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            route = scope.get('route')  # set by the router on the matched one
+            HTTP_REQUEST_DURATION.labels(scope['method'], getattr(route, 'path', UNMATCHED_ROUTE),
+                                         str(status_code)).observe(time.perf_counter() - started)
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    '''
+    The metrics in the text format, of all the workers in the multiprocess mode
+    '''
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=PROMETHEUS_MULTIPROC_DIR)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
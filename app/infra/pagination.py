@@ -0,0 +1,55 @@
+import os
+from typing import Any, Hashable
+
+from fastapi_pagination import Page, Params
+from fastapi_pagination.ext.sqlalchemy import create_paginate_query
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+
+from app.infra.cache import LRUCache
+from app.infra.enums import CountStrategy
+from app.infra.query_plans import explain
+
+COUNT_CACHE_SIZE = int(os.getenv('COUNT_CACHE_SIZE', 10000))
+COUNT_CACHE_TTL = float(os.getenv('COUNT_CACHE_TTL', 30))
+
+COUNT_DESCRIPTION = ('How the total is counted: EXACT, SKIP (no total), ESTIMATE (planner estimate) '
+                     'or CACHED (exact, but reused for the same filters for a while)')
+
+count_cache: LRUCache[Hashable, int] = LRUCache(maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL)
+
+
+def count_exact(db: Session, stmt: Select[Any]) -> int:
+    return db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery())) or 0
+
+
+def count_estimate(db: Session, stmt: Select[Any]) -> int:
+    '''
+    Number of rows the planner expects the statement to return, no rows are actually read
+    '''
+    plan = explain(db, stmt.order_by(None), 'FORMAT JSON')[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count(db: Session, stmt: Select[Any], strategy: CountStrategy, cache_key: Hashable) -> int | None:
+    if strategy is CountStrategy.SKIP:
+        return None
+    if strategy is CountStrategy.ESTIMATE:
+        return count_estimate(db, stmt)
+    if strategy is CountStrategy.CACHED:
+        total = count_cache.get(cache_key)
+        if total is None:
+            total = count_exact(db, stmt)
+            count_cache.set(cache_key, total)
+        return total
+    return count_exact(db, stmt)
+
+
+def paginate(db: Session, stmt: Select[Any], params: Params, strategy: CountStrategy,
+             cache_key: Hashable) -> Page[Any]:
+    '''
+    Offset pagination with a choice of how the total is counted:
+    exactly, not at all, from the planner estimate, or exactly but reused for the same cache key for a while
+    '''
+    items = db.scalars(create_paginate_query(stmt, params)).all()
+    return Page.create(items, params, total=count(db, stmt, strategy, cache_key))
@@ -0,0 +1,95 @@
+'''
+Maintenance of the monthly (UTC) range partitions of the check tables. A partition is named after the table and
+the month it holds, i.e. checks_2025_02, the rows out of the bounds of all of them fall into the default one.
+The partitions are created ahead of time, on the application startup and by utils/partitions.py, and the old ones
+are detached into the archive schema, which keeps them out of the queries, indexes and vacuum of the live tables
+'''
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+PARTITIONS_AHEAD = int(os.getenv('PARTITIONS_AHEAD', 3))
+
+PARTITIONED_TABLES = ('checks', 'items')  # items reference checks, so they are detached in the reverse order
+ARCHIVE_SCHEMA = 'archive'
+MAINTENANCE_LOCK = 0x636865636b  # transaction level advisory lock taken by the workers changing the partitions
+
+
+def month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f'{table}_{month:%Y_%m}'
+
+
+def get_partitions(db: Session, table: str) -> dict[str, datetime]:
+    '''
+    Monthly partitions attached to the table by their names, along with the months they hold
+    '''
+    names = db.scalars(text('SELECT inhrelid::regclass::text FROM pg_inherits '
+                            'WHERE inhparent = CAST(:table AS regclass)'), {'table': table})
+    return {name: datetime.strptime(name[len(table) + 1:], '%Y_%m').replace(tzinfo=timezone.utc)
+            for name in names if name != f'{table}_default'}
+
+
+def create_partitions(db: Session, start: datetime, end: datetime) -> list[str]:
+    '''
+    Create the missing partitions for the months from start to end (inclusive), returns the names of the created ones.
+    A month some rows of which have already fallen into the default partition is skipped, as its partition can't be
+    attached while they are there, and stays served by the default one
+    '''
+    db.execute(select(func.pg_advisory_xact_lock(MAINTENANCE_LOCK)))
+    created = []
+    for table in PARTITIONED_TABLES:
+        existing = get_partitions(db, table)
+        month, last = month_start(start), month_start(end)
+        while month <= last:
+            name, next_month = partition_name(table, month), add_months(month, 1)
+            if name not in existing and not db.scalar(text(
+                    f'SELECT EXISTS (SELECT FROM {table}_default WHERE created_at >= :start AND created_at < :end)'),
+                    {'start': month, 'end': next_month}):
+                db.execute(text(f"CREATE TABLE {name} PARTITION OF {table} "
+                                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"))
+                created.append(name)
+            month = next_month
+    return created
+
+
+def ensure_partitions(db: Session, months_ahead: int = PARTITIONS_AHEAD) -> list[str]:
+    '''
+    Create the partitions of the current month and the months ahead, unless they exist
+    '''
+    month = month_start(datetime.now(timezone.utc))
+    return create_partitions(db, month, add_months(month, months_ahead))
+
+
+def archive_partitions(db: Session, before: datetime) -> list[str]:
+    '''
+    Detach the partitions of the months before the given moment's one and move them to the archive schema,
+    returns their names. The check stats rollups of the archived checks are kept
+    '''
+    db.execute(select(func.pg_advisory_xact_lock(MAINTENANCE_LOCK)))
+    db.execute(text(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}'))
+    archived = []
+    for table in reversed(PARTITIONED_TABLES):
+        for name, month in sorted(get_partitions(db, table).items()):
+            if month >= month_start(before):
+                continue
+            db.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+            # The archived partitions stop referencing the live tables, the items would prevent their checks detaching
+            for constraint in db.scalars(text("SELECT conname FROM pg_constraint "
+                                              "WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"),
+                                         {'name': name}).all():
+                db.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT {constraint}'))
+            db.execute(text(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}'))
+            archived.append(name)
+    return archived
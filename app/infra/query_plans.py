@@ -0,0 +1,87 @@
+'''
+Plans of the statements: EXPLAIN of the ORM statements and of the ones executed by the driver, and the opt-in
+slow query log, which captures the plans of the statements taking longer than SLOW_QUERY_THRESHOLD as they run
+in production. Unlike the auto_explain extension, it needs neither the server configuration nor a superuser
+'''
+import logging
+import os
+import time
+from typing import Any, Sequence
+
+from sqlalchemy import ClauseElement, Engine, event, text
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import PoolProxiedConnection
+
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 0))  # milliseconds, 0 disables the slow query log
+
+# Statements EXPLAIN accepts, the rest (i.e. COPY, SET) are not logged
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+logger = logging.getLogger(__name__)
+
+
+def explain_clause(options: Sequence[str]) -> str:
+    return f'EXPLAIN ({", ".join(options)}) ' if options else 'EXPLAIN '
+
+
+def explain(db: Session, stmt: ClauseElement, *options: str) -> list[Any]:
+    '''
+    Rows of EXPLAIN of the statement with the options, i.e. ANALYZE or FORMAT JSON
+    '''
+    # The statement values are typed (UUIDs, dates, decimals, enums), so they are safe to render inline
+    compiled = stmt.compile(db.get_bind(), compile_kwargs={'literal_binds': True})
+    return list(db.scalars(text(explain_clause(options) + str(compiled))))
+
+
+def explain_raw(connection: PoolProxiedConnection, statement: str, parameters: Any, *options: str) -> list[Any]:
+    '''
+    Rows of EXPLAIN of the statement as it's sent to the driver, with its parameters. A separate cursor is used,
+    so the rows of the statement itself are not discarded, and a savepoint, so a failing EXPLAIN doesn't abort
+    the transaction of the statement
+    '''
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SAVEPOINT explain_raw')
+        try:
+            cursor.execute(explain_clause(options) + statement, parameters)
+            rows = [row[0] for row in cursor.fetchall()]
+        except Exception:
+            cursor.execute('ROLLBACK TO SAVEPOINT explain_raw')
+            raise
+        cursor.execute('RELEASE SAVEPOINT explain_raw')
+        return rows
+    finally:
+        cursor.close()
+
+
+def before_cursor_execute(conn: Connection, cursor: Any, statement: str, parameters: Any,
+                          context: ExecutionContext | None, executemany: bool) -> None:
+    if SLOW_QUERY_THRESHOLD:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn: Connection, cursor: Any, statement: str, parameters: Any,
+                         context: ExecutionContext | None, executemany: bool) -> None:
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    duration = (time.perf_counter() - started.pop()) * 1000
+    if duration < SLOW_QUERY_THRESHOLD or executemany or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return
+    # Plain EXPLAIN, the statement is planned again, but not executed. The statement is logged even if it can't be
+    # explained, the failure of the log is no reason to fail the request
+    try:
+        plan = explain_raw(conn.connection, statement, parameters)
+    except Exception as e:
+        logger.warning('Slow query, %.1f ms: %s\nNo plan: %s', duration, statement, e)
+        return
+    logger.warning('Slow query, %.1f ms: %s\n%s', duration, statement, '\n'.join(plan))
+
+
+def log_slow_queries(engine: Engine) -> None:
+    '''
+    Log the statements of the engine taking longer than SLOW_QUERY_THRESHOLD, along with their plans
+    '''
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
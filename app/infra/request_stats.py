@@ -0,0 +1,151 @@
+'''
+Per request accounting of the DB statements (their number, rows and time) and of the time spent in the request
+phases, reported by the Server-Timing header. The query budget catches the requests issuing more statements than
+expected, such as N+1 loading of relationships, in development and in the tests
+'''
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import Connection, ExecutionContext
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.infra.enums import QueryBudgetAction
+from app.infra.metrics import F, timing_decorator
+
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', 0))  # statements per request, unless set for the route, 0 disables it
+QUERY_BUDGET_ACTION = QueryBudgetAction(os.getenv('QUERY_BUDGET_ACTION', QueryBudgetAction.WARN).upper())
+# Tells any client the DB time and statements of the request, hence only on by default in development
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(os.getenv('ENVIRONMENT', 'dev').lower() == 'dev')).lower() == 'true'
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class RequestStats:
+    budget: int = field(default_factory=lambda: QUERY_BUDGET)
+    statements: Counter[str] = field(default_factory=Counter)  # number of executions per statement
+    rows: int = 0
+    db_time: float = 0
+    phases: dict[str, float] = field(default_factory=dict)  # time spent per phase
+
+    @property
+    def statements_count(self) -> int:
+        return self.statements.total()
+
+    def over_budget(self) -> bool:
+        return bool(self.budget) and self.statements_count > self.budget
+
+    def budget_message(self) -> str:
+        statement, executions = self.statements.most_common(1)[0]
+        return (f'{self.statements_count} statements issued, over the budget of {self.budget}. '
+                f'Executed {executions} times: {statement}')
+
+    def server_timing(self, total: float) -> str:
+        metrics = [f'db;dur={self.db_time * 1000:.2f};desc="{self.statements_count} statements / {self.rows} rows"']
+        metrics.extend(f'{name};dur={duration * 1000:.2f}' for name, duration in self.phases.items())
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+# Set for every request by the middleware. The thread pool and the sessions' greenlets run with a copy of the
+# context, which refers to the same stats
+request_stats: ContextVar[RequestStats | None] = ContextVar('request_stats', default=None)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn: Connection, cursor: Any, statement: str, parameters: Any,
+                          context: ExecutionContext | None, executemany: bool) -> None:
+    stats = request_stats.get()
+    if stats is None:
+        return
+    stats.statements[statement] += 1
+    if QUERY_BUDGET_ACTION is QueryBudgetAction.FAIL and stats.over_budget():
+        raise QueryBudgetExceeded(stats.budget_message())
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn: Connection, cursor: Any, statement: str, parameters: Any,
+                         context: ExecutionContext | None, executemany: bool) -> None:
+    stats = request_stats.get()
+    if stats is None:
+        return
+    stats.db_time += time.perf_counter() - conn.info['statement_started'].pop()
+    if statement.lstrip().upper().startswith('SELECT'):
+        stats.rows += max(cursor.rowcount, 0)
+
+
+def query_budget(statements: int) -> Callable[[], None]:
+    '''
+    Dependency setting the query budget of a route, for the ones expected to issue more statements than the default
+    '''
+    def set_query_budget() -> None:
+        stats = request_stats.get()
+        if stats is not None:  # pragma: no branch
+            stats.budget = statements
+    return set_query_budget
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    '''
+    Add the time spent in the block to the phase of the current request
+    '''
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = request_stats.get()
+        if stats is not None:
+            stats.phases[name] = stats.phases.get(name, 0) + time.perf_counter() - started
+
+
+def timed_phase(name: str) -> Callable[[F], F]:
+    '''
+    Add the time spent in every call of the decorated function (or coroutine function) to the phase of the request
+    '''
+    return timing_decorator(lambda: phase(name))
+
+
+class RequestStatsMiddleware:
+    '''
+    Collect the stats of every request, report them by the Server-Timing header and check them against the query
+    budget. Only the statements issued before the response is started (all of them, unless it's streamed) are
+    reported by the header
+    '''
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start' and SERVER_TIMING:
+                MutableHeaders(scope=message).append('Server-Timing',
+                                                     stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_stats.reset(token)
+            if QUERY_BUDGET_ACTION is QueryBudgetAction.WARN and stats.over_budget():
+                logger.warning('%s %s: %s', scope['method'], scope['path'], stats.budget_message())
@@ -1,15 +1,38 @@
 import os
+import secrets
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi_pagination import add_pagination
+from starlette import status
 
 from app.controllers import admin, authentication, checks, users
+from app.infra.database import dispose_engines, session_scope
+from app.infra.metrics import MetricsMiddleware, generate_metrics
+from app.infra.partitions import ensure_partitions
+from app.infra.request_stats import RequestStatsMiddleware
 
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'dev').lower()
+# Bearer token the scrapers present for /metrics, which is only served without it in development
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    with session_scope() as db:  # the partitions ahead are also created by a scheduled utils/partitions.py run
+        ensure_partitions(db)
+        db.commit()
+    yield
+    # The async pool connections are bound to the event loop, so they are closed before it goes away
+    await dispose_engines()
+
 
 app = FastAPI(title='Check Application', version=os.getenv('APP_VERSION', '0.1.0'),
-              docs_url='/docs' if ENVIRONMENT == 'dev' else None)
+              docs_url='/docs' if ENVIRONMENT == 'dev' else None, lifespan=lifespan)
 add_pagination(app)
+app.add_middleware(RequestStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get('/health', include_in_schema=False)
@@ -20,6 +43,22 @@ async def health() -> dict[str, str]:  # pragma: no cover
     return {'status': 'ok'}
 
 
+@app.get('/metrics', include_in_schema=False)
+async def metrics(authorization: str = Header('')) -> Response:
+    '''
+    Prometheus metrics of the application (aggregated from all the workers), for the scrapers presenting
+    METRICS_TOKEN, or for anyone in development if it's not set
+    '''
+    if METRICS_TOKEN:
+        if not secrets.compare_digest(authorization.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid metrics token',
+                                headers={'WWW-Authenticate': 'Bearer'})
+    elif ENVIRONMENT != 'dev':
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    content, media_type = generate_metrics()
+    return Response(content=content, media_type=media_type)
+
+
 app.include_router(authentication.router)
 # No admin role is properly implemented atm, so the provided panel exists only for the testing purpose
 if ENVIRONMENT == 'dev':  # pragma: no cover
@@ -3,11 +3,13 @@ from functools import partial
 from typing import Any
 from uuid import UUID
 
-from sqlalchemy import ARRAY, DateTime, String, func, text
+from sqlalchemy import ARRAY, DateTime, Enum, String, func, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from app.infra.enums import PaymentMethod
+
 postgres_now = partial(datetime.now, timezone.utc)
 
 
@@ -17,7 +19,9 @@ class Base(DeclarativeBase):
     type_annotation_map = {
         dict[str, Any]: JSONB,  # allows to use Mapped[dict[str, Any]] notation
         list[str]: ARRAY(String),  # allows to use Mapped[list[str]] notation
-        list[UUID]: ARRAY(PostgresUUID)  # allows to use Mapped[list[UUID]] notation
+        list[UUID]: ARRAY(PostgresUUID),  # allows to use Mapped[list[UUID]] notation
+        # named as in the DB, asyncpg casts the bound values to the type by its name
+        PaymentMethod: Enum(PaymentMethod, name='payment_method_enum'),
     }
 
 
@@ -26,3 +30,10 @@ class MilestonesAware:
                                                  server_default=func.now())
     # updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=postgres_now,
     #                                              server_default=func.now(), onupdate=postgres_now)
+
+
+class MonthlyPartitioned(MilestonesAware):
+    # Range partitioned by the month of creation (see app/infra/partitions.py), the partition key has to be a part
+    # of the primary key, which is declared as (id, created_at) by the table so that the ID lookups can use it
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, default=postgres_now,
+                                                 server_default=func.now())
@@ -1,17 +1,20 @@
+from datetime import date
 from decimal import ROUND_HALF_UP, Decimal
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, Index, String, event, text
+from sqlalchemy import (
+    ForeignKey, ForeignKeyConstraint, Index, PrimaryKeyConstraint, String, UniqueConstraint, event, text
+)
 from sqlalchemy.engine import Connection
-from sqlalchemy.orm import Mapped, Mapper, mapped_column, relationship
+from sqlalchemy.orm import Mapped, Mapper, mapped_column, query_expression, relationship
 from sqlalchemy.types import DECIMAL
 
 from app.infra.enums import PaymentMethod
-from app.models import Base, MilestonesAware
+from app.models import Base, MonthlyPartitioned
 from app.models.users import User
 
 
-class Check(Base, MilestonesAware):
+class Check(Base, MonthlyPartitioned):
     __tablename__ = 'checks'
     creator_id: Mapped[UUID] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))  # indexed by default
     payment_method: Mapped[PaymentMethod] = mapped_column(nullable=False, index=True)
@@ -20,38 +23,75 @@ class Check(Base, MilestonesAware):
     change: Mapped[Decimal] = mapped_column(DECIMAL(10, 2), nullable=False, default=Decimal('0'))
     additional_info: Mapped[str] = mapped_column(String(512), nullable=True)
     repr: Mapped[str] = mapped_column(nullable=True)
+    fingerprint: Mapped[str] = query_expression()  # loaded on demand, see check repository
 
     creator: Mapped['User'] = relationship('User', back_populates='checks')
     items: Mapped[list['Item']] = relationship('Item', lazy='selectin')
 
     __table_args__ = (
+        PrimaryKeyConstraint('id', 'created_at'),
         Index('idx_checks_creator_payment_method_date', 'creator_id', 'payment_method', 'created_at'),
         Index('idx_checks_creator_total_amount_date', 'creator_id', 'total_amount', 'created_at'),
         Index('idx_checks_creator_total_amount_date_payment_method', 'creator_id', 'total_amount', 'created_at',
               'payment_method'),
+        Index('idx_checks_creator_date_id', 'creator_id', 'created_at', 'id'),  # keyset pagination order
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
 
 
-class Item(Base, MilestonesAware):
+class Item(Base, MonthlyPartitioned):
     # TODO: to NORMALIZE the DB it's better to split Item table into two separates ones:
     # 1) Item with title and price fields
     # 2) CheckItem with check_id, quantity and sum fields
     __tablename__ = 'items'
-    check_id: Mapped[UUID] = mapped_column(ForeignKey('checks.id', ondelete='CASCADE'))  # indexed by default
+    check_id: Mapped[UUID] = mapped_column(nullable=False)
     title: Mapped[str] = mapped_column(String(512), nullable=False)  # FIXME: this should become UQ after normalization
     price: Mapped[Decimal] = mapped_column(DECIMAL(10, 2), nullable=False)  # per unit or Kg
     quantity: Mapped[int] = mapped_column(nullable=False)  # units or weight (Kg)
     amount: Mapped[Decimal] = mapped_column(DECIMAL(10, 2), nullable=False)  # total sum of the check item
 
+    __table_args__ = (
+        PrimaryKeyConstraint('id', 'created_at'),
+        # Items share the creation time of their check, so they are kept in the same month partition as the check.
+        # The cascade on update follows the checks moved to another partition
+        ForeignKeyConstraint(['check_id', 'created_at'], ['checks.id', 'checks.created_at'], ondelete='CASCADE',
+                             onupdate='CASCADE'),
+        Index('idx_items_check_date', 'check_id', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+
+class CheckStats(Base):
+    # Daily (UTC) rollup of the user checks per payment method, kept up to date by the check repository
+    __tablename__ = 'check_stats'
+    creator_id: Mapped[UUID] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    day: Mapped[date] = mapped_column(nullable=False)
+    payment_method: Mapped[PaymentMethod] = mapped_column(nullable=False)
+    checks_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    total_amount: Mapped[Decimal] = mapped_column(DECIMAL(14, 2), nullable=False, default=Decimal('0'))
+    change: Mapped[Decimal] = mapped_column(DECIMAL(14, 2), nullable=False, default=Decimal('0'))
+
+    __table_args__ = (
+        UniqueConstraint('creator_id', 'day', 'payment_method'),  # also serves the per-user lookups
+    )
+
+
+def calculate_amount(quantity: int, price: Decimal) -> Decimal:
+    return Decimal(quantity * price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
+
+# Only fired for items flushed one by one through the unit of work, the check repository inserts items in bulk
+# with the amounts and check totals precomputed. The stats rollups of such checks are built by
+# check_repo.rebuild_stats (see utils/backfill_stats.py)
 @event.listens_for(Item, 'before_insert')
 @event.listens_for(Item, 'before_update')
 def on_check_item_insert_update(mapper: Mapper[Item], conn: Connection, target: Item) -> None:
-    target.amount = Decimal(target.quantity * target.price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    conn.execute(
+    target.amount = calculate_amount(target.quantity, target.price)
+    created_at = conn.execute(
         text("UPDATE checks SET total_amount = total_amount + :amount "
-             "WHERE checks.id = :check_id"), {'amount': target.amount, 'check_id': target.check_id}
-    )
+             "WHERE checks.id = :check_id RETURNING created_at"), {'amount': target.amount, 'check_id': target.check_id}
+    ).scalar_one()
+    target.created_at = created_at  # the item is stored in the partition of its check
     conn.execute(
         text("UPDATE checks SET change = paid_amount - total_amount "
              "WHERE checks.id = :check_id"), {'check_id': target.check_id}
@@ -1,6 +1,8 @@
+from datetime import datetime
 from typing import TYPE_CHECKING
+from uuid import UUID
 
-from sqlalchemy import String
+from sqlalchemy import DateTime, ForeignKey, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models import Base, MilestonesAware
@@ -16,4 +18,16 @@ class User(Base, MilestonesAware):
     email: Mapped[str] = mapped_column(String(512), nullable=False)
     password: Mapped[str] = mapped_column(String(512), nullable=False)
 
-    checks: Mapped[list['Check']] = relationship('Check', back_populates='creator', lazy='selectin')
+    # Loaded explicitly per endpoint (see user repository) to keep authentication from pulling all the user's checks
+    checks: Mapped[list['Check']] = relationship('Check', back_populates='creator')
+
+
+class PrimaryPin(Base):
+    '''
+    Until when the reads of the user go to the primary rather than the replicas, after a write (see
+    app/infra/database.py). Unlogged, hence neither replicated nor kept through a crash, as it only matters for seconds
+    '''
+    __tablename__ = 'primary_pins'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
+    id: Mapped[UUID] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)  # of the user
+    pinned_until: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,67 @@
+'''
+Async counterparts of the check repository for the async endpoints.
+The sync functions run in the session's greenlet with `run_sync`, so the queries are defined once while the I/O
+is awaited on the event loop instead of holding a threadpool thread
+'''
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+from uuid import UUID
+
+from fastapi_pagination import Page, Params
+from fastapi_pagination.cursor import CursorPage, CursorParams
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.interfaces import ORMOption
+
+from app.infra.enums import CountStrategy, StatsPeriod
+from app.models import checks
+from app.repositories import check as check_repo
+from app.schemas import check
+
+
+async def create(db: AsyncSession, schema: check.CreateCheck) -> checks.Check:
+    return await db.run_sync(check_repo.create, schema)
+
+
+async def get_all_by_user(db: AsyncSession, creator_id: UUID, pagination_params: Params,
+                          filters: check.CheckFilters,
+                          count_strategy: CountStrategy = CountStrategy.EXACT) -> Page[checks.Check]:
+    return await db.run_sync(check_repo.get_all_by_user, creator_id, pagination_params, filters, count_strategy)
+
+
+async def get_keyset_page_by_user(db: AsyncSession, creator_id: UUID, params: CursorParams,
+                                  filters: check.CheckFilters,
+                                  include_total: bool = False) -> CursorPage[checks.Check]:
+    return await db.run_sync(check_repo.get_keyset_page_by_user, creator_id, params, filters, include_total)
+
+
+async def get_stats(db: AsyncSession, creator_id: UUID, filters: check.CheckFilters, period: StatsPeriod,
+                    by_payment_method: bool) -> list[check.CheckStatsResponse]:
+    return await db.run_sync(check_repo.get_stats, creator_id, filters, period, by_payment_method)
+
+
+async def get_by_id(db: AsyncSession, id: UUID, *options: ORMOption) -> checks.Check:
+    return await db.run_sync(check_repo.get_by_id, id, *options)
+
+
+async def get_text_by_id(db: AsyncSession, id: UUID) -> tuple[str, datetime]:
+    return await db.run_sync(check_repo.get_text_by_id, id)
+
+
+async def get_texts_by_ids(db: AsyncSession, ids: Sequence[UUID]) -> dict[UUID, tuple[str, datetime]]:
+    return await db.run_sync(check_repo.get_texts_by_ids, ids)
+
+
+async def get_fingerprint(db: AsyncSession, id: UUID) -> tuple[str, datetime]:
+    return await db.run_sync(check_repo.get_fingerprint, id)
+
+
+async def stream_by_user(db: AsyncSession, creator_id: UUID, filters: check.CheckFilters,
+                         batch_size: int) -> AsyncIterator[Sequence[checks.Check]]:
+    '''
+    Batches of the user checks (with their items), oldest first, fetched from a server-side cursor as they are consumed.
+    Unlike the other functions it can't run in the session's greenlet, which is left between the batches
+    '''
+    stmt = check_repo.filter_by_user(creator_id, filters).order_by(checks.Check.created_at, checks.Check.id)
+    result = await db.stream_scalars(stmt.execution_options(yield_per=batch_size))
+    async for batch in result.partitions():
+        yield batch
@@ -0,0 +1,30 @@
+'''
+Async counterparts of the user repository for the async endpoints, see the async check repository
+'''
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.interfaces import ORMOption
+
+from app.models import users
+from app.repositories import user as user_repo
+from app.schemas import user
+from app.services.hashing import Hash
+
+
+async def create(request: user.CreateUserRequest, db: AsyncSession) -> users.User:
+    # Hashed beforehand, since the sync repository would block the event loop waiting for the hashing pool
+    hashed_password = await Hash.encrypt_async(request.password)
+    return await db.run_sync(lambda session: user_repo.create(request, session, hashed_password))
+
+
+async def get_by_login(login: str, db: AsyncSession) -> users.User:
+    return await db.run_sync(lambda session: user_repo.get_by_login(login, session))
+
+
+async def get_by_id(id: UUID, db: AsyncSession, *options: ORMOption) -> users.User:
+    return await db.run_sync(lambda session: user_repo.get_by_id(id, session, *options))
+
+
+async def get_identity_by_id(id: UUID, db: AsyncSession) -> users.User:
+    return await db.run_sync(lambda session: user_repo.get_identity_by_id(id, session))
@@ -1,63 +1,300 @@
-from datetime import timedelta
-from uuid import UUID
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Sequence, cast
+from uuid import UUID, uuid4
 
 from fastapi import HTTPException
 from fastapi_pagination import Page, Params
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from fastapi_pagination.cursor import CursorPage, CursorParams
+from sqlalchemy import (
+    ColumnElement, Date, Select, String, Table, Uuid, any_, bindparam, func, insert, literal, literal_column, select,
+    tuple_, update
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.interfaces import ORMOption
 from starlette import status
 
-from app.models import checks
+from app.infra import pagination
+from app.infra.database import copy_rows
+from app.infra.enums import CountStrategy, PaymentMethod, StatsPeriod
+from app.infra.metrics import timed
+from app.models import checks, postgres_now
+from app.models.users import User
 from app.schemas import check
+from app.services.check_builder import built_text_representation, render_text
+from app.services.check_texts import invalidate_check_texts
 
+CENT = Decimal('0.01')
+# Hash of the whole check row, the rendered text included covers the items as well
+FINGERPRINT: ColumnElement[str] = literal_column('md5(checks::text)', String)
+STATS_KEY = ['creator_id', 'day', 'payment_method']
+STATS_VALUES = ['checks_count', 'total_amount', 'change']
 
+
+def build(schema: check.CreateCheck) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    '''
+    Build the rows of the check and its items, with the IDs, amounts, totals and text representation computed
+    in Python
+    '''
+    id = uuid4()
+    created_at = postgres_now()
+    amounts = [checks.calculate_amount(item.quantity, item.price) for item in schema.items]
+    item_rows = [dict(check_id=id, title=item.title, price=item.price.quantize(CENT), quantity=item.quantity,
+                      amount=amount, created_at=created_at) for item, amount in zip(schema.items, amounts)]
+    paid_amount = schema.payment.amount.quantize(CENT)
+    total_amount = sum(amounts, Decimal('0.00'))
+    check_row = dict(id=id, creator_id=schema.creator_id, payment_method=schema.payment.method,
+                     paid_amount=paid_amount, total_amount=total_amount, change=paid_amount - total_amount,
+                     additional_info=schema.additional_info, created_at=created_at)
+    check_row['repr'] = render_text(schema.creator_name, check_row, item_rows)
+    return check_row, item_rows
+
+
+def insert_many(db: Session, check_rows: list[dict[str, Any]], item_rows: list[dict[str, Any]],
+                copy: bool = False) -> None:
+    '''
+    Insert the built rows with multi-row INSERT statements, or with COPY which is preferable for large batches.
+    Both bypass the per-item totals listener
+    '''
+    for table, rows in ((checks.Check.__table__, check_rows), (checks.Item.__table__, item_rows)):
+        if not rows:
+            continue
+        if copy:
+            copy_rows(db, cast(Table, table), rows)
+        else:
+            db.execute(insert(cast(Table, table)), rows)
+    update_stats(db, check_rows)
+
+
+def update_stats(db: Session, check_rows: list[dict[str, Any]], sign: int = 1) -> None:
+    '''
+    Add the checks to (or subtract them from) the daily rollups, with one upsert per affected bucket
+    '''
+    buckets: dict[tuple[UUID, date, PaymentMethod], dict[str, Any]] = {}
+    for row in check_rows:
+        key = (row['creator_id'], row['created_at'].astimezone(timezone.utc).date(), row['payment_method'])
+        bucket = buckets.setdefault(key, dict(zip(STATS_KEY, key), checks_count=0, total_amount=Decimal('0.00'),
+                                              change=Decimal('0.00')))
+        bucket['checks_count'] += sign
+        bucket['total_amount'] += sign * row['total_amount']
+        bucket['change'] += sign * row['change']
+    table = cast(Table, checks.CheckStats.__table__)
+    stmt = postgresql.insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=STATS_KEY,
+                                      set_={column: table.c[column] + stmt.excluded[column] for column in STATS_VALUES})
+    # Sorted so that concurrent transactions lock the shared buckets in the same order
+    db.execute(stmt, [buckets[key] for key in sorted(buckets)])
+
+
+def rebuild_stats(db: Session, creator_ids: Sequence[UUID]) -> None:
+    '''
+    Recompute the daily rollups of the users from their checks.
+    The users are locked, so that no checks are created for them meanwhile
+    '''
+    db.execute(select(User.id).filter(User.id.in_(creator_ids)).with_for_update())
+    db.query(checks.CheckStats).filter(checks.CheckStats.creator_id.in_(creator_ids)).delete()
+    day = func.date(func.timezone('UTC', checks.Check.created_at))
+    db.execute(insert(checks.CheckStats).from_select(
+        [*STATS_KEY, *STATS_VALUES],
+        select(checks.Check.creator_id, day, checks.Check.payment_method, func.count(),
+               func.sum(checks.Check.total_amount), func.sum(checks.Check.change))
+        .filter(checks.Check.creator_id.in_(creator_ids))
+        .group_by(checks.Check.creator_id, day, checks.Check.payment_method)
+    ))
+
+
+@timed('check_repo.create')
 def create(db: Session, schema: check.CreateCheck) -> checks.Check:
-    new_check = checks.Check(creator_id=schema.creator_id, payment_method=schema.payment.method,
-                             paid_amount=schema.payment.amount, additional_info=schema.additional_info)
-    db.add(new_check)
-    db.flush()
-    for item in schema.items:
-        db.add(checks.Item(**item.model_dump(), check_id=new_check.id))
+    check_row, item_rows = build(schema)
+    insert_many(db, [check_row], item_rows)
     db.commit()
-    db.refresh(new_check)
-    return new_check
+    return checks.Check(**check_row, items=[checks.Item(**item_row) for item_row in item_rows])
 
 
-def get_all_by_user(db: Session, creator_id: UUID, pagination_params: Params,
-                    filters: check.CheckFilters) -> Page[checks.Check]:
-    # Don't call 'all' method to avoid loading all query results into the memory
+def day_start(day: date) -> datetime:
+    # Bound as a timestamp with the time zone, unlike a date it's comparable to the partition bounds while planning,
+    # so the partitions out of the period are pruned from the plan
+    return datetime.combine(day, time.min, timezone.utc)
+
+
+def filter_by_user(creator_id: UUID, filters: check.CheckFilters) -> Select[tuple[checks.Check]]:
     stmt = select(checks.Check).filter(checks.Check.creator_id == creator_id)
     if filters.period_start:
-        stmt = stmt.filter(checks.Check.created_at >= filters.period_start)
+        stmt = stmt.filter(checks.Check.created_at >= day_start(filters.period_start))
     if filters.period_end:
-        # adding timdelta is needed because at the comparing time date is converted to timestamp of such format:
+        # the next day is needed because the period end is converted to the timestamp of such format:
         # 2025-02-14 00:00:00, so when both dates are i.e. 2025-02-14, Postgres will look up for all checks
         # that were create between 2025-02-14 00:00:00 and 2025-02-14 00:00:00
-        stmt = stmt.filter(checks.Check.created_at < filters.period_end + timedelta(days=1))
+        stmt = stmt.filter(checks.Check.created_at < day_start(filters.period_end + timedelta(days=1)))
     if filters.total_amount_ge:
         stmt = stmt.filter(checks.Check.total_amount >= filters.total_amount_ge)
     if filters.total_amount_le:
         stmt = stmt.filter(checks.Check.total_amount <= filters.total_amount_le)
     if filters.payment_method:
         stmt = stmt.filter(checks.Check.payment_method == filters.payment_method)
-    return paginate(db, stmt, params=pagination_params)  # type: ignore
+    return stmt
+
+
+def get_all_by_user(db: Session, creator_id: UUID, pagination_params: Params, filters: check.CheckFilters,
+                    count_strategy: CountStrategy = CountStrategy.EXACT) -> Page[checks.Check]:
+    # Don't call 'all' method to avoid loading all query results into the memory
+    return pagination.paginate(db, filter_by_user(creator_id, filters), pagination_params, count_strategy,
+                               cache_key=('checks', creator_id, filters))
+
+
+def _encode_keyset(backwards: bool, selected_check: checks.Check) -> str:
+    return f'{"<" if backwards else ">"}{selected_check.created_at.isoformat()}|{selected_check.id}'
+
+
+def _decode_keyset(cursor: str) -> tuple[bool, datetime, UUID]:
+    try:
+        created_at, id = cursor[1:].split('|')
+        if cursor[0] not in '<>':
+            raise ValueError(cursor)
+        return cursor[0] == '<', datetime.fromisoformat(created_at), UUID(id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor value')
 
 
-def get_by_id(db: Session, id: UUID) -> checks.Check:
+def get_keyset_page_by_user(db: Session, creator_id: UUID, params: CursorParams, filters: check.CheckFilters,
+                            include_total: bool = False) -> CursorPage[checks.Check]:
+    '''
+    Retrieve a page of the user checks, newest first, seeking past the cursor on (created_at, id) instead of
+    skipping rows with OFFSET, so every page costs the same. The total is only counted on demand
+    '''
+    raw_params = params.to_raw_params()
+    stmt = filter_by_user(creator_id, filters)
+    total = db.scalar(select(func.count()).select_from(stmt.subquery())) if include_total else None
+
+    backwards = False
+    key = tuple_(checks.Check.created_at, checks.Check.id)
+    if raw_params.cursor:
+        backwards, created_at, id = _decode_keyset(cast(str, raw_params.cursor))
+        stmt = stmt.filter(key > (created_at, id) if backwards else key < (created_at, id))
+    order = (checks.Check.created_at.asc(), checks.Check.id.asc()) if backwards else \
+        (checks.Check.created_at.desc(), checks.Check.id.desc())
+    items = list(db.scalars(stmt.order_by(*order).limit(raw_params.size + 1)))
+    has_more = len(items) > raw_params.size
+    items = items[:raw_params.size]
+    if backwards:
+        items.reverse()
+
+    next_cursor = previous_cursor = None
+    if items:
+        if has_more or backwards:
+            next_cursor = _encode_keyset(False, items[-1])
+        if has_more if backwards else raw_params.cursor:
+            previous_cursor = _encode_keyset(True, items[0])
+    return CursorPage.create(items, params, next_=next_cursor, previous=previous_cursor, total=total)
+
+
+def get_stats(db: Session, creator_id: UUID, filters: check.CheckFilters, period: StatsPeriod,
+              by_payment_method: bool) -> list[check.CheckStatsResponse]:
+    '''
+    Aggregate the daily rollups of the user, so the cost depends on the number of days rather than checks
+    '''
+    if filters.total_amount_ge or filters.total_amount_le:
+        # The rollups don't keep the amounts of individual checks, so the matching checks are aggregated instead
+        source = filter_by_user(creator_id, filters).with_only_columns(
+            func.date(func.timezone('UTC', checks.Check.created_at)).label('day'), checks.Check.payment_method,
+            literal(1).label('checks_count'), checks.Check.total_amount, checks.Check.change).subquery()
+    else:
+        stmt = select(checks.CheckStats).filter(checks.CheckStats.creator_id == creator_id)
+        if filters.period_start:
+            stmt = stmt.filter(checks.CheckStats.day >= filters.period_start)
+        if filters.period_end:
+            stmt = stmt.filter(checks.CheckStats.day <= filters.period_end)
+        if filters.payment_method:
+            stmt = stmt.filter(checks.CheckStats.payment_method == filters.payment_method)
+        source = stmt.subquery()
+
+    groups: list[ColumnElement[Any]] = []
+    if period is StatsPeriod.DAY:
+        groups.append(source.c.day.label('period'))
+    elif period is StatsPeriod.MONTH:
+        groups.append(func.date_trunc('month', source.c.day).cast(Date).label('period'))
+    if by_payment_method:
+        groups.append(source.c.payment_method)
+    checks_count = func.sum(source.c.checks_count)
+    rows = db.execute(
+        select(*groups, checks_count.label('checks_count'), func.sum(source.c.total_amount).label('total_amount'),
+               func.sum(source.c.change).label('change'))
+        .group_by(*groups).having(checks_count > 0).order_by(*groups)
+    )
+    return [check.CheckStatsResponse(**row._asdict(), average_amount=(row.total_amount / row.checks_count).quantize(
+        CENT, rounding=ROUND_HALF_UP)) for row in rows]
+
+
+def get_by_id(db: Session, id: UUID, *options: ORMOption) -> checks.Check:
     # TODO: consider fetching ONLY for the creator
-    selected_check = db.query(checks.Check).filter(checks.Check.id == id).first()
+    selected_check = db.query(checks.Check).options(*options).filter(checks.Check.id == id).first()
     if not selected_check:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f'Check with ID: {id} is not found')
     return selected_check
 
 
+def get_text_by_id(db: Session, id: UUID) -> tuple[str, datetime]:
+    '''
+    Retrieve the text representation rendered at the check creation (and the creation time). Checks stored without it
+    (created before or around the repository) are rendered on the fly, the backfill job persists theirs
+    '''
+    row = db.execute(select(checks.Check.repr, checks.Check.created_at).filter(checks.Check.id == id)).one_or_none()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f'Check with ID: {id} is not found')
+    text: str | None = row.repr
+    if text is None:
+        text = built_text_representation(get_by_id(db, id, joinedload(checks.Check.creator).load_only(User.name)))
+    return text, row.created_at
+
+
+def get_texts_by_ids(db: Session, ids: Sequence[UUID]) -> dict[UUID, tuple[str, datetime]]:
+    '''
+    Retrieve the text representations (and the creation times) of many checks with a single query. The ones stored
+    without it are rendered and persisted with a single batched update
+    '''
+    by_ids = checks.Check.id == any_(bindparam('ids', list(ids), type_=postgresql.ARRAY(Uuid)))
+    rows = db.execute(select(checks.Check.id, checks.Check.repr, checks.Check.created_at).filter(by_ids)).all()
+    if missing_ids := set(ids) - {row.id for row in rows}:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f'Checks with IDs: {", ".join(sorted(map(str, missing_ids)))} are not found')
+    texts = {row.id: (row.repr, row.created_at) for row in rows if row.repr is not None}
+    if len(texts) < len(rows):
+        unrendered = db.scalars(select(checks.Check).options(joinedload(checks.Check.creator).load_only(User.name))
+                                .filter(by_ids, checks.Check.repr.is_(None))).all()
+        texts.update({selected_check.id: (built_text_representation(selected_check), selected_check.created_at)
+                      for selected_check in unrendered})
+        db.execute(update(checks.Check), [  # updated by the primary key, which includes the partition key
+            {'id': selected_check.id, 'created_at': selected_check.created_at, 'repr': texts[selected_check.id][0]}
+            for selected_check in unrendered])
+        db.commit()
+    return texts
+
+
+def get_fingerprint(db: Session, id: UUID) -> tuple[str, datetime]:
+    '''
+    Fingerprint and creation time of the check, which allows telling whether a client has the check up to date
+    without loading it
+    '''
+    row = db.execute(select(FINGERPRINT, checks.Check.created_at).filter(checks.Check.id == id)).one_or_none()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f'Check with ID: {id} is not found')
+    fingerprint, created_at = row
+    return fingerprint, created_at
+
+
 def delete(db: Session, id: UUID) -> str:  # pragma: no cover [admin]
     selected_check = db.query(checks.Check).filter(checks.Check.id == id)
-    if not selected_check.first():
+    existing_check = selected_check.first()
+    if not existing_check:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f'Check with ID: {id} is not found')
+    update_stats(db, [{column: getattr(existing_check, column) for column in (
+        'creator_id', 'created_at', 'payment_method', 'total_amount', 'change')}], sign=-1)
     selected_check.delete()
     db.commit()
+    invalidate_check_texts(id)
     return f'Check with ID: {id} has been successfully deleted'
@@ -2,19 +2,24 @@ from uuid import UUID
 
 from fastapi import HTTPException
 from fastapi_pagination import Page, Params
-from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, raiseload
+from sqlalchemy.orm.interfaces import ORMOption
 from starlette import status
 
-from app.models import users
+from app.infra import pagination
+from app.infra.enums import CountStrategy
+from app.models import checks, users
 from app.schemas import user
+from app.services.check_texts import invalidate_check_texts
 from app.services.hashing import Hash
+from app.services.principals import invalidate_principal
 
 
-def create(request: user.CreateUserRequest, db: Session) -> users.User:
+def create(request: user.CreateUserRequest, db: Session, hashed_password: str | None = None) -> users.User:
     new_user = users.User(name=request.name, email=request.email, login=request.login,
-                          password=Hash.encrypt(request.password))
+                          password=hashed_password or Hash.encrypt(request.password))
     db.add(new_user)
     try:
         db.commit()
@@ -35,25 +40,49 @@ def reset_password(request: user.ResetUserPassword, db: Session) -> None:  # pra
     user.password = Hash.encrypt(request.new_password)
     db.add(user)
     db.commit()
+    invalidate_principal(request.user_id)
 
 
-def get_all(db: Session, pagination_params: Params) -> Page[users.User]:  # pragma: no cover [admin]
-    return paginate(db.query(users.User), params=pagination_params)  # type: ignore
+def get_all(db: Session, pagination_params: Params,
+            count_strategy: CountStrategy = CountStrategy.EXACT) -> Page[users.User]:  # pragma: no cover [admin]
+    return pagination.paginate(db, select(users.User), pagination_params, count_strategy, cache_key=('users',))
 
 
-def get_by_id(id: UUID, db: Session) -> users.User:
-    user = db.query(users.User).filter(users.User.id == id).first()
+def get_by_login(login: str, db: Session) -> users.User:
+    user = db.query(users.User).options(load_only(users.User.id, users.User.password)).filter(
+        users.User.login == login.lower()).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f'There is no user with such login: {login}')
+    return user
+
+
+def get_by_id(id: UUID, db: Session, *options: ORMOption) -> users.User:
+    '''
+    Options define the loading strategy of the user's relationships, none of them is loaded eagerly by default
+    '''
+    user = db.query(users.User).options(*options).filter(users.User.id == id).first()
     if not user:  # pragma: no cover [admin]
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f'User with ID: {id} is not found')
     return user
 
 
+def get_identity_by_id(id: UUID, db: Session) -> users.User:
+    '''
+    Load only the columns required for the authorization, any relationship access raises an error
+    '''
+    return get_by_id(id, db, load_only(users.User.id, users.User.login, users.User.name), raiseload('*'))
+
+
 def delete(id: UUID, db: Session) -> str:  # pragma: no cover [admin]
     user = db.query(users.User).filter(users.User.id == id)
     if not user.first():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f'User with ID: {id} is not found')
-    user.delete()
+    check_ids = db.scalars(select(checks.Check.id).filter(checks.Check.creator_id == id)).all()
+    user.delete()  # the checks are deleted by the DB cascade
     db.commit()
+    invalidate_principal(id)
+    invalidate_check_texts(*check_ids)
     return f'User with ID: {id} has been successfully deleted'
@@ -48,6 +48,7 @@ class CreateCheckRequest(BaseModel):
 
 class CreateCheck(CreateCheckRequest):
     creator_id: UUID
+    creator_name: str  # printed in the text representation
 
 
 class CheckResponse(BaseModel):
@@ -95,9 +96,36 @@ class CheckResponse(BaseModel):
         return check_values
 
 
+class BulkCheckResult(BaseModel):
+    index: int = Field(..., description='Position of the check in the request')
+    id: UUID | None = None
+    errors: list[dict[str, Any]] | None = None
+
+
+class BulkCreateChecksResponse(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkCheckResult]
+
+
+class CheckTextsRequest(BaseModel):
+    ids: list[UUID] = Field(..., min_length=1, examples=[['0b5c5f4e-8d1e-4f4a-9f5e-3c2d1b0a9e8f']])
+
+
 class CheckFilters(BaseModel):
+    model_config = ConfigDict(frozen=True)  # hashable, so it can be a part of a cache key
+
     period_start: date | None = None
     period_end: date | None = None
     total_amount_ge: Decimal | None = None
     total_amount_le: Decimal | None = None
     payment_method: PaymentMethod | None = None
+
+
+class CheckStatsResponse(BaseModel):
+    period: date | None = Field(None, description='First day of the period, none for the whole time')
+    payment_method: PaymentMethod | None = Field(None, description='None when not grouped by payment method')
+    checks_count: int
+    total_amount: Decimal = Field(..., description='Revenue')
+    average_amount: Decimal = Field(..., description='Average basket')
+    change: Decimal = Field(..., description='Change given')
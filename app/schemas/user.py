@@ -37,5 +37,16 @@ class UserResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class Principal(BaseModel):
+    '''
+    Minimal user record resolved from the access token
+    '''
+    id: UUID
+    login: str
+    name: str
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
 class UserResponseWithChecks(UserResponse):
     checks: list[CheckResponse]
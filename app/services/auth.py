@@ -6,12 +6,14 @@ from uuid import UUID
 from fastapi import Depends, Header, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm.session import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from app.infra.database import get_db
-from app.models.users import User
-from app.repositories.user import get_by_id
+from app.infra.database import get_async_db, route_principal
+from app.infra.request_stats import timed_phase
+from app.repositories.async_user import get_identity_by_id
+from app.schemas.user import Principal
+from app.services.principals import principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
 
@@ -30,8 +32,13 @@ def create_access_token(data: dict[str, Any]) -> str:
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme),
-                     db: Session = Depends(get_db)) -> User:
+@timed_phase('auth')
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_async_db)) -> Principal:
+    '''
+    Resolve the principal trusting the signed token's ID claim, the DB is hit only on a principal cache miss (and for
+    the principal's pin to the primary, with replicas)
+    '''
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='Could not validate credentials',
@@ -39,12 +46,17 @@ def get_current_user(token: str = Depends(oauth2_scheme),
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: UUID = payload.get('id')  # type: ignore[assignment]
+        user_id: str | None = payload.get('id')
         if user_id is None:  # pragma: no cover
             raise credentials_exception
     except JWTError:  # pragma: no cover
         raise credentials_exception
-    return get_by_id(id=user_id, db=db)
+    principal = principal_cache.get(UUID(user_id))
+    if principal is None:
+        principal = Principal.model_validate(await get_identity_by_id(id=UUID(user_id), db=db))
+        principal_cache.set(principal.id, principal)
+    await route_principal(db, principal.id)
+    return principal
 
 
 def admin_token(x_admin_token: str = Header()) -> None:  # pragma: no cover
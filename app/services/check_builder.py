@@ -1,49 +1,94 @@
 import os
-import textwrap
+from dataclasses import dataclass
+from functools import lru_cache
+from textwrap import TextWrapper
+from typing import Any, Mapping, Sequence
 
+from app.infra.metrics import timed
+from app.infra.request_stats import timed_phase
 from app.models.checks import Check
 
+CHECK_LINE_LENGTH = int(os.getenv('CHECK_LINE_LENGTH', 40))
+CHECK_FIELDS = ('payment_method', 'paid_amount', 'total_amount', 'change', 'created_at')
+ITEM_FIELDS = ('title', 'price', 'quantity', 'amount')
+WRAP_CACHE_SIZE = 10000  # distinct item titles and creator names kept wrapped
 
+
+@dataclass(frozen=True)
+class Layout:
+    '''
+    Parts of the check text that only depend on the line length
+    '''
+    line_length: int
+    left: int  # item titles and labels
+    right: int  # amounts
+    thick_rule: str
+    thin_rule: str
+    total_label: str
+    change_label: str
+    thanks: str
+
+
+@lru_cache
+def get_layout(line_length: int) -> Layout:
+    left = int(line_length * 0.7)
+    return Layout(line_length=line_length, left=left, right=line_length - left, thick_rule='=' * line_length,
+                  thin_rule='-' * line_length, total_label=f'{"TOTAL":<{left}}', change_label=f'{"Change":<{left}}',
+                  thanks='Thank you for your purchase!'.center(line_length))
+
+
+@lru_cache
+def get_wrapper(width: int) -> TextWrapper:
+    return TextWrapper(width=width)
+
+
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def wrap_name(creator_name: str, line_length: int) -> tuple[str, ...]:
+    return tuple(line.center(line_length) for line in get_wrapper(line_length).fill(creator_name).splitlines())
+
+
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def wrap_title(title: str, width: int) -> tuple[str, ...]:
+    # padded to the width, so the amount can be appended to the last line
+    return tuple(f'{line:<{width}}' for line in get_wrapper(width).fill(title).splitlines())
+
+
+@timed('built_text_representation')
 def built_text_representation(check: Check) -> str:
-    LINE_LENGTH = int(os.getenv('CHECK_LINE_LENGTH', 40))
-    LEFT_SIDE_MAX_LENGTH = int(LINE_LENGTH * 0.7)
-    RIGHT_SIDE_MAX_LENGTH = LINE_LENGTH - LEFT_SIDE_MAX_LENGTH
-    check_lines = []
+    return render_text(check.creator.name, {field: getattr(check, field) for field in CHECK_FIELDS},
+                       [{field: getattr(item, field) for field in ITEM_FIELDS} for item in check.items])
+
+
+@timed_phase('render')
+def render_text(creator_name: str, check: Mapping[str, Any], items: Sequence[Mapping[str, Any]],
+                line_length: int = CHECK_LINE_LENGTH) -> str:
+    '''
+    Render the check from its plain rows, so that it can be done before the check is persisted
+    '''
+    layout = get_layout(line_length)
+    left, right = layout.left, layout.right
 
     # Header
-    check_creator_name = f'{check.creator.name}'
-    wrapped_creator_name = textwrap.fill(check_creator_name, width=LINE_LENGTH)
-    wrapped_lines = wrapped_creator_name.splitlines()
-    for line in wrapped_lines:
-        check_lines.append(line.center(LINE_LENGTH))
-    check_lines.append('=' * LINE_LENGTH)
+    check_lines = [*wrap_name(creator_name, line_length), layout.thick_rule]
 
     # Items
-    for i, item in enumerate(check.items):
-        check_lines.append(f'{item.quantity:.2f} x {item.price:.2f}')
-        wrapped_title = textwrap.fill(item.title, width=LEFT_SIDE_MAX_LENGTH)
-        wrapped_lines = wrapped_title.splitlines()
-        for j, line in enumerate(wrapped_lines):
-            if j == len(wrapped_lines) - 1:  # Last line gets the amount appended
-                check_lines.append(f'{line:<{LEFT_SIDE_MAX_LENGTH}}{item.amount:>{RIGHT_SIDE_MAX_LENGTH}}')
-            else:
-                check_lines.append(f'{line:<{LEFT_SIDE_MAX_LENGTH}}')
-        # Add separator except for the last item
-        if i < len(check.items) - 1:
-            check_lines.append('-' * LINE_LENGTH)
+    for i, item in enumerate(items):
+        if i:
+            check_lines.append(layout.thin_rule)
+        check_lines.append(f'{item["quantity"]:.2f} x {item["price"]:.2f}')
+        title_lines = wrap_title(item['title'], left)
+        if title_lines:  # the last line gets the amount appended
+            check_lines.extend(title_lines[:-1])
+            check_lines.append(f'{title_lines[-1]}{item["amount"]:>{right}}')
 
     # Totals
-    check_lines.append('=' * LINE_LENGTH)
-    check_lines.append(f'{"TOTAL":<{LEFT_SIDE_MAX_LENGTH}}{check.total_amount:>{RIGHT_SIDE_MAX_LENGTH}.2f}')
-    check_lines.append(
-        f'{check.payment_method.capitalize():<{LEFT_SIDE_MAX_LENGTH}}{check.paid_amount:>{RIGHT_SIDE_MAX_LENGTH}.2f}'
-    )
-    check_lines.append(f'{"Change":<{LEFT_SIDE_MAX_LENGTH}}{check.change:>{RIGHT_SIDE_MAX_LENGTH}.2f}')
-    check_lines.append('=' * LINE_LENGTH)
+    check_lines.append(layout.thick_rule)
+    check_lines.append(f'{layout.total_label}{check["total_amount"]:>{right}.2f}')
+    check_lines.append(f'{check["payment_method"].capitalize():<{left}}{check["paid_amount"]:>{right}.2f}')
+    check_lines.append(f'{layout.change_label}{check["change"]:>{right}.2f}')
+    check_lines.append(layout.thick_rule)
 
     # Footer
-    check_lines.append(check.created_at.strftime('%d.%m.%Y %H:%M').center(LINE_LENGTH))
-    check_lines.append('Thank you for your purchase!'.center(LINE_LENGTH))
+    check_lines.append(check['created_at'].strftime('%d.%m.%Y %H:%M').center(line_length))
+    check_lines.append(layout.thanks)
     return '\n'.join(check_lines)
-
-# TODO: consider building HTML representations
@@ -0,0 +1,66 @@
+import csv
+import io
+import os
+import zlib
+from typing import Any, AsyncIterator, Iterable, Iterator, Sequence
+from uuid import UUID
+
+from fastapi import Request
+
+from app.infra.database import routed_session
+from app.infra.enums import ExportFormat
+from app.models.checks import Check
+from app.repositories import async_check as check_repo
+from app.schemas import check
+from app.services.check_ingestion import NDJSON_MEDIA_TYPE
+from app.services.check_serializer import dump_checks_lines
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))  # checks fetched and sent at once
+MEDIA_TYPES = {ExportFormat.NDJSON: NDJSON_MEDIA_TYPE, ExportFormat.CSV: 'text/csv; charset=utf-8'}
+FILE_EXTENSIONS = {ExportFormat.NDJSON: 'ndjson', ExportFormat.CSV: 'csv'}
+# A row per check item, the check columns are repeated for each of its items
+CSV_HEADER = ('id', 'created_at', 'payment_method', 'paid_amount', 'total_amount', 'change', 'item_title',
+              'item_price', 'item_quantity', 'item_amount')
+
+
+def render_csv(rows: Iterable[Iterable[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def csv_rows(checks: Sequence[Check]) -> Iterator[tuple[Any, ...]]:
+    for selected_check in checks:
+        check_row = (selected_check.id, selected_check.created_at.isoformat(), selected_check.payment_method.value,
+                     selected_check.paid_amount, selected_check.total_amount, selected_check.change)
+        if not selected_check.items:
+            yield check_row  # a check without items still gets its row
+        for item in selected_check.items:
+            yield check_row + (item.title, item.price, item.quantity, item.amount)
+
+
+def render_csv_checks(checks: Sequence[Check]) -> bytes:
+    return render_csv(csv_rows(checks))
+
+
+async def export_checks(request: Request, creator_id: UUID, filters: check.CheckFilters, format: ExportFormat,
+                        compress: bool) -> AsyncIterator[bytes]:
+    '''
+    Render the user checks batch by batch as they are fetched, so neither the checks nor the rendered export are
+    held in memory whatever their number. The session is opened by the stream itself, as it outlives the request
+    dependencies, and reads from the primary if the user has written lately
+    '''
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None  # gzip container
+
+    def encode(chunk: bytes) -> bytes:
+        # each batch is flushed to be sent right away, rather than when the compressor's buffer fills up
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+
+    if format == ExportFormat.CSV:
+        yield encode(render_csv([CSV_HEADER]))
+    render = dump_checks_lines if format == ExportFormat.NDJSON else render_csv_checks
+    async with await routed_session(request, creator_id) as db:
+        async for batch in check_repo.stream_by_user(db, creator_id, filters, EXPORT_BATCH_SIZE):
+            yield encode(render(batch))
+    if compressor:
+        yield compressor.flush()
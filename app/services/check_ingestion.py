@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from starlette import status
+
+from app.repositories import check as check_repo
+from app.schemas import check
+from app.schemas.user import Principal
+
+BULK_CHECKS_LIMIT = int(os.getenv('BULK_CHECKS_LIMIT', 100000))
+BULK_CHECKS_CHUNK_SIZE = int(os.getenv('BULK_CHECKS_CHUNK_SIZE', 1000))
+BULK_CHECKS_LINE_LIMIT = int(os.getenv('BULK_CHECKS_LINE_LIMIT', 1048576))
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidRecord(Exception):
+    def __init__(self, errors: list[dict[str, Any]]) -> None:
+        self.errors = errors
+
+
+async def read_records(request: Request) -> AsyncIterator[Any]:
+    '''
+    Yield the decoded checks of a JSON array body, or the raw lines of an NDJSON body as it's being received.
+    A line longer than BULK_CHECKS_LINE_LIMIT is dropped as it's received and yielded as an invalid record
+    '''
+    if request.headers.get('content-type', '').startswith(NDJSON_MEDIA_TYPE):
+        too_long = InvalidRecord([{'type': 'line_too_long', 'loc': [],
+                                   'msg': f'No line longer than {BULK_CHECKS_LINE_LIMIT} bytes is accepted'}])
+        buffer, dropping = b'', False
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b'\n')
+            for line in lines:
+                if dropping:  # the end of a line too long
+                    dropping = False
+                elif len(line) > BULK_CHECKS_LINE_LIMIT:
+                    yield too_long
+                elif line.strip():
+                    yield line
+            if len(buffer) > BULK_CHECKS_LINE_LIMIT:
+                if not dropping:
+                    yield too_long
+                buffer, dropping = b'', True
+        if buffer.strip() and not dropping:
+            yield buffer
+        return
+
+    try:
+        records = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f'Invalid JSON: {e}')
+    if not isinstance(records, list):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail='A JSON array of checks is expected')
+    if len(records) > BULK_CHECKS_LIMIT:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f'No more than {BULK_CHECKS_LIMIT} checks are accepted per request')
+    for record in records:
+        yield record
+
+
+def validate(record: Any, creator: Principal) -> check.CreateCheck:
+    if isinstance(record, InvalidRecord):
+        raise record
+    try:
+        if isinstance(record, bytes):
+            schema = check.CreateCheckRequest.model_validate_json(record)
+        else:
+            schema = check.CreateCheckRequest.model_validate(record)
+    except ValidationError as e:
+        raise InvalidRecord([dict(error) for error in e.errors(include_url=False, include_input=False,
+                                                               include_context=False)])
+    return check.CreateCheck.model_construct(**dict(schema), creator_id=creator.id, creator_name=creator.name)
+
+
+def persist(db: Session, chunk: list[tuple[int, check.CreateCheck]]) -> list[check.BulkCheckResult]:
+    '''
+    Persist the chunk in a single transaction (with COPY). If the DB rejects it, the checks are retried one by one
+    to tell the failing ones apart
+    '''
+    check_rows, item_rows = [], []
+    for _, schema in chunk:
+        check_row, check_item_rows = check_repo.build(schema)
+        check_rows.append(check_row)
+        item_rows.extend(check_item_rows)
+    try:
+        check_repo.insert_many(db, check_rows, item_rows, copy=len(chunk) > 1)
+        db.commit()
+    except DBAPIError as e:
+        db.rollback()
+        if len(chunk) == 1:
+            # The DB message may disclose the schema or the data, so it's only logged
+            logger.warning('Bulk check %d rejected: %s', chunk[0][0], str(e.orig).strip())
+            return [check.BulkCheckResult(index=chunk[0][0], errors=[
+                {'type': 'db_error', 'loc': [], 'msg': 'The check was rejected by the database'}])]
+        return [result for record in chunk for result in persist(db, [record])]
+    return [check.BulkCheckResult(index=index, id=check_row['id']) for (index, _), check_row in zip(chunk, check_rows)]
+
+
+async def ingest(records: AsyncIterator[Any], creator: Principal, db: Session) -> check.BulkCreateChecksResponse:
+    '''
+    Validate the checks and persist the valid ones in chunked transactions, reporting the outcome per check.
+    The next chunk is validated while the previous one is being persisted.
+    Streamed checks beyond the limit are reported as failed, since the preceding chunks may be already committed.
+    If the upload fails (e.g. the client disconnects), the chunk being persisted is awaited, as it uses the request
+    session, closed right after
+    '''
+    results: list[check.BulkCheckResult] = []
+    chunk: list[tuple[int, check.CreateCheck]] = []
+    persisting: asyncio.Future[list[check.BulkCheckResult]] | None = None
+    index = 0
+    try:
+        async for record in records:
+            try:
+                if index >= BULK_CHECKS_LIMIT:
+                    raise InvalidRecord([{'type': 'limit_exceeded', 'loc': [],
+                                          'msg': f'No more than {BULK_CHECKS_LIMIT} checks are accepted per request'}])
+                chunk.append((index, validate(record, creator)))
+            except InvalidRecord as e:
+                results.append(check.BulkCheckResult(index=index, errors=e.errors))
+            if len(chunk) >= BULK_CHECKS_CHUNK_SIZE:
+                if persisting:
+                    results.extend(await persisting)
+                persisting = asyncio.ensure_future(run_in_threadpool(persist, db, chunk))
+                chunk = []
+            index += 1
+    except BaseException:
+        if persisting:
+            await asyncio.wait([persisting])
+        raise
+    if persisting:
+        results.extend(await persisting)
+    if chunk:
+        results.extend(await run_in_threadpool(persist, db, chunk))
+
+    results.sort(key=lambda result: result.index)
+    failed = sum(1 for result in results if result.errors)
+    return check.BulkCreateChecksResponse(created=len(results) - failed, failed=failed, results=results)
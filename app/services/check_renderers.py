@@ -0,0 +1,99 @@
+'''
+Output formats of a check served by GET /checks/{id}/text, by their media types. The semantic HTML is built from
+the check itself, the other formats from its text representation, which is a single column read
+'''
+from html import escape
+from typing import Callable
+
+from app.models.checks import Check
+from app.services.check_builder import CHECK_LINE_LENGTH
+
+HTML_MEDIA_TYPE = 'text/html'
+TEXT_MEDIA_TYPE = 'text/plain'
+ESCPOS_MEDIA_TYPE = 'application/vnd.escpos'
+PDF_MEDIA_TYPE = 'application/pdf'
+
+ESCPOS_INIT = b'\x1b@\x1bt\x00'  # reset the printer, select the PC437 code page
+ESCPOS_CUT = b'\x1bd\x03\x1dV\x01'  # feed 3 lines, partial cut
+PDF_FONT_SIZE = 10  # Courier glyphs are 0.6 of the font size wide
+PDF_LEADING = 12
+PDF_MARGIN = 18
+PDF_PAGE_LINES = 100
+
+
+def render_html(check: Check) -> bytes:
+    items = ''.join(
+        f'<tr><td>{escape(item.title)}</td><td>{item.quantity:.2f}</td><td>{item.price:.2f}</td>'
+        f'<td>{item.amount:.2f}</td></tr>' for item in check.items)
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Check {check.id}</title></head><body>'
+        f'<article class="check"><header><h1>{escape(check.creator.name)}</h1></header>'
+        '<table class="items"><thead><tr><th>Item</th><th>Quantity</th><th>Price</th><th>Amount</th></tr></thead>'
+        f'<tbody>{items}</tbody></table><dl class="totals">'
+        f'<dt>Total</dt><dd>{check.total_amount:.2f}</dd>'
+        f'<dt>{check.payment_method.capitalize()}</dt><dd>{check.paid_amount:.2f}</dd>'
+        f'<dt>Change</dt><dd>{check.change:.2f}</dd></dl>'
+        f'<footer><time datetime="{check.created_at.isoformat()}">{check.created_at:%d.%m.%Y %H:%M}</time>'
+        '<p>Thank you for your purchase!</p></footer></article></body></html>'
+    ).encode()
+
+
+def render_plain_text(text: str) -> bytes:
+    return text.encode()
+
+
+def render_escpos(text: str) -> bytes:
+    '''
+    Byte stream for ESC/POS thermal printers, the text is already laid out to the paper width
+    '''
+    return ESCPOS_INIT + text.encode('cp437', errors='replace') + b'\n' + ESCPOS_CUT
+
+
+def pdf_string(line: str) -> bytes:
+    return b'(' + line.encode('cp1252', errors='replace').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(
+        b')', b'\\)') + b')'
+
+
+def render_pdf(text: str) -> bytes:
+    '''
+    Receipt sized PDF pages in a monospace (built-in) font, without any timestamps or IDs of its own,
+    so the same text always renders to the same bytes
+    '''
+    lines = text.splitlines()
+    pages = [lines[start:start + PDF_PAGE_LINES] for start in range(0, len(lines), PDF_PAGE_LINES)]
+    width = CHECK_LINE_LENGTH * PDF_FONT_SIZE * 0.6 + 2 * PDF_MARGIN
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % (4 + 2 * index) for index in range(len(pages))), len(pages)),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+    ]
+    for index, page_lines in enumerate(pages):
+        height = len(page_lines) * PDF_LEADING + 2 * PDF_MARGIN
+        content = b'BT /F1 %d Tf %d TL %d %d Td %s ET' % (
+            PDF_FONT_SIZE, PDF_LEADING, PDF_MARGIN, height - PDF_MARGIN - PDF_FONT_SIZE,
+            b' T* '.join(pdf_string(line) + b' Tj' for line in page_lines))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.1f %d] /Resources << /Font << /F1 3 0 R >> >> '
+                       b'/Contents %d 0 R >>' % (width, height, 5 + 2 * index))
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+
+    document = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(document))
+        document += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(document)
+    document += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    document += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    return document + b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+
+
+# The first one is served to the clients accepting any format
+CHECK_RENDERERS: dict[str, Callable[[Check], bytes]] = {HTML_MEDIA_TYPE: render_html}
+TEXT_RENDERERS: dict[str, Callable[[str], bytes]] = {
+    TEXT_MEDIA_TYPE: render_plain_text,
+    ESCPOS_MEDIA_TYPE: render_escpos,
+    PDF_MEDIA_TYPE: render_pdf,
+}
+MEDIA_TYPES = [*CHECK_RENDERERS, *TEXT_RENDERERS]
+CONTENT_TYPES = {HTML_MEDIA_TYPE: 'text/html; charset=utf-8', TEXT_MEDIA_TYPE: 'text/plain; charset=utf-8'}
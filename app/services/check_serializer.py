@@ -0,0 +1,78 @@
+'''
+Serialization of the checks read from the DB straight to JSON bytes, the same ones as of CheckResponse. The checks
+are not validated again: their attributes are put in plain dicts, dumped by the serializers compiled for the types
+below once, instead of building the response models for every check and item on every request
+'''
+from datetime import datetime
+from decimal import Decimal
+from typing import Sequence
+from uuid import UUID
+
+from fastapi_pagination import Page
+from fastapi_pagination.cursor import CursorPage
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict  # required by pydantic before Python 3.12
+
+from app.infra.enums import PaymentMethod
+from app.infra.request_stats import timed_phase
+from app.models.checks import Check
+
+
+# The keys are in the order of the CheckResponse fields, which is kept in the JSON
+class ItemPayload(TypedDict):
+    title: str
+    price: Decimal
+    quantity: int
+    amount: Decimal
+
+
+class PaymentPayload(TypedDict):
+    method: PaymentMethod
+    amount: Decimal
+
+
+class CheckPayload(TypedDict):
+    id: UUID
+    items: list[ItemPayload]
+    payment: PaymentPayload
+    total_amount: Decimal
+    change: Decimal
+    created_at: datetime
+
+
+check_adapter = TypeAdapter(CheckPayload)
+
+
+def check_payload(check: Check) -> CheckPayload:
+    return {
+        'id': check.id,
+        'items': [{'title': item.title, 'price': item.price, 'quantity': item.quantity, 'amount': item.amount}
+                  for item in check.items],
+        'payment': {'method': check.payment_method, 'amount': check.paid_amount},
+        'total_amount': check.total_amount,
+        'change': check.change,
+        'created_at': check.created_at,
+    }
+
+
+@timed_phase('serialization')
+def dump_check(check: Check) -> bytes:
+    return check_adapter.dump_json(check_payload(check))
+
+
+@timed_phase('serialization')
+def dump_checks_lines(checks: Sequence[Check]) -> bytes:
+    '''
+    NDJSON, one check per line
+    '''
+    return b''.join(check_adapter.dump_json(check_payload(check)) + b'\n' for check in checks)
+
+
+@timed_phase('serialization')
+def dump_page(page: Page[Check] | CursorPage[Check]) -> bytes:
+    '''
+    A page of checks (offset or cursor one) with the checks as they are returned by the repository
+    '''
+    payloads = [check_payload(check) for check in page.items]
+    page_type: type[Page[CheckPayload] | CursorPage[CheckPayload]] = type(page)[CheckPayload]  # type: ignore[index]
+    return page_type.model_construct(**{**dict(page), 'items': payloads}).model_dump_json().encode()
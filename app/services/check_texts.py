@@ -0,0 +1,48 @@
+import os
+from datetime import datetime
+from hashlib import blake2b
+from typing import NamedTuple
+from uuid import UUID
+
+from app.infra.cache import CacheBackend, LRUCache
+from app.services.check_renderers import MEDIA_TYPES, TEXT_MEDIA_TYPE
+
+CHECK_TEXT_CACHE_BYTES = int(os.getenv('CHECK_TEXT_CACHE_BYTES', 64 * 1024 * 1024))
+CHECK_TEXT_CACHE_TTL = float(os.getenv('CHECK_TEXT_CACHE_TTL', 3600))
+CHECK_TEXTS_BATCH_LIMIT = int(os.getenv('CHECK_TEXTS_BATCH_LIMIT', 1000))
+
+
+class CheckText(NamedTuple):
+    content: bytes  # rendered in one of the formats, see check_renderers
+    etag: str
+    created_at: datetime
+
+
+def build_check_text(id: UUID, content: bytes, created_at: datetime) -> CheckText:
+    return CheckText(content, f'"{id.hex}-{blake2b(content, digest_size=16).hexdigest()}"', created_at)
+
+
+# Checks don't change after creation, so the rendered texts are only invalidated on deletion. The default cache is
+# per process: invalidation reaches only the current worker, others rely on the TTL unless a shared backend is set.
+# Each format is cached under its own key, so the expensive ones are rendered once per check
+check_text_cache: CacheBackend[tuple[UUID, str], CheckText] = LRUCache(
+    maxsize=CHECK_TEXT_CACHE_BYTES, ttl=CHECK_TEXT_CACHE_TTL, weigher=lambda check_text: len(check_text.content))
+
+
+def set_check_text_cache(backend: CacheBackend[tuple[UUID, str], CheckText]) -> None:
+    global check_text_cache
+    check_text_cache = backend
+
+
+def get_check_text(id: UUID, media_type: str = TEXT_MEDIA_TYPE) -> CheckText | None:
+    return check_text_cache.get((id, media_type))
+
+
+def cache_check_text(id: UUID, check_text: CheckText, media_type: str = TEXT_MEDIA_TYPE) -> None:
+    check_text_cache.set((id, media_type), check_text)
+
+
+def invalidate_check_texts(*ids: UUID) -> None:
+    for id in ids:
+        for media_type in MEDIA_TYPES:
+            check_text_cache.delete((id, media_type))
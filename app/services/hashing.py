@@ -1,12 +1,76 @@
+import asyncio
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore
+from typing import Any, Callable, TypeVar
+
 import bcrypt
+from fastapi import HTTPException
+from starlette import status
+
+from app.infra.metrics import HASHING_DURATION, HASHING_PENDING, HASHING_REJECTED, timed
+from app.infra.request_stats import timed_phase
+
+HASHING_WORKERS = int(os.getenv('HASHING_WORKERS', 2))
+HASHING_QUEUE_LIMIT = int(os.getenv('HASHING_QUEUE_LIMIT', 32))
+HASHING_RETRY_AFTER = int(os.getenv('HASHING_RETRY_AFTER', 1))
+
+T = TypeVar('T')
+
+
+class HashingPool:
+    '''
+    Dedicated executor for the CPU-bound bcrypt calls, so auth bursts can't exhaust the shared request threadpool.
+    Operations beyond the workers and queue limit are rejected right away instead of piling up
+    '''
+    def __init__(self, workers: int, queue_limit: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashing')
+        self._slots = BoundedSemaphore(workers + queue_limit)
+
+    def submit(self, operation: str, fn: Callable[..., T], *args: Any) -> Future[T]:
+        if not self._slots.acquire(blocking=False):
+            HASHING_REJECTED.inc()
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail='Too many concurrent authentication requests, try again later',
+                                headers={'Retry-After': str(HASHING_RETRY_AFTER)})
+        HASHING_PENDING.inc()
+        return self._executor.submit(self._run, operation, fn, *args)
+
+    def _run(self, operation: str, fn: Callable[..., T], *args: Any) -> T:
+        try:
+            with HASHING_DURATION.labels(operation).time():
+                return fn(*args)
+        finally:
+            HASHING_PENDING.dec()
+            self._slots.release()
+
+
+hashing_pool = HashingPool(workers=HASHING_WORKERS, queue_limit=HASHING_QUEUE_LIMIT)
+
+
+def _encrypt(password: str) -> str:
+    salt = bcrypt.gensalt()
+    return bcrypt.hashpw(password.encode(), salt).decode()
+
+
+def _verify(hashed_password: str, plain_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
 
 class Hash:
     @staticmethod
     def encrypt(password: str) -> str:
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(password.encode(), salt).decode()
+        return hashing_pool.submit('encrypt', _encrypt, password).result()
+
+    @staticmethod
+    async def encrypt_async(password: str) -> str:
+        return await asyncio.wrap_future(hashing_pool.submit('encrypt', _encrypt, password))
 
     @staticmethod
-    def verify(hashed_password: str, plain_password: str) -> bool:
-        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    @timed('Hash.verify')
+    @timed_phase('auth')
+    async def verify(hashed_password: str, plain_password: str) -> bool:
+        '''
+        Await the verification without holding a threadpool thread
+        '''
+        return await asyncio.wrap_future(hashing_pool.submit('verify', _verify, hashed_password, plain_password))
@@ -0,0 +1,15 @@
+import os
+from uuid import UUID
+
+from app.infra.cache import LRUCache
+from app.schemas.user import Principal
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', 10000))
+PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', 60))
+
+# The cache is per process: invalidation reaches only the current worker, others rely on the TTL
+principal_cache: LRUCache[UUID, Principal] = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(id: UUID) -> None:
+    principal_cache.delete(id)
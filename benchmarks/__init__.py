@@ -0,0 +1,78 @@
+import asyncio
+import random
+import statistics
+import string
+import time
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+import httpx
+
+from app.infra.database import session_scope
+from app.main import app
+from app.models.users import User
+from app.services.hashing import Hash
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict[str, float]:
+    '''
+    Latency percentiles (ms) and throughput (requests per second) of a benchmark run
+    '''
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(quantiles[49] * 1000, 3),
+        'p95_ms': round(quantiles[94] * 1000, 3),
+        'p99_ms': round(quantiles[98] * 1000, 3),
+        'rps': round(len(latencies) / elapsed, 1),
+    }
+
+
+def create_user() -> tuple[UUID, str, str]:
+    '''
+    Create a benchmark user, returning its ID, login and password
+    '''
+    login = 'bench-' + ''.join(random.choices(string.ascii_lowercase + string.digits, k=10))
+    password = ''.join(random.choices(string.ascii_lowercase + string.digits, k=10))
+    with session_scope() as session:
+        user = User(name=login, login=login, email=f'{login}@example.com', password=Hash.encrypt(password))
+        session.add(user)
+        session.commit()
+        return user.id, login, password
+
+
+def print_table(rows: list[dict[str, Any]]) -> None:
+    columns = list(rows[0])
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print('  '.join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+def client(base_url: str | None = None) -> httpx.AsyncClient:
+    '''
+    HTTP client for a running server, or an in-process one calling the application directly
+    '''
+    if base_url:
+        return httpx.AsyncClient(base_url=base_url, timeout=60)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://testserver', timeout=60)
+
+
+async def run_load(send: Callable[[], Awaitable[httpx.Response]], requests: int,
+                   concurrency: int) -> dict[str, float]:
+    '''
+    Send the given number of requests keeping at most `concurrency` of them in flight
+    '''
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed_send() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send()
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_send() for _ in range(requests)))
+    return summarize(latencies, time.perf_counter() - started)
@@ -0,0 +1,71 @@
+'''
+Concurrency of a check read served by a sync endpoint (threadpool thread and psycopg2 session per request)
+against the async one (asyncpg session awaited on the event loop), at increasing numbers of in-flight requests.
+
+    python -m benchmarks.async_path --requests 2000 --concurrency 16 64 256 --db-latency 0.02
+
+The sync twin of the endpoint is only mounted for in-process runs. To load test a running server, start a single
+worker (as each gunicorn worker has its own threadpool and event loop) of the revisions being compared, and pass
+--base-url to each run. --db-latency adds a server-side sleep to each request emulating a slower query or network
+'''
+import argparse
+import asyncio
+from uuid import UUID
+
+from benchmarks import client, create_user, print_table, run_load
+from benchmarks.check_creation import build_schema
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.infra.database import get_async_db, get_db, session_scope
+from app.main import app
+from app.repositories import async_check
+from app.repositories import check as check_repo
+from app.schemas import check
+
+
+def mount_twins(db_latency: float) -> None:
+    @app.get('/bench/sync/checks/{id}')
+    def get_check_sync(id: UUID, db: Session = Depends(get_db)) -> check.CheckResponse:
+        if db_latency:
+            db.execute(select(func.pg_sleep(db_latency)))
+        return check.CheckResponse.model_validate(check_repo.get_by_id(db, id))
+
+    @app.get('/bench/async/checks/{id}')
+    async def get_check_async(id: UUID, db: AsyncSession = Depends(get_async_db)) -> check.CheckResponse:
+        if db_latency:
+            await db.execute(select(func.pg_sleep(db_latency)))
+        return check.CheckResponse.model_validate(await async_check.get_by_id(db, id))
+
+
+async def main(base_url: str | None, requests: int, concurrencies: list[int], db_latency: float) -> None:
+    creator_id, login, password = create_user()
+    with session_scope() as db:
+        check_id = check_repo.create(db, build_schema(creator_id, login, 5)).id
+    if base_url:
+        modes = [('remote', f'/checks/{check_id}')]
+    else:
+        mount_twins(db_latency)
+        modes = [('sync', f'/bench/sync/checks/{check_id}'), ('async', f'/bench/async/checks/{check_id}')]
+
+    rows = []
+    async with client(base_url) as http:
+        token = (await http.post('/login', data=dict(username=login, password=password))).json()
+        headers = {'Authorization': f'Bearer {token["access_token"]}'}
+        for concurrency in concurrencies:
+            for label, url in modes:
+                result = await run_load(lambda: http.get(url, headers=headers), requests, concurrency)
+                rows.append({'mode': label, 'concurrency': concurrency, **result})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default=None, help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--db-latency', type=float, default=0.02, help='Seconds slept by each in-process request')
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.requests, args.concurrency, args.db_latency))
@@ -0,0 +1,55 @@
+'''
+Throughput of the bulk check ingestion endpoint.
+
+    python -m benchmarks.bulk_ingestion --checks 100000 --items 5 --format ndjson
+'''
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks import client, create_user, print_table
+
+from app.infra.enums import PaymentMethod
+
+
+def generate_checks(checks: int, items: int) -> list[dict[str, object]]:
+    return [{
+        'payment': {'method': random.choice(list(PaymentMethod)), 'amount': '99999.99'},
+        'additional_info': f'Bulk check {i}',
+        'items': [{'title': f'Item {j}', 'price': f'{random.randint(100, 10000) / 100:.2f}',
+                   'quantity': random.randint(1, 10)} for j in range(items)],
+    } for i in range(checks)]
+
+
+async def main(base_url: str | None, checks: int, items: int, body_format: str) -> None:
+    _, login, password = create_user()
+    records = generate_checks(checks, items)
+    if body_format == 'ndjson':
+        body = b'\n'.join(json.dumps(record).encode() for record in records)
+        content_type = 'application/x-ndjson'
+    else:
+        body = json.dumps(records).encode()
+        content_type = 'application/json'
+
+    async with client(base_url) as http:
+        token = (await http.post('/login', data=dict(username=login, password=password))).json()['access_token']
+        started = time.perf_counter()
+        response = await http.post('/checks/bulk', content=body, timeout=None, headers={
+            'Authorization': f'Bearer {token}', 'Content-Type': content_type})
+        elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    print_table([{'format': body_format, 'checks': checks, 'items_per_check': items,
+                  'body_mb': round(len(body) / 2 ** 20, 1), 'created': response.json()['created'],
+                  'seconds': round(elapsed, 2), 'checks_per_second': round(checks / elapsed)}])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default=None, help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--checks', type=int, default=100000)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--format', dest='body_format', choices=['json', 'ndjson'], default='ndjson')
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.checks, args.items, args.body_format))
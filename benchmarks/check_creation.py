@@ -0,0 +1,72 @@
+'''
+Check creation latency per number of items: the legacy per-item ORM flush (totals maintained by the item listener)
+against the set-based repository pipeline.
+
+    python -m benchmarks.check_creation --sizes 1 10 100 1000 --repeat 20
+'''
+import argparse
+import random
+import time
+from uuid import UUID
+
+from benchmarks import create_user, print_table, summarize
+
+from app.infra.database import count_statements, session_scope
+from app.infra.enums import PaymentMethod
+from app.models.checks import Check, Item
+from app.repositories import check as check_repo
+from app.schemas.check import CreateCheck
+
+
+def legacy_create(schema: CreateCheck) -> None:
+    with session_scope() as db:
+        new_check = Check(creator_id=schema.creator_id, payment_method=schema.payment.method,
+                          paid_amount=schema.payment.amount, additional_info=schema.additional_info)
+        db.add(new_check)
+        db.flush()
+        for item in schema.items:
+            db.add(Item(**item.model_dump(), check_id=new_check.id))
+        db.commit()
+        db.refresh(new_check)
+
+
+def pipeline_create(schema: CreateCheck) -> None:
+    with session_scope() as db:
+        check_repo.create(db, schema)
+
+
+def build_schema(creator_id: UUID, creator_name: str, items: int) -> CreateCheck:
+    return CreateCheck.model_validate({
+        'creator_id': creator_id,
+        'creator_name': creator_name,
+        'payment': {'method': PaymentMethod.CASH, 'amount': '99999999.99'},
+        'items': [{'title': f'Item {i}', 'price': f'{random.randint(100, 10000) / 100:.2f}',
+                   'quantity': random.randint(1, 10)} for i in range(items)],
+    })
+
+
+def main(sizes: list[int], repeat: int) -> None:
+    creator_id, creator_name, _ = create_user()
+    rows = []
+    for size in sizes:
+        schema = build_schema(creator_id, creator_name, size)
+        for label, create in (('legacy', legacy_create), ('pipeline', pipeline_create)):
+            latencies = []
+            with count_statements() as executed:
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    call_started = time.perf_counter()
+                    create(schema)
+                    latencies.append(time.perf_counter() - call_started)
+                elapsed = time.perf_counter() - started
+            rows.append({'items': size, 'mode': label, **summarize(latencies, elapsed),
+                         'statements_per_check': len(executed.statements) // repeat})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
@@ -0,0 +1,97 @@
+'''
+Check text rendering time per number of items: the legacy renderer (line length read from the environment and
+a new text wrapper per call) against the layout computed once with the wrapped titles and names memoized, with
+the memoized ones (warm) and without them (cold). Both outputs are compared for every rendered check size.
+
+    python -m benchmarks.check_text --sizes 1 10 100 1000 10000 --repeat 50 --titles 500
+'''
+import argparse
+import os
+import random
+import textwrap
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Mapping, Sequence
+from uuid import uuid4
+
+from benchmarks import print_table, summarize
+from benchmarks.check_creation import build_schema
+
+from app.repositories import check as check_repo
+from app.services.check_builder import render_text, wrap_name, wrap_title
+
+
+def legacy_render_text(creator_name: str, check: Mapping[str, Any], items: Sequence[Mapping[str, Any]]) -> str:
+    LINE_LENGTH = int(os.getenv('CHECK_LINE_LENGTH', 40))
+    LEFT_SIDE_MAX_LENGTH = int(LINE_LENGTH * 0.7)
+    RIGHT_SIDE_MAX_LENGTH = LINE_LENGTH - LEFT_SIDE_MAX_LENGTH
+    check_lines = []
+    for line in textwrap.fill(f'{creator_name}', width=LINE_LENGTH).splitlines():
+        check_lines.append(line.center(LINE_LENGTH))
+    check_lines.append('=' * LINE_LENGTH)
+    for i, item in enumerate(items):
+        check_lines.append(f'{item["quantity"]:.2f} x {item["price"]:.2f}')
+        wrapped_lines = textwrap.fill(item['title'], width=LEFT_SIDE_MAX_LENGTH).splitlines()
+        for j, line in enumerate(wrapped_lines):
+            if j == len(wrapped_lines) - 1:
+                check_lines.append(f'{line:<{LEFT_SIDE_MAX_LENGTH}}{item["amount"]:>{RIGHT_SIDE_MAX_LENGTH}}')
+            else:
+                check_lines.append(f'{line:<{LEFT_SIDE_MAX_LENGTH}}')
+        if i < len(items) - 1:
+            check_lines.append('-' * LINE_LENGTH)
+    check_lines.append('=' * LINE_LENGTH)
+    check_lines.append(f'{"TOTAL":<{LEFT_SIDE_MAX_LENGTH}}{check["total_amount"]:>{RIGHT_SIDE_MAX_LENGTH}.2f}')
+    payment_method = check['payment_method'].capitalize()
+    check_lines.append(f'{payment_method:<{LEFT_SIDE_MAX_LENGTH}}{check["paid_amount"]:>{RIGHT_SIDE_MAX_LENGTH}.2f}')
+    check_lines.append(f'{"Change":<{LEFT_SIDE_MAX_LENGTH}}{check["change"]:>{RIGHT_SIDE_MAX_LENGTH}.2f}')
+    check_lines.append('=' * LINE_LENGTH)
+    check_lines.append(check['created_at'].strftime('%d.%m.%Y %H:%M').center(LINE_LENGTH))
+    check_lines.append('Thank you for your purchase!'.center(LINE_LENGTH))
+    return '\n'.join(check_lines)
+
+
+def build_rows(size: int, titles: list[str]) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    schema = build_schema(uuid4(), 'Bench', size)
+    for item in schema.items:
+        item.title = random.choice(titles)
+    check_row, item_rows = check_repo.build(schema)
+    check_row['created_at'] = datetime.now(timezone.utc)
+    return check_row, item_rows
+
+
+def main(sizes: list[int], repeat: int, titles_count: int) -> None:
+    words = ['Premium', 'Eco', 'Smart', 'Compact', 'Organic', 'Tomato', 'Potato', 'Sparkling', 'Water', 'Whole',
+             'Grain', 'Bread', 'Extra-virgin', 'Olive', 'Oil', 'Family', 'Pack', 'Chocolate', 'Coffee', 'Beans']
+    titles = [' '.join(random.choices(words, k=random.randint(1, 8))) for _ in range(titles_count)]
+    creator_name = 'Temperature-resistant Weather-resistant Products 1562 LLC'
+
+    def cold_render_text(*args: Any) -> str:
+        wrap_name.cache_clear()
+        wrap_title.cache_clear()
+        return render_text(*args)
+
+    renderers: list[tuple[str, Callable[..., str]]] = [
+        ('legacy', legacy_render_text), ('cold', cold_render_text), ('warm', render_text)]
+    rows = []
+    for size in sizes:
+        check_row, item_rows = build_rows(size, titles)
+        expected_text = legacy_render_text(creator_name, check_row, item_rows)
+        assert render_text(creator_name, check_row, item_rows) == expected_text
+        for label, render in renderers:
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(repeat):
+                call_started = time.perf_counter()
+                render(creator_name, check_row, item_rows)
+                latencies.append(time.perf_counter() - call_started)
+            rows.append({'items': size, 'renderer': label, **summarize(latencies, time.perf_counter() - started)})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--titles', type=int, default=500, help='Number of distinct item titles')
+    args = parser.parse_args()
+    main(args.sizes, args.repeat, args.titles)
@@ -0,0 +1,58 @@
+'''
+Before/after load test of the principal cache on an authenticated check read.
+
+    python -m benchmarks.principal_cache --requests 2000 --concurrency 32
+
+In-process runs measure both modes at once. To load test a running server, start it once with
+PRINCIPAL_CACHE_SIZE=0 and once with the default size, and pass --base-url to each run.
+'''
+import argparse
+import asyncio
+from decimal import Decimal
+
+from benchmarks import client, create_user, print_table, run_load
+
+from app.infra.database import count_statements, session_scope
+from app.infra.enums import PaymentMethod
+from app.models.checks import Check, Item
+from app.services.principals import principal_cache
+
+
+def seed() -> tuple[str, str, str]:
+    user_id, login, password = create_user()
+    with session_scope() as session:
+        check = Check(creator_id=user_id, payment_method=PaymentMethod.CASH, paid_amount=Decimal(100))
+        session.add(check)
+        session.flush()
+        session.add(Item(check_id=check.id, title='Item', price=Decimal(10), quantity=1))
+        session.commit()
+        return login, password, str(check.id)
+
+
+async def main(base_url: str | None, requests: int, concurrency: int) -> None:
+    login, password, check_id = seed()
+    async with client(base_url) as http:
+        token = (await http.post('/login', data=dict(username=login, password=password))).json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+        rows = []
+        modes = [('remote', principal_cache.maxsize)] if base_url else [
+            ('before (no cache)', 0), ('after (cache)', principal_cache.maxsize)]
+        for label, maxsize in modes:
+            principal_cache.maxsize = maxsize
+            principal_cache.clear()
+            # Statements are counted only for in-process runs, a remote server has its own engine
+            with count_statements() as executed:
+                result = await run_load(lambda: http.get(f'/checks/{check_id}', headers=headers),
+                                        requests, concurrency)
+            users_selects = [statement for statement in executed.statements if 'FROM users' in statement]
+            rows.append({'mode': label, **result, 'users_selects': len(users_selects)})
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default=None, help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.requests, args.concurrency))
@@ -0,0 +1,196 @@
+'''
+The benchmark suite: the main routes under HTTP load (login, check creation, the list with each filter, a check,
+its text and the profile) on a seeded dataset, along with micro benchmarks of the hot functions. The latency
+percentiles and throughput of every benchmark are written into a JSON baseline, the runs of other commits are
+compared with.
+
+    python -m benchmarks.suite --users 100 --checks 100000 --output baseline.json
+    git checkout <other commit>
+    python -m benchmarks.suite --users 100 --checks 100000 --compare baseline.json
+
+The dataset (--checks spread among --users, with --items each) is seeded by utils/populate.py on the first run
+into the configured (local) Postgres, and reused by the next runs, which must ask for the same size. To seed
+another size, reset the DB by downgrading and upgrading the migrations. Sizes from 10k to 10M checks are meant,
+mind the profile benchmark reads all the checks of a user. The requests are sent in random order of the given
+--seed, so the runs are comparable. To load test a running server pass --base-url, it's expected to share the DB
+and SECRET_KEY with the benchmark
+'''
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+import httpx
+from benchmarks import client, create_user, print_table, run_load, summarize
+from benchmarks.check_creation import build_schema
+from benchmarks.serialization import build_check
+from fastapi_pagination import Page, Params
+from sqlalchemy import func, select
+from utils.populate import populate_data
+
+from app.infra.database import session_scope
+from app.infra.enums import PaymentMethod
+from app.models.checks import Check, CheckStats
+from app.models.users import User
+from app.repositories import check as check_repo
+from app.services.auth import create_access_token
+from app.services.check_builder import render_text
+from app.services.check_serializer import dump_page
+
+SEEDED_LOGINS = '^user[0-9]+$'  # as populate_data names them
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'rps')
+# Within the period populate_data spreads the checks over
+LIST_FILTERS: dict[str, dict[str, str]] = {
+    'list': {},
+    'list by period': {'period_start': '2025-03-01', 'period_end': '2025-03-07'},
+    'list by amount': {'total_amount_ge': '1000', 'total_amount_le': '2000'},
+    'list by payment method': {'payment_method': PaymentMethod.CASH},
+}
+
+
+def seed(users: int, checks: int, items: int) -> list[UUID]:
+    '''
+    Seed the dataset unless it's there, returns the IDs of its users
+    '''
+    with session_scope() as db:
+        user_ids = list(db.scalars(select(User.id).filter(User.login.regexp_match(SEEDED_LOGINS))))
+        seeded = db.scalar(select(func.coalesce(func.sum(CheckStats.checks_count), 0))
+                           .filter(CheckStats.creator_id.in_(user_ids)))
+    if not user_ids:
+        populate_data(num_users=users, num_checks=checks // users, num_items=items)
+        return seed(users, checks, items)
+    if len(user_ids) != users or seeded != checks // users * users:
+        raise SystemExit(f'The DB has another dataset seeded ({len(user_ids)} users, {seeded} checks), '
+                         'reset it to seed this one')
+    return user_ids
+
+
+def micro_benchmarks(repeat: int) -> dict[str, dict[str, float]]:
+    '''
+    CPU time of the functions every check creation and read goes through
+    '''
+    creator_id, creator_name = UUID(int=0), 'Benchmark Enterprises LLC'
+    check_row, item_rows = check_repo.build(build_schema(creator_id, creator_name, 5))
+    page = Page.create([build_check(5) for _ in range(50)], Params(page=1, size=50), total=50)
+    functions: dict[str, Callable[[], Any]] = {
+        'micro: build check': lambda: check_repo.build(build_schema(creator_id, creator_name, 5)),
+        'micro: render text': lambda: render_text(creator_name, check_row, item_rows),
+        'micro: serialize page': lambda: dump_page(page),
+    }
+    results = {}
+    for name, function in functions.items():
+        latencies = []
+        started = time.process_time()
+        for _ in range(repeat):
+            call_started = time.process_time()
+            function()
+            latencies.append(time.process_time() - call_started)
+        results[name] = summarize(latencies, time.process_time() - started)
+    return results
+
+
+async def http_benchmarks(base_url: str | None, user_ids: list[UUID], requests: int, concurrency: int,
+                          warmup: int) -> dict[str, dict[str, float]]:
+    '''
+    Latencies and throughput of the routes, the reads are of the seeded users' checks
+    '''
+    reader_id = random.choice(user_ids)
+    with session_scope() as db:
+        check_ids = list(db.scalars(select(Check.id).filter(Check.creator_id == reader_id).order_by(Check.id)))
+    writer_id, login, password = create_user()  # the created checks are not added to the dataset
+    reader = {'Authorization': f'Bearer {create_access_token({"id": str(reader_id)})}'}
+    writer = {'Authorization': f'Bearer {create_access_token({"id": str(writer_id)})}'}
+
+    async with client(base_url) as http:
+        def list_own(params: dict[str, str]) -> Callable[[], Awaitable[httpx.Response]]:
+            return lambda: http.get('/checks/own', params=params, headers=reader)
+
+        scenarios: dict[str, Callable[[], Awaitable[httpx.Response]]] = {
+            'login': lambda: http.post('/login', data=dict(username=login, password=password)),
+            'create': lambda: http.post('/checks', headers=writer, json=build_schema(writer_id, login, 5).model_dump(
+                mode='json', include={'payment', 'items'})),
+            **{name: list_own(params) for name, params in LIST_FILTERS.items()},
+            'list by cursor': lambda: http.get('/checks/own/cursor', headers=reader),
+            'get': lambda: http.get(f'/checks/{random.choice(check_ids)}', headers=reader),
+            'text': lambda: http.get(f'/checks/{random.choice(check_ids)}/text', headers={
+                **reader, 'Accept': 'text/plain'}),
+            'profile': lambda: http.get('/users/profile', headers=reader),
+        }
+        results = {}
+        for name, send in scenarios.items():
+            if warmup:
+                await run_load(send, warmup, concurrency)
+            results[name] = await run_load(send, requests, concurrency)
+    return results
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def compare(baseline: dict[str, Any], run: dict[str, Any]) -> list[dict[str, Any]]:
+    '''
+    Rows of the results changed against the baseline, the latencies are better when lower, the throughput higher
+    '''
+    rows = []
+    for name, result in run['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        row: dict[str, Any] = {'benchmark': name}
+        for metric in METRICS:
+            change = (result[metric] - before[metric]) / before[metric] if before[metric] else 0
+            row[metric] = f'{before[metric]} -> {result[metric]} ({change:+.1%})'
+        rows.append(row)
+    return rows
+
+
+def main(base_url: str | None, users: int, checks: int, items: int, requests: int, concurrency: int, warmup: int,
+         repeat: int, seed_value: int, output: str | None, baseline_path: str | None) -> None:
+    random.seed(seed_value)
+    user_ids = seed(users, checks, items)
+    run: dict[str, Any] = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'dataset': {'users': users, 'checks': checks, 'items': items},
+        'settings': {'base_url': base_url, 'requests': requests, 'concurrency': concurrency, 'warmup': warmup,
+                     'repeat': repeat, 'seed': seed_value},
+        'results': {**asyncio.run(http_benchmarks(base_url, user_ids, requests, concurrency, warmup)),
+                    **micro_benchmarks(repeat)},
+    }
+    print_table([{'benchmark': name, **result} for name, result in run['results'].items()])
+    if output:
+        with open(output, 'w') as file:
+            json.dump(run, file, indent=2)
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        print(f'\nAgainst the baseline of {baseline["commit"]} ({baseline["created_at"]})')
+        for key in ('dataset', 'settings'):
+            if baseline[key] != run[key]:
+                print(f'Different {key} in the baseline: {baseline[key]}, the results are not comparable')
+        print_table(compare(baseline, run))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default=None, help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--checks', type=int, default=10000, help='Checks of all the users')
+    parser.add_argument('--items', type=int, default=5, help='Number of items per check')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=20, help='Requests per route sent before the measured ones')
+    parser.add_argument('--repeat', type=int, default=1000, help='Calls per micro benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random choices of the requests')
+    parser.add_argument('--output', default=None, help='Write the results as a JSON baseline into the file')
+    parser.add_argument('--compare', default=None, help='Compare the results with the JSON baseline in the file')
+    args = parser.parse_args()
+    main(args.base_url, args.users, args.checks, args.items, args.requests, args.concurrency, args.warmup,
+         args.repeat, args.seed, args.output, args.compare)
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from typing import Any
 
 environment = os.getenv('ENVIRONMENT')
 is_dev = environment == 'dev'
@@ -6,8 +8,29 @@ is_dev = environment == 'dev'
 bind = '0.0.0.0:80'
 reload = is_dev
 worker_class = 'uvicorn.workers.UvicornWorker'
-workers = 1 if is_dev else 4
+workers = int(os.getenv('WEB_CONCURRENCY', 1 if is_dev else 4))
 max_requests = 2048
 max_requests_jitter = 256
 
 accesslog = '-' if is_dev else None
+
+
+def on_starting(server: Any) -> None:
+    # The workers split the DB connections budget between them (see app/infra/database.py), the number may be
+    # overridden by the --workers option, hence it's passed on once the configuration is final
+    os.environ['WEB_CONCURRENCY'] = str(server.cfg.workers)
+    # The workers write their metrics to the files of this directory, aggregated by the one serving /metrics.
+    # The ones left by the previous run are removed, not to be counted again
+    metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='prometheus-'))
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    # The live gauges of a worker that has exited (e.g. restarted after max_requests) are no longer counted.
+    # Not imported on top: the workers are forked from here, their metrics only go to files if it's imported after
+    # PROMETHEUS_MULTIPROC_DIR is set
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
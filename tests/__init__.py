@@ -15,5 +15,6 @@ class SeededUser(UserResponseWithChecks):
 def random_string(k: int = 10) -> str:
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=k))
 
+
 def datetime_to_str(dt: datetime.datetime) -> str:
     return dt.astimezone(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
@@ -1,11 +1,12 @@
-from typing import Iterable
+from typing import Iterable, Iterator
 
 import pytest
 from alembic import command
 from alembic.config import Config
 from fastapi.testclient import TestClient
 from sqlalchemy.orm.session import close_all_sessions
-from tests import SeededUser
+from starlette import status
+from tests import SeededUser, random_string
 from utils.populate import populate_data
 
 from app.infra.database import get_db_url, session_scope
@@ -26,8 +27,10 @@ def alembic_upgrade_downgrade() -> Iterable[None]:
 
 
 @pytest.fixture(scope='session')
-def test_client() -> TestClient:
-    return TestClient(app)
+def test_client() -> Iterator[TestClient]:
+    # Entered once for the whole session: the app runs on a single event loop, which the async pool is bound to
+    with TestClient(app) as client:
+        yield client
 
 
 @pytest.fixture(scope='session', autouse=True)
@@ -41,3 +44,18 @@ def seeded_user(seed_db: dict[str, str]) -> SeededUser:
         user = session.query(User).filter(User.login == 'user1').one()
         user_schema = UserResponseWithChecks.model_validate(user)
         return SeededUser(**user_schema.model_dump(), password=seed_db['password'])
+
+
+@pytest.fixture
+def new_user_headers(test_client: TestClient) -> dict[str, str]:
+    '''
+    Authorization headers of a newly registered user without checks
+    '''
+    login = random_string()
+    password = random_string()
+    response = test_client.post(url='/users', json=dict(name=random_string(), login=login,
+                                                        email=f'{random_string()}@gmail.com', password=password))
+    assert response.status_code == status.HTTP_201_CREATED
+    auth_response = test_client.post(url='/login', data=dict(username=login, password=password))
+    assert auth_response.status_code == status.HTTP_200_OK
+    return {'Authorization': f'Bearer {auth_response.json()["access_token"]}'}
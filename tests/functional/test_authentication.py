@@ -1,33 +1,80 @@
+from threading import BoundedSemaphore
+from uuid import uuid4
+
 import pytest
 from fastapi.testclient import TestClient
 from starlette import status
 from tests import SeededUser, random_string
 
+from app.infra.database import count_statements
+from app.schemas.user import Principal
+from app.services.hashing import HASHING_RETRY_AFTER, hashing_pool
+from app.services.principals import invalidate_principal, principal_cache
+
 
 @pytest.mark.parametrize('str_method', ['lower', 'capitalize', 'upper'])
 def test_login_success(test_client: TestClient, seeded_user: SeededUser, str_method: str) -> None:
-    with test_client:
-        login = getattr(seeded_user.login, str_method)()  # Asserts that the login string is case-insensitive
-        response = test_client.post(url='/login', data=dict(username=login, password=seeded_user.password))
+    login = getattr(seeded_user.login, str_method)()  # Asserts that the login string is case-insensitive
+    response = test_client.post(url='/login', data=dict(username=login, password=seeded_user.password))
 
-        assert response.status_code == status.HTTP_200_OK
-        assert response.json()['access_token']
-        assert response.json()['token_type'] == 'bearer'
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['access_token']
+    assert response.json()['token_type'] == 'bearer'
 
 
 def test_login_user_not_found(test_client: TestClient) -> None:
     login = random_string()
 
-    with test_client:
-        response = test_client.post(url='/login', data=dict(username=login, password=random_string()))
+    response = test_client.post(url='/login', data=dict(username=login, password=random_string()))
 
-        assert response.status_code == status.HTTP_404_NOT_FOUND
-        assert response.json() == {'detail': f'There is no user with such login: {login}'}
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {'detail': f'There is no user with such login: {login}'}
 
 
 def test_login_wrong_password(test_client: TestClient, seeded_user: SeededUser) -> None:
-    with test_client:
-        response = test_client.post(url='/login', data=dict(username=seeded_user.login, password=random_string()))
+    response = test_client.post(url='/login', data=dict(username=seeded_user.login, password=random_string()))
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json() == {'detail': f'Invalid password for user with login: {seeded_user.login}'}
+
+
+def test_login_hashing_pool_full(test_client: TestClient, seeded_user: SeededUser,
+                                 monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(hashing_pool, '_slots', BoundedSemaphore(0))  # no free slots
+
+    response = test_client.post(url='/login', data=dict(username=seeded_user.login,
+                                                        password=seeded_user.password))
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers['retry-after'] == str(HASHING_RETRY_AFTER)
+    assert response.json() == {'detail': 'Too many concurrent authentication requests, try again later'}
+
+
+@pytest.mark.parametrize('maxsize, ttl, action, cached', [
+    (10, 60.0, None, True),
+    (0, 60.0, None, False),  # disabled cache
+    (10, -1.0, None, False),  # expired entry
+    (1, 60.0, 'evict', False),
+    (10, 60.0, 'invalidate', False),  # i.e. on the user's password reset
+])
+def test_principal_cache(test_client: TestClient, seeded_user: SeededUser, monkeypatch: pytest.MonkeyPatch,
+                         maxsize: int, ttl: float, action: str | None, cached: bool) -> None:
+    monkeypatch.setattr(principal_cache, 'maxsize', maxsize)
+    monkeypatch.setattr(principal_cache, 'ttl', ttl)
+    principal_cache.clear()
+    auth_response = test_client.post(url='/login', data=dict(username=seeded_user.login, password=seeded_user.password))
+    assert auth_response.status_code == status.HTTP_200_OK
+    headers = {'Authorization': f'Bearer {auth_response.json()["access_token"]}'}
+
+    def users_table_selects() -> int:
+        with count_statements() as executed:
+            response = test_client.get(url=f'/checks/{seeded_user.checks[0].id}', headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return len([statement for statement in executed.statements if 'FROM users' in statement])
 
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED
-        assert response.json() == {'detail': f'Invalid password for user with login: {seeded_user.login}'}
+    assert users_table_selects() == 1
+    if action == 'evict':
+        principal_cache.set(uuid4(), Principal(id=uuid4(), login=random_string(), name=random_string()))
+    elif action == 'invalidate':
+        invalidate_principal(seeded_user.id)
+    assert users_table_selects() == (0 if cached else 1)
@@ -1,76 +1,119 @@
+import csv
+import io
+import json
 import random
+import time
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Any
-from uuid import uuid4
+from html import escape
+from typing import Any, AsyncIterator
+from uuid import UUID, uuid4
 
 import pytest
+from fastapi import Request
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
+from sqlalchemy import insert
 from starlette import status
+from starlette.requests import ClientDisconnect
 from tests import SeededUser, datetime_to_str, random_string
+from utils.backfill_repr import backfill_repr
 
-from app.infra.database import session_scope
-from app.infra.enums import PaymentMethod
+from app.controllers import negotiate
+from app.infra.cache import LRUCache
+from app.infra.database import count_statements, session_scope
+from app.infra.enums import CountStrategy, ExportFormat, PaymentMethod
 from app.models.checks import Check, Item
 from app.models.users import User
+from app.repositories import check as check_repo
 from app.schemas.check import ItemResponse
+from app.schemas.user import Principal
+from app.services import check_builder, check_export, check_ingestion, check_texts
 from app.services.hashing import Hash
 
 
 def test_create_check_success(test_client: TestClient) -> None:
-    with test_client:
-        login = random_string()
-        password = random_string()
-        with test_client:
-            response = test_client.post(url='/users', json=dict(name=random_string(),
-                                                                login=login,
-                                                                email=f'{random_string()}@gmail.com',
-                                                                password=password))
-        assert response.status_code == status.HTTP_201_CREATED
-
-        auth_response = test_client.post(url='/login', data=dict(username=login, password=password))
-        assert auth_response.status_code == status.HTTP_200_OK
-
-        items = [
-            {
-                'price': f'{(Decimal(random.randint(1000, 100000)) / Decimal(100)):.2f}',
-                'quantity': random.randint(1, 10),
-                'title': random_string()
-            } for _ in range(random.randint(2, 10))]
-        paid_amount = Decimal(random.randint(1000, 100000)) / Decimal(100)
-        payment_method = random.choice(list(PaymentMethod))
-        check_response = test_client.post(
-            url='/checks', json={
-                'payment': {
-                    'amount': f'{paid_amount:.2f}',
-                    'method': payment_method
-                },
-                'additional_info': random_string(),
-                'items': items},
-            headers={'Authorization': f'Bearer {auth_response.json()["access_token"]}'})
+    login = random_string()
+    password = random_string()
+    response = test_client.post(url='/users', json=dict(name=random_string(),
+                                                        login=login,
+                                                        email=f'{random_string()}@gmail.com',
+                                                        password=password))
+    assert response.status_code == status.HTTP_201_CREATED
 
-        assert check_response.status_code == status.HTTP_201_CREATED
-        check_response_json = check_response.json()
-        check_id = check_response_json['id']
-        assert check_id
-        assert check_response_json['created_at']
-        del check_response_json['id']
-        del check_response_json['created_at']
-        total_amount = Decimal(0)
-        for item in items:
-            amount = Decimal(item["price"]) * item["quantity"]  # type: ignore
-            item['amount'] = f'{amount:.2f}'
-            total_amount += amount
-        assert check_response_json == {
-            'items': items,
+    auth_response = test_client.post(url='/login', data=dict(username=login, password=password))
+    assert auth_response.status_code == status.HTTP_200_OK
+
+    items = [
+        {
+            'price': f'{(Decimal(random.randint(1000, 100000)) / Decimal(100)):.2f}',
+            'quantity': random.randint(1, 10),
+            'title': random_string()
+        } for _ in range(random.randint(2, 10))]
+    paid_amount = Decimal(random.randint(1000, 100000)) / Decimal(100)
+    payment_method = random.choice(list(PaymentMethod))
+    check_response = test_client.post(
+        url='/checks', json={
             'payment': {
                 'amount': f'{paid_amount:.2f}',
                 'method': payment_method
             },
-            'total_amount': f'{total_amount:.2f}',
-            'change': f'{paid_amount - total_amount:.2f}',
-        }
-        assert check_response.headers['x-check-text-link'] == f'http://testserver/checks/{check_id}/text'
+            'additional_info': random_string(),
+            'items': items},
+        headers={'Authorization': f'Bearer {auth_response.json()["access_token"]}'})
+
+    assert check_response.status_code == status.HTTP_201_CREATED
+    check_response_json = check_response.json()
+    check_id = check_response_json['id']
+    assert check_id
+    assert check_response_json['created_at']
+    del check_response_json['id']
+    del check_response_json['created_at']
+    total_amount = Decimal(0)
+    for item in items:
+        amount = Decimal(item["price"]) * item["quantity"]  # type: ignore
+        item['amount'] = f'{amount:.2f}'
+        total_amount += amount
+    assert check_response_json == {
+        'items': items,
+        'payment': {
+            'amount': f'{paid_amount:.2f}',
+            'method': payment_method
+        },
+        'total_amount': f'{total_amount:.2f}',
+        'change': f'{paid_amount - total_amount:.2f}',
+    }
+    assert check_response.headers['x-check-text-link'] == f'http://testserver/checks/{check_id}/text'
+
+
+def test_create_check_without_items(test_client: TestClient, new_user_headers: dict[str, str]) -> None:
+    check_response = test_client.post(
+        url='/checks', json={'payment': {'amount': '10.5', 'method': PaymentMethod.CASH}, 'items': []},
+        headers=new_user_headers)
+
+    assert check_response.status_code == status.HTTP_201_CREATED
+    check_response_json = check_response.json()
+    assert check_response_json['items'] == []
+    assert check_response_json['payment'] == {'amount': '10.50', 'method': PaymentMethod.CASH}
+    assert check_response_json['total_amount'] == '0.00'
+    assert check_response_json['change'] == '10.50'
+
+
+def test_create_check_statements_do_not_grow_with_items(test_client: TestClient,
+                                                        new_user_headers: dict[str, str]) -> None:
+    def create_check(items_quantity: int) -> int:
+        with count_statements() as executed:
+            check_response = test_client.post(
+                url='/checks', json={
+                    'payment': {'amount': '1000.00', 'method': PaymentMethod.CASH},
+                    'items': [{'title': random_string(), 'price': '1.00', 'quantity': 1}] * items_quantity},
+                headers=new_user_headers)
+        assert check_response.status_code == status.HTTP_201_CREATED
+        assert check_response.json()['total_amount'] == f'{items_quantity}.00'
+        return len(executed.statements)
+
+    create_check(1)  # warm up the principal cache
+    assert create_check(1) == create_check(50)
 
 
 def test_get_check_by_id(test_client: TestClient, seeded_user: SeededUser) -> None:
@@ -257,94 +300,94 @@ def test_get_check_text_repr_by_id_check(test_client: TestClient) -> None:
     login = random_string()
     password = random_string()
     name = 'Temperature-resistant Weather-resistant Products 1562 LLC'
-    with test_client:
-        response = test_client.post(url='/users', json=dict(name=name,
-                                                            login=login,
-                                                            email=f'{random_string()}@gmail.com',
-                                                            password=password))
-        assert response.status_code == status.HTTP_201_CREATED
-
-        auth_response = test_client.post(url='/login', data=dict(username=login, password=password))
-        assert auth_response.status_code == status.HTTP_200_OK
-
-        check_post_response = test_client.post(
-            url='/checks', json={
-                'payment': {
-                    'amount': '499.50',
-                    'method': PaymentMethod.CASH
+    response = test_client.post(url='/users', json=dict(name=name,
+                                                        login=login,
+                                                        email=f'{random_string()}@gmail.com',
+                                                        password=password))
+    assert response.status_code == status.HTTP_201_CREATED
+
+    auth_response = test_client.post(url='/login', data=dict(username=login, password=password))
+    assert auth_response.status_code == status.HTTP_200_OK
+
+    check_post_response = test_client.post(
+        url='/checks', json={
+            'payment': {
+                'amount': '499.50',
+                'method': PaymentMethod.CASH
+            },
+            'additional_info': 'From loyal customer',
+            'items': [
+                {
+                    'price': '40.52',
+                    'quantity': 10,
+                    'title': 'Tomato'
                 },
-                'additional_info': 'From loyal customer',
-                'items': [
-                    {
-                        'price': '40.52',
-                        'quantity': 10,
-                        'title': 'Tomato'
-                    },
-                    {
-                        'price': '8.17',
-                        'quantity': 5,
-                        'title': 'Ultra-light Eco-friendly Multitasking Long-lasting Stackable Industrial Item'
-                    }
-                ]},
-            headers={'Authorization': f'Bearer {auth_response.json()["access_token"]}'})
-
-        assert check_post_response.status_code == status.HTTP_201_CREATED
-        check_id = check_post_response.json()['id']
-
-        check_get_response = test_client.get(
-            url=f'/checks/{check_id}',
-            headers={'Authorization': f'Bearer {auth_response.json()["access_token"]}'})
-
-        assert check_get_response.status_code == status.HTTP_200_OK
-        assert check_get_response.headers['x-check-text-link'] == f'http://testserver/checks/{check_id}/text'
-        created_at = check_get_response.json()['created_at']
-        dt = datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%S.%fZ")
-        date_and_time = dt.strftime('%d.%m.%Y %H:%M')
-
-        # No authentication headers needed and provided
-        check_text_get_response = test_client.get(url=check_get_response.headers['x-check-text-link'])
-
-        assert check_text_get_response.status_code == status.HTTP_200_OK
-        assert check_text_get_response.text == \
-            '<pre>Temperature-resistant Weather-resistant ' \
-            '\n           Products 1562 LLC            ' \
-            '\n========================================' \
-            '\n10.00 x 40.52' \
-            '\nTomato                            405.20' \
-            '\n----------------------------------------' \
-            '\n5.00 x 8.17' \
-            '\nUltra-light Eco-friendly    ' \
-            '\nMultitasking Long-lasting   ' \
-            '\nStackable Industrial Item          40.85' \
-            '\n========================================' \
-            '\nTOTAL                             446.05' \
-            '\nCash                              499.50' \
-            '\nChange                             53.45' \
-            '\n========================================' \
-            '\n' \
-            f'            {date_and_time}            \n' \
-            '      Thank you for your purchase!      </pre>'
-
-        # To ensure that an existing check representation in the database is reused instead of being rebuilt
-        second_check_text_get_response = test_client.get(url=check_get_response.headers['x-check-text-link'])
-        assert second_check_text_get_response.status_code == status.HTTP_200_OK
-        assert second_check_text_get_response.text == check_text_get_response.text
+                {
+                    'price': '8.17',
+                    'quantity': 5,
+                    'title': 'Ultra-light Eco-friendly Multitasking Long-lasting Stackable Industrial Item'
+                }
+            ]},
+        headers={'Authorization': f'Bearer {auth_response.json()["access_token"]}'})
+
+    assert check_post_response.status_code == status.HTTP_201_CREATED
+    check_id = check_post_response.json()['id']
+
+    check_get_response = test_client.get(
+        url=f'/checks/{check_id}',
+        headers={'Authorization': f'Bearer {auth_response.json()["access_token"]}'})
+
+    assert check_get_response.status_code == status.HTTP_200_OK
+    assert check_get_response.headers['x-check-text-link'] == f'http://testserver/checks/{check_id}/text'
+    created_at = check_get_response.json()['created_at']
+    dt = datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%S.%fZ")
+    date_and_time = dt.strftime('%d.%m.%Y %H:%M')
+
+    # No authentication headers needed and provided
+    check_text_get_response = test_client.get(url=check_get_response.headers['x-check-text-link'],
+                                              headers={'Accept': 'text/plain'})
+
+    assert check_text_get_response.status_code == status.HTTP_200_OK
+    assert check_text_get_response.headers['content-type'] == 'text/plain; charset=utf-8'
+    assert check_text_get_response.text == \
+        'Temperature-resistant Weather-resistant ' \
+        '\n           Products 1562 LLC            ' \
+        '\n========================================' \
+        '\n10.00 x 40.52' \
+        '\nTomato                            405.20' \
+        '\n----------------------------------------' \
+        '\n5.00 x 8.17' \
+        '\nUltra-light Eco-friendly    ' \
+        '\nMultitasking Long-lasting   ' \
+        '\nStackable Industrial Item          40.85' \
+        '\n========================================' \
+        '\nTOTAL                             446.05' \
+        '\nCash                              499.50' \
+        '\nChange                             53.45' \
+        '\n========================================' \
+        '\n' \
+        f'            {date_and_time}            \n' \
+        '      Thank you for your purchase!      '
+
+    # To ensure that an existing check representation in the database is reused instead of being rebuilt
+    second_check_text_get_response = test_client.get(url=check_get_response.headers['x-check-text-link'],
+                                                     headers={'Accept': 'text/plain'})
+    assert second_check_text_get_response.status_code == status.HTTP_200_OK
+    assert second_check_text_get_response.text == check_text_get_response.text
 
 
 def test_create_check_unauthorized_error(test_client: TestClient) -> None:
-    with test_client:
-        response = test_client.post(url='/checks', json={})
+    response = test_client.post(url='/checks', json={})
 
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED
-        assert response.json() == {'detail': 'Not authenticated'}
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json() == {'detail': 'Not authenticated'}
 
 
 def test_get_check_by_id_unauthorized_error(test_client: TestClient, seeded_user: SeededUser) -> None:
-    with test_client:
-        response = test_client.get(url=f'/checks/{seeded_user.checks[0].id}')
+    response = test_client.get(url=f'/checks/{seeded_user.checks[0].id}')
 
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED
-        assert response.json() == {'detail': 'Not authenticated'}
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json() == {'detail': 'Not authenticated'}
 
 
 def test_get_own_checks_unauthorized_error(test_client: TestClient) -> None:
@@ -352,3 +395,651 @@ def test_get_own_checks_unauthorized_error(test_client: TestClient) -> None:
 
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
     assert response.json() == {'detail': 'Not authenticated'}
+
+
+@pytest.mark.parametrize('url', ['/checks/{check_id}', '/checks/{check_id}/text'])
+def test_request_statements_do_not_grow_with_user_checks(test_client: TestClient, url: str) -> None:
+    login = random_string()
+    password = random_string()
+    with session_scope() as session:
+        user = User(name=random_string(), login=login, email=f'{random_string()}@mail.com',
+                    password=Hash.encrypt(password))
+        session.add(user)
+        session.flush()
+        check = Check(creator_id=user.id, payment_method=PaymentMethod.CASH, paid_amount=Decimal(100))
+        session.add(check)
+        session.flush()
+        session.add(Item(check_id=check.id, title=random_string(), price=Decimal(10), quantity=1))
+        session.commit()
+        user_id, check_id = user.id, check.id
+
+    auth_response = test_client.post(url='/login', data=dict(username=login, password=password))
+    assert auth_response.status_code == status.HTTP_200_OK
+    headers = {'Authorization': f'Bearer {auth_response.json()["access_token"]}'}
+    test_client.get(url=url.format(check_id=check_id), headers=headers)  # warm up the cached principal
+
+    def measure() -> tuple[int, int]:
+        with count_statements() as executed:
+            response = test_client.get(url=url.format(check_id=check_id), headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return len(executed.statements), executed.rows
+
+    before = measure()
+    with session_scope() as session:
+        new_checks = session.execute(insert(Check).returning(Check.id, Check.created_at), [
+            dict(creator_id=user_id, payment_method=PaymentMethod.CASH, paid_amount=Decimal(100))
+            for _ in range(100)]).all()
+        session.execute(insert(Item), [
+            dict(check_id=new_check_id, created_at=created_at, title=random_string(), price=Decimal(10), quantity=1,
+                 amount=Decimal(10)) for new_check_id, created_at in new_checks for _ in range(2)])
+        session.commit()
+
+    assert measure() == before
+
+
+def test_create_checks_bulk(test_client: TestClient, new_user_headers: dict[str, str],
+                            monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(check_ingestion, 'BULK_CHECKS_CHUNK_SIZE', 2)
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                   'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    out_of_range_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                          'items': [{'title': random_string(), 'price': '99999999.99', 'quantity': 10}]}
+
+    response = test_client.post(url='/checks/bulk', headers=new_user_headers, json=[
+        valid_check, {'items': []}, valid_check, out_of_range_check, valid_check])
+
+    assert response.status_code == status.HTTP_200_OK
+    response_json = response.json()
+    assert response_json['created'] == 3
+    assert response_json['failed'] == 2
+    results = response_json['results']
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+    assert all(results[i]['id'] and results[i]['errors'] is None for i in (0, 2, 4))
+    assert results[1]['id'] is None
+    assert results[1]['errors'] == [{'type': 'missing', 'loc': ['payment'], 'msg': 'Field required'}]
+    assert results[3]['id'] is None
+    assert results[3]['errors'] == [{'type': 'db_error', 'loc': [], 'msg': 'The check was rejected by the database'}]
+
+    own_checks_response = test_client.get(url='/checks/own', headers=new_user_headers)
+    assert own_checks_response.status_code == status.HTTP_200_OK
+    assert {item['id'] for item in own_checks_response.json()['items']} == {results[i]['id'] for i in (0, 2, 4)}
+    assert {item['total_amount'] for item in own_checks_response.json()['items']} == {'20.00'}
+
+
+@pytest.mark.parametrize('line_break', ['', '\n'])
+def test_create_checks_bulk_ndjson(test_client: TestClient, new_user_headers: dict[str, str],
+                                   monkeypatch: pytest.MonkeyPatch, line_break: str) -> None:
+    monkeypatch.setattr(check_ingestion, 'BULK_CHECKS_LIMIT', 3)
+    valid_check = json.dumps({'payment': {'amount': '1.00', 'method': PaymentMethod.CREDIT_CARD},
+                              'items': [{'title': random_string(), 'price': '1.00', 'quantity': 1}]})
+    body = '\n'.join([valid_check, '', '{"payment": ', valid_check, valid_check]) + line_break
+
+    response = test_client.post(url='/checks/bulk', content=body,
+                                headers={**new_user_headers, 'Content-Type': 'application/x-ndjson'})
+
+    assert response.status_code == status.HTTP_200_OK
+    response_json = response.json()
+    assert response_json['created'] == 2
+    assert response_json['failed'] == 2
+    assert [(result['index'], bool(result['id'])) for result in response_json['results']] == [
+        (0, True), (1, False), (2, True), (3, False)]
+    assert response_json['results'][1]['errors'][0]['type'] == 'json_invalid'
+    assert response_json['results'][3]['errors'] == [{
+        'type': 'limit_exceeded', 'loc': [], 'msg': 'No more than 3 checks are accepted per request'}]
+
+
+def test_create_checks_bulk_ndjson_line_limit(test_client: TestClient, new_user_headers: dict[str, str],
+                                              monkeypatch: pytest.MonkeyPatch) -> None:
+    valid_check = json.dumps({'payment': {'amount': '1.00', 'method': PaymentMethod.CASH},
+                              'items': [{'title': random_string(), 'price': '1.00', 'quantity': 1}]}).encode()
+    monkeypatch.setattr(check_ingestion, 'BULK_CHECKS_LINE_LIMIT', len(valid_check))
+    too_long = b'x' * (len(valid_check) + 1)
+    # Lines too long within a chunk, across chunks, and at the end of the body
+    chunks = [valid_check + b'\n' + too_long + b'\n' + too_long, too_long, b'x\n' + valid_check + b'\n' + too_long]
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks]
+    messages.append({'type': 'http.request', 'body': b'', 'more_body': False})
+
+    async def receive() -> dict[str, Any]:
+        return messages.pop(0)
+
+    user_id = test_client.get(url='/users/profile', headers=new_user_headers).json()['id']
+    request = Request({'type': 'http', 'headers': [(b'content-type', check_ingestion.NDJSON_MEDIA_TYPE.encode())]},
+                      receive)
+    with session_scope() as db:
+        response = test_client.portal.call(  # type: ignore[union-attr]
+            check_ingestion.ingest, check_ingestion.read_records(request),
+            Principal(id=user_id, login=random_string(), name=random_string()), db)
+
+    assert (response.created, response.failed) == (2, 3)
+    assert [result.errors[0]['type'] if result.errors else None for result in response.results] == [
+        None, 'line_too_long', 'line_too_long', None, 'line_too_long']
+    assert response.results[1].errors == [{'type': 'line_too_long', 'loc': [],
+                                           'msg': f'No line longer than {len(valid_check)} bytes is accepted'}]
+
+
+def test_create_checks_bulk_interrupted(test_client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(check_ingestion, 'BULK_CHECKS_CHUNK_SIZE', 1)
+    persisted: list[int] = []
+
+    def persist(db: Any, chunk: list[tuple[int, Any]]) -> list[Any]:
+        time.sleep(0.1)
+        persisted.extend(index for index, _ in chunk)
+        return []
+
+    async def records() -> AsyncIterator[Any]:
+        yield {'payment': {'amount': '1.00', 'method': PaymentMethod.CASH},
+               'items': [{'title': random_string(), 'price': '1.00', 'quantity': 1}]}
+        raise ClientDisconnect()
+
+    monkeypatch.setattr(check_ingestion, 'persist', persist)
+    with pytest.raises(ClientDisconnect):
+        test_client.portal.call(  # type: ignore[union-attr]
+            check_ingestion.ingest, records(), Principal(id=uuid4(), login=random_string(), name=random_string()),
+            None)
+    assert persisted == [0]  # before the request session is closed
+
+
+@pytest.mark.parametrize('body, status_code, detail', [
+    ('[{', status.HTTP_422_UNPROCESSABLE_ENTITY, 'Invalid JSON: Expecting property name enclosed in double quotes: '
+                                                 'line 1 column 3 (char 2)'),
+    ('{}', status.HTTP_422_UNPROCESSABLE_ENTITY, 'A JSON array of checks is expected'),
+    ('[{}, {}, {}, {}]', status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, 'No more than 3 checks are accepted per request'),
+])
+def test_create_checks_bulk_request_error(test_client: TestClient, new_user_headers: dict[str, str],
+                                          monkeypatch: pytest.MonkeyPatch, body: str, status_code: int,
+                                          detail: str) -> None:
+    monkeypatch.setattr(check_ingestion, 'BULK_CHECKS_LIMIT', 3)
+
+    response = test_client.post(url='/checks/bulk', content=body,
+                                headers={**new_user_headers, 'Content-Type': 'application/json'})
+
+    assert response.status_code == status_code
+    assert response.json() == {'detail': detail}
+
+
+def test_get_own_checks_by_cursor(test_client: TestClient, new_user_headers: dict[str, str]) -> None:
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                   'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    response = test_client.post(url='/checks/bulk', headers=new_user_headers, json=[valid_check] * 5)
+    assert response.status_code == status.HTTP_200_OK
+    check_ids = [result['id'] for result in response.json()['results']]
+    with session_scope() as session:  # make the pages tie on the creation time so that the ID breaks it
+        session.query(Check).filter(Check.id.in_(check_ids[:3])).update(
+            {Check.created_at: datetime(2025, 2, 14, tzinfo=timezone.utc)})
+        session.commit()
+        expected_ids = [str(id) for id, in session.query(Check.id).filter(Check.id.in_(check_ids)).order_by(
+            Check.created_at.desc(), Check.id.desc())]
+
+    pages, params = [], {'size': 2, 'include_total': True}
+    while True:
+        page_response = test_client.get(url='/checks/own/cursor', params=params, headers=new_user_headers)
+        assert page_response.status_code == status.HTTP_200_OK
+        pages.append(page_response.json())
+        if not pages[-1]['next_page']:
+            break
+        params = {'size': 2, 'cursor': pages[-1]['next_page']}
+
+    assert [[item['id'] for item in page['items']] for page in pages] == [
+        expected_ids[:2], expected_ids[2:4], expected_ids[4:]]
+    assert [page['total'] for page in pages] == [5, None, None]
+    assert pages[0]['previous_page'] is None
+    assert all(page['previous_page'] for page in pages[1:])
+
+    previous_response = test_client.get(url='/checks/own/cursor', headers=new_user_headers,
+                                        params={'size': 2, 'cursor': pages[-1]['previous_page']})
+    assert previous_response.status_code == status.HTTP_200_OK
+    assert previous_response.json()['items'] == pages[1]['items']
+    assert previous_response.json()['next_page'] == pages[1]['next_page']
+    first_response = test_client.get(url='/checks/own/cursor', headers=new_user_headers,
+                                     params={'size': 2, 'cursor': previous_response.json()['previous_page']})
+    assert first_response.status_code == status.HTTP_200_OK
+    assert first_response.json()['items'] == pages[0]['items']
+    assert first_response.json()['previous_page'] is None
+
+    filtered_response = test_client.get(url='/checks/own/cursor', headers=new_user_headers,
+                                        params={'period_end': '2025-02-14', 'include_total': True})
+    assert filtered_response.status_code == status.HTTP_200_OK
+    assert [item['id'] for item in filtered_response.json()['items']] == expected_ids[2:]
+    assert filtered_response.json()['total'] == 3
+    empty_response = test_client.get(url='/checks/own/cursor', headers=new_user_headers,
+                                     params={'period_end': '2025-02-13'})
+    assert empty_response.status_code == status.HTTP_200_OK
+    assert empty_response.json()['items'] == []
+    assert empty_response.json()['next_page'] is None
+
+
+@pytest.mark.parametrize('url', ['/checks/own', '/checks/own/cursor', '/checks/{check_id}'])
+def test_check_responses_match_response_model(test_client: TestClient, new_user_headers: dict[str, str],
+                                              url: str) -> None:
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CREDIT_CARD},
+                   'items': [{'title': 'Crème brûlée "deluxe" \\ 🍮', 'price': '10.10', 'quantity': 2},
+                             {'title': random_string(), 'price': '0.99', 'quantity': 1}]}
+    check_ids = [test_client.post(url='/checks', headers=new_user_headers, json=valid_check).json()['id']
+                 for _ in range(3)]
+    test_client.post(url='/checks', headers=new_user_headers, json={**valid_check, 'items': []})
+    # the checks of the profile are still serialized by the response model
+    profile_checks = {profile_check['id']: profile_check
+                      for profile_check in test_client.get(url='/users/profile', headers=new_user_headers).json()[
+                          'checks']}
+
+    response = test_client.get(url=url.format(check_id=check_ids[0]), headers=new_user_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'] == 'application/json'
+    response_json = response.json()
+    expected = {**response_json, 'items': [profile_checks[item['id']] for item in response_json['items']]} \
+        if 'total' in response_json else profile_checks[check_ids[0]]
+    assert response.content == JSONResponse(expected).body
+
+
+@pytest.mark.parametrize('cursor', [
+    'bm90LWEtY3Vyc29y',  # no separator
+    'PjIwMjUtMDItMTR8bm90LWEtdXVpZA==',  # not an UUID
+    'eDIwMjUtMDItMTRUMDA6MDA6MDArMDA6MDB8MDAwMDAwMDAtMDAwMC0wMDAwLTAwMDAtMDAwMDAwMDAwMDAw',  # unknown direction
+])
+def test_get_own_checks_by_cursor_invalid_cursor(test_client: TestClient, new_user_headers: dict[str, str],
+                                                 cursor: str) -> None:
+    response = test_client.get(url='/checks/own/cursor', params={'cursor': cursor}, headers=new_user_headers)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor value'}
+
+
+@pytest.mark.parametrize('count, first_total, second_total', [
+    (CountStrategy.EXACT, 2, 3),
+    (CountStrategy.SKIP, None, None),
+    (CountStrategy.CACHED, 2, 2),
+])
+def test_get_own_checks_count_strategy(test_client: TestClient, new_user_headers: dict[str, str],
+                                       count: CountStrategy, first_total: int | None,
+                                       second_total: int | None) -> None:
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                   'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    assert test_client.post(url='/checks/bulk', headers=new_user_headers,
+                            json=[valid_check] * 2).status_code == status.HTTP_200_OK
+
+    first_response = test_client.get(url='/checks/own', params={'count': count, 'size': 1}, headers=new_user_headers)
+    assert test_client.post(url='/checks', headers=new_user_headers,
+                            json=valid_check).status_code == status.HTTP_201_CREATED
+    second_response = test_client.get(url='/checks/own', params={'count': count, 'size': 1}, headers=new_user_headers)
+
+    assert first_response.status_code == second_response.status_code == status.HTTP_200_OK
+    assert len(first_response.json()['items']) == len(second_response.json()['items']) == 1
+    assert (first_response.json()['total'], second_response.json()['total']) == (first_total, second_total)
+    assert first_response.json()['pages'] == first_total
+
+
+def test_get_own_checks_estimated_count(test_client: TestClient, new_user_headers: dict[str, str]) -> None:
+    response = test_client.get(url='/checks/own', params={'count': CountStrategy.ESTIMATE, 'payment_method': 'CASH'},
+                               headers=new_user_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['items'] == []
+    assert isinstance(response.json()['total'], int)
+
+
+def test_get_own_checks_stats(test_client: TestClient, new_user_headers: dict[str, str]) -> None:
+    cash_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                  'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    card_check = {'payment': {'amount': '5.00', 'method': PaymentMethod.CREDIT_CARD},
+                  'items': [{'title': random_string(), 'price': '5.00', 'quantity': 1}]}
+    response = test_client.post(url='/checks/bulk', headers=new_user_headers, json=[cash_check, card_check])
+    assert response.status_code == status.HTTP_200_OK
+    assert test_client.post(url='/checks', headers=new_user_headers, json=cash_check).status_code == \
+        status.HTTP_201_CREATED
+    card_check_id = response.json()['results'][1]['id']
+    today = datetime.now(timezone.utc).date()
+
+    def get_stats(**params: Any) -> list[dict[str, Any]]:
+        stats_response = test_client.get(url='/checks/own/stats', params=params, headers=new_user_headers)
+        assert stats_response.status_code == status.HTTP_200_OK
+        return stats_response.json()  # type: ignore
+
+    assert get_stats(period='ALL') == [{'period': None, 'payment_method': None, 'checks_count': 3,
+                                        'total_amount': '45.00', 'average_amount': '15.00', 'change': '160.00'}]
+    assert get_stats(period='ALL', by_payment_method=True) == [
+        {'period': None, 'payment_method': 'CASH', 'checks_count': 2,
+         'total_amount': '40.00', 'average_amount': '20.00', 'change': '160.00'},
+        {'period': None, 'payment_method': 'CREDIT_CARD', 'checks_count': 1,
+         'total_amount': '5.00', 'average_amount': '5.00', 'change': '0.00'}]
+
+    with session_scope() as session:  # move a check to the past and roll the user checks up from scratch
+        card_check_row = session.query(Check).filter(Check.id == card_check_id).one()
+        card_check_row.created_at = datetime(2025, 2, 14, 23, 30, tzinfo=timezone.utc)
+        session.flush()
+        check_repo.rebuild_stats(session, [card_check_row.creator_id])
+        session.commit()
+
+    assert [(bucket['period'], bucket['checks_count']) for bucket in get_stats()] == [
+        ('2025-02-14', 1), (str(today), 2)]
+    assert [(bucket['period'], bucket['checks_count']) for bucket in get_stats(period='MONTH')] == [
+        ('2025-02-01', 1), (str(today.replace(day=1)), 2)]
+    assert [(bucket['period'], bucket['checks_count']) for bucket in get_stats(
+        period_start='2025-02-14', period_end='2025-02-14', payment_method='CREDIT_CARD')] == [('2025-02-14', 1)]
+    assert get_stats(period='ALL', total_amount_ge='10.00', total_amount_le='40.00') == [
+        {'period': None, 'payment_method': None, 'checks_count': 2,
+         'total_amount': '40.00', 'average_amount': '20.00', 'change': '160.00'}]
+    assert get_stats(payment_method='CASH', period_end='2025-01-31') == []
+
+
+@pytest.mark.parametrize('format, accept_encoding, compressed', [
+    (ExportFormat.NDJSON, 'gzip, deflate', True),
+    (ExportFormat.NDJSON, 'deflate, GZIP;level=1;q=0.5', True),
+    (ExportFormat.NDJSON, 'gzip;q=0, identity', False),
+    (ExportFormat.CSV, 'gzip; q=x', False),
+    (ExportFormat.CSV, 'identity', False),
+])
+def test_export_own_checks(test_client: TestClient, new_user_headers: dict[str, str], monkeypatch: pytest.MonkeyPatch,
+                           format: ExportFormat, accept_encoding: str, compressed: bool) -> None:
+    monkeypatch.setattr(check_export, 'EXPORT_BATCH_SIZE', 2)
+    response = test_client.post(url='/checks/bulk', headers=new_user_headers, json=[
+        {'payment': {'amount': '100.00', 'method': method},
+         'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}] * items_count}
+        for method, items_count in ((PaymentMethod.CASH, 1), (PaymentMethod.CREDIT_CARD, 1), (PaymentMethod.CASH, 2),
+                                    (PaymentMethod.CASH, 0), (PaymentMethod.CASH, 1))])
+    assert response.status_code == status.HTTP_200_OK
+    params = {'payment_method': PaymentMethod.CASH, 'period_start': str(datetime.now(timezone.utc).date())}
+    expected_checks = sorted(test_client.get(url='/checks/own', params=params, headers=new_user_headers).json()[
+        'items'], key=lambda expected_check: (expected_check['created_at'], expected_check['id']))
+
+    with count_statements() as executed:
+        export_response = test_client.get(url='/checks/own/export', params={**params, 'format': format},
+                                          headers={**new_user_headers, 'Accept-Encoding': accept_encoding})
+
+    assert export_response.status_code == status.HTTP_200_OK
+    assert export_response.headers.get('content-encoding') == ('gzip' if compressed else None)
+    assert len([statement for statement in executed.statements if 'FROM items' in statement]) == 2  # per batch
+    if format == ExportFormat.NDJSON:
+        assert export_response.headers['content-type'] == check_ingestion.NDJSON_MEDIA_TYPE
+        assert [json.loads(line) for line in export_response.text.splitlines()] == expected_checks
+    else:
+        assert export_response.headers['content-disposition'] == 'attachment; filename="checks.csv"'
+        header, *rows = csv.reader(io.StringIO(export_response.text))
+        assert tuple(header) == check_export.CSV_HEADER
+        assert [(row[0], row[6:]) for row in rows] == [
+            (expected_check['id'], [item['title'], item['price'], str(item['quantity']), item['amount']]
+             if item else []) for expected_check in expected_checks for item in expected_check['items'] or [None]]
+
+
+def test_render_text_wrapping() -> None:
+    text = check_builder.render_text('Temperature-resistant Products 1562 LLC', {
+        'payment_method': PaymentMethod.CREDIT_CARD, 'paid_amount': Decimal('100'), 'total_amount': Decimal('95.5'),
+        'change': Decimal('4.5'), 'created_at': datetime(2025, 2, 14, 9, 5, tzinfo=timezone.utc)}, [
+        {'title': 'Extra-virgin Olive Oil Family Pack', 'price': Decimal('45.50'), 'quantity': 1,
+         'amount': Decimal('45.50')},
+        {'title': '', 'price': Decimal('25.00'), 'quantity': 2, 'amount': Decimal('50.00')}], line_length=30)
+
+    assert text.splitlines() == [
+        'Temperature-resistant Products',
+        '           1562 LLC           ',
+        '==============================',
+        '1.00 x 45.50',
+        'Extra-virgin Olive   ',
+        'Oil Family Pack          45.50',
+        '------------------------------',
+        '2.00 x 25.00',
+        '==============================',
+        'TOTAL                    95.50',
+        'Credit_card             100.00',
+        'Change                    4.50',
+        '==============================',
+        '       14.02.2025 09:05       ',
+        ' Thank you for your purchase! ',
+    ]
+
+
+def test_get_check_text_repr_by_id_is_read_only(test_client: TestClient, new_user_headers: dict[str, str]) -> None:
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                   'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    response = test_client.post(url='/checks', headers=new_user_headers, json=valid_check)
+    assert response.status_code == status.HTTP_201_CREATED
+    check_id = response.json()['id']
+    with session_scope() as session:  # stored without the text, like the checks created before rendering at creation
+        rendered_text = session.query(Check.repr).filter(Check.id == check_id).scalar()
+        session.query(Check).filter(Check.id == check_id).update({Check.repr: None})
+        session.commit()
+
+    with count_statements() as executed:
+        text_response = test_client.get(url=f'/checks/{check_id}/text', headers={'Accept': 'text/plain'})
+
+    assert text_response.status_code == status.HTTP_200_OK
+    assert text_response.text == rendered_text
+    assert not [statement for statement in executed.statements if not statement.startswith('SELECT')]
+    backfill_repr(batch_size=100)
+    with session_scope() as session:
+        assert session.query(Check.repr).filter(Check.id == check_id).scalar() == rendered_text
+
+
+@pytest.mark.parametrize('accept', ['text/html', 'text/plain'])
+def test_get_check_text_repr_by_id_not_found_error(test_client: TestClient, accept: str) -> None:
+    missing_check_id = uuid4()
+
+    response = test_client.get(url=f'/checks/{missing_check_id}/text', headers={'Accept': accept})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {'detail': f'Check with ID: {missing_check_id} is not found'}
+
+
+@pytest.mark.parametrize('accept, media_type, content_type, start', [
+    ('*/*', 'text/html', 'text/html; charset=utf-8', b'<!DOCTYPE html>'),
+    ('text/plain', 'text/plain', 'text/plain; charset=utf-8', b'         Dr. Jekyll & Mr. Hyde'),
+    ('application/vnd.escpos', 'application/vnd.escpos', 'application/vnd.escpos', b'\x1b@\x1bt\x00         Dr.'),
+    ('application/pdf, */*;q=0.1', 'application/pdf', 'application/pdf', b'%PDF-1.4\n'),
+])
+def test_get_check_text_repr_by_id_formats(test_client: TestClient, accept: str, media_type: str, content_type: str,
+                                           start: bytes, monkeypatch: pytest.MonkeyPatch) -> None:
+    backend = DictCache()
+    monkeypatch.setattr(check_texts, 'check_text_cache', backend)
+    login, password = random_string(), random_string()
+    test_client.post(url='/users', json=dict(name='Dr. Jekyll & Mr. Hyde', login=login,
+                                             email=f'{random_string()}@gmail.com', password=password))
+    auth_response = test_client.post(url='/login', data=dict(username=login, password=password))
+    check_response = test_client.post(url='/checks', headers={
+        'Authorization': f'Bearer {auth_response.json()["access_token"]}'}, json={
+        'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+        'items': [{'title': '<script>(Tomato)</script>', 'price': '10.00', 'quantity': 2}]})
+    check_id = check_response.json()['id']
+
+    response = test_client.get(url=f'/checks/{check_id}/text', headers={'Accept': accept})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'] == content_type
+    assert response.headers['vary'] == 'Accept'
+    assert response.content.startswith(start)
+    assert list(backend) == [(UUID(check_id), media_type)]
+    if media_type == 'text/html':
+        assert '<script>' not in response.text
+        assert '<td>&lt;script&gt;(Tomato)&lt;/script&gt;</td><td>2.00</td><td>10.00</td><td>20.00</td>' in \
+            response.text
+        assert '<h1>Dr. Jekyll &amp; Mr. Hyde</h1>' in response.text
+    elif media_type == 'application/pdf':
+        assert b'(<script>\\(Tomato\\)</script>' in response.content
+        assert response.content.endswith(b'%%EOF\n')
+        # the same check is always rendered to the same document
+        check_texts.invalidate_check_texts(UUID(check_id))
+        assert test_client.get(url=f'/checks/{check_id}/text', headers={'Accept': accept}).content == \
+            response.content
+
+
+def test_get_check_text_repr_by_id_not_acceptable_error(test_client: TestClient, seeded_user: SeededUser) -> None:
+    response = test_client.get(url=f'/checks/{seeded_user.checks[0].id}/text', headers={'Accept': 'application/json'})
+
+    assert response.status_code == status.HTTP_406_NOT_ACCEPTABLE
+    assert response.json() == {'detail': 'Available formats: text/html, text/plain, application/vnd.escpos, '
+                                         'application/pdf'}
+
+
+@pytest.mark.parametrize('accept, media_type', [
+    ('', 'text/html'),
+    ('*/*', 'text/html'),
+    ('TEXT/PLAIN; q=0.8, */*; q=0.1', 'text/plain'),
+    ('text/*;q=0.5, application/pdf', 'application/pdf'),
+    ('text/*, text/html;q=0', 'text/plain'),
+    ('text/plain;charset=utf-8;q=x, application/vnd.escpos;q=0.9', 'application/vnd.escpos'),
+    ('application/json', None),
+])
+def test_negotiate(accept: str, media_type: str | None) -> None:
+    assert negotiate(accept, ['text/html', 'text/plain', 'application/vnd.escpos', 'application/pdf']) == media_type
+
+
+class DictCache(dict[tuple[UUID, str], check_texts.CheckText]):
+    def set(self, key: tuple[UUID, str], value: check_texts.CheckText) -> None:
+        self[key] = value
+
+    def delete(self, key: tuple[UUID, str]) -> None:
+        self.pop(key, None)
+
+
+def test_get_check_text_repr_by_id_cached(test_client: TestClient, new_user_headers: dict[str, str],
+                                          monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(check_texts, 'check_text_cache', check_texts.check_text_cache)
+    backend = DictCache()
+    check_texts.set_check_text_cache(backend)
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                   'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    check_id = UUID(test_client.post(url='/checks', headers=new_user_headers, json=valid_check).json()['id'])
+
+    with count_statements() as executed:
+        first_response = test_client.get(url=f'/checks/{check_id}/text')
+        second_response = test_client.get(url=f'/checks/{check_id}/text')
+        text_response = test_client.get(url=f'/checks/{check_id}/text', headers={'Accept': 'text/plain'})
+
+    assert first_response.status_code == second_response.status_code == status.HTTP_200_OK
+    assert first_response.text == second_response.text
+    assert list(backend) == [(check_id, 'text/html'), (check_id, 'text/plain')]  # cached per format
+    assert backend[check_id, 'text/html'].content == first_response.content
+    assert backend[check_id, 'text/plain'].content == text_response.content
+    assert backend[check_id, 'text/html'].etag != backend[check_id, 'text/plain'].etag
+    assert len(executed.statements) == 3  # the check with its creator and items, then its text
+    check_texts.invalidate_check_texts(check_id)
+    assert backend == {}
+
+
+def test_get_check_texts_batch(test_client: TestClient, new_user_headers: dict[str, str],
+                               monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(check_texts, 'check_text_cache', DictCache())
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                   'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    response = test_client.post(url='/checks/bulk', headers=new_user_headers, json=[valid_check] * 3)
+    check_ids = [result['id'] for result in response.json()['results']]
+    with session_scope() as session:  # stored without the text, like the checks created before rendering at creation
+        rendered_texts = {id: text for id, text in session.query(Check.id, Check.repr).filter(Check.id.in_(check_ids))}
+        session.query(Check).filter(Check.id.in_(check_ids[1:])).update({Check.repr: None})
+        session.commit()
+    ids = [check_ids[2], check_ids[0], check_ids[1], check_ids[2]]
+
+    with count_statements() as executed:
+        batch_response = test_client.post(url='/checks/text:batch', json={'ids': ids})
+
+    assert batch_response.status_code == status.HTTP_200_OK
+    assert batch_response.text == ''.join(f'<pre>{escape(rendered_texts[UUID(id)])}</pre>\n' for id in ids[:3])
+    assert len([statement for statement in executed.statements if 'ANY' in statement]) == 2
+    assert len([statement for statement in executed.statements if statement.startswith('UPDATE')]) == 1
+
+    with count_statements() as executed:  # served from the cache
+        ndjson_response = test_client.post(url='/checks/text:batch', json={'ids': ids},
+                                           headers={'Accept': check_ingestion.NDJSON_MEDIA_TYPE})
+    assert not executed.statements
+    assert ndjson_response.headers['content-type'] == check_ingestion.NDJSON_MEDIA_TYPE
+    for id, line in zip(ids[:3], ndjson_response.text.splitlines(), strict=True):
+        text_response = test_client.get(url=f'/checks/{id}/text', headers={'Accept': 'text/plain'})
+        assert json.loads(line) == {'id': id, 'etag': text_response.headers['etag'], 'content': text_response.text}
+
+    monkeypatch.setattr(check_texts, 'check_text_cache', DictCache())
+    with count_statements() as executed:  # the texts have been persisted
+        assert test_client.post(url='/checks/text:batch', json={'ids': ids}).text == batch_response.text
+    assert len(executed.statements) == 1
+
+
+def test_get_check_texts_batch_request_error(test_client: TestClient, seeded_user: SeededUser,
+                                             monkeypatch: pytest.MonkeyPatch) -> None:
+    missing_check_id = uuid4()
+    response = test_client.post(url='/checks/text:batch', json={'ids': [str(seeded_user.checks[0].id),
+                                                                        str(missing_check_id)]})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {'detail': f'Checks with IDs: {missing_check_id} are not found'}
+
+    monkeypatch.setattr(check_texts, 'CHECK_TEXTS_BATCH_LIMIT', 1)
+    response = test_client.post(url='/checks/text:batch', json={'ids': [str(uuid4()), str(uuid4())]})
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+@pytest.mark.parametrize('accept, media_type', [
+    ('application/x-ndjson;q=0, text/html', 'text/html; charset=utf-8'),  # NDJSON refused
+    ('*/*;q=0.5, application/x-ndjson', check_ingestion.NDJSON_MEDIA_TYPE),
+    ('application/x-ndjson;q=0', None),
+])
+def test_get_check_texts_batch_negotiation(test_client: TestClient, seeded_user: SeededUser, accept: str,
+                                           media_type: str | None) -> None:
+    response = test_client.post(url='/checks/text:batch', json={'ids': [str(seeded_user.checks[0].id)]},
+                                headers={'Accept': accept})
+
+    if media_type is None:
+        assert response.status_code == status.HTTP_406_NOT_ACCEPTABLE
+        assert response.json() == {'detail': 'Available formats: text/html, application/x-ndjson'}
+    else:
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'] == media_type
+
+
+@pytest.mark.parametrize('maxsize, ttl, cached', [(100, None, [2, 3]), (100, -1, []), (0, None, [])])
+def test_check_text_cache_size(maxsize: int, ttl: float | None, cached: list[int]) -> None:
+    cache: LRUCache[int, bytes] = LRUCache(maxsize=maxsize, ttl=ttl, weigher=len)
+    for key, size in enumerate([40, 101, 50, 40]):
+        cache.set(key, b'x' * size)
+    cache.set(2, b'x' * 50)  # replacing a value doesn't count it twice
+
+    assert [key for key in range(4) if cache.get(key) is not None] == cached
+    assert cache.weight == (90 if cached else 0)
+
+
+@pytest.mark.parametrize('url, cache_control, statements', [
+    ('/checks/{check_id}', 'private, max-age=86400', ['SELECT md5(checks::text)']),
+    ('/checks/{check_id}/text', 'public, max-age=86400', []),
+])
+def test_get_check_conditional_request(test_client: TestClient, new_user_headers: dict[str, str], url: str,
+                                       cache_control: str, statements: list[str]) -> None:
+    valid_check = {'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+                   'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]}
+    check_response = test_client.post(url='/checks', headers=new_user_headers, json=valid_check)
+    assert check_response.status_code == status.HTTP_201_CREATED
+    check_id = check_response.json()['id']
+    created_at = datetime.fromisoformat(check_response.json()['created_at'])
+    url = url.format(check_id=check_id)
+
+    response = test_client.get(url=url, headers=new_user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers['etag']
+    assert etag.startswith(f'"{UUID(check_id).hex}-')
+    assert response.headers['cache-control'] == cache_control
+    assert response.headers['last-modified'] == created_at.strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+    for if_none_match in [etag, f'W/{etag}', f'"other", {etag}', '*']:
+        with count_statements() as executed:
+            not_modified_response = test_client.get(url=url, headers={**new_user_headers,
+                                                                      'If-None-Match': if_none_match})
+        assert not_modified_response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not_modified_response.content == b''
+        assert not_modified_response.headers['etag'] == etag
+        assert not_modified_response.headers['cache-control'] == cache_control
+        assert [statement.split(',')[0] for statement in executed.statements] == statements
+
+    modified_response = test_client.get(url=url, headers={**new_user_headers, 'If-None-Match': '"other"'})
+    assert modified_response.status_code == status.HTTP_200_OK
+    assert modified_response.content == response.content
+    assert modified_response.headers['etag'] == etag
+
+    with session_scope() as session:  # the caches revalidating a deleted check are told it's gone
+        check_repo.delete(session, UUID(check_id))
+    gone_response = test_client.get(url=url, headers={**new_user_headers, 'If-None-Match': etag})
+    assert gone_response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_check_conditional_request_not_found_error(test_client: TestClient,
+                                                       new_user_headers: dict[str, str]) -> None:
+    missing_check_id = uuid4()
+
+    response = test_client.get(url=f'/checks/{missing_check_id}', headers={**new_user_headers, 'If-None-Match': '*'})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {'detail': f'Check with ID: {missing_check_id} is not found'}
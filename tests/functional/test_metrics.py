@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import multiprocess
+from prometheus_client.parser import text_string_to_metric_families
+from starlette import status
+from tests import SeededUser
+
+from app import main
+from app.infra import metrics
+from app.infra.enums import PaymentMethod
+
+
+def scrape(test_client: TestClient) -> dict[tuple[str, frozenset[tuple[str, str]]], float]:
+    response = test_client.get(url='/metrics')
+    assert response.status_code == status.HTTP_200_OK
+    return {(sample.name, frozenset(sample.labels.items())): sample.value
+            for family in text_string_to_metric_families(response.text) for sample in family.samples}
+
+
+def test_metrics(test_client: TestClient, seeded_user: SeededUser, new_user_headers: dict[str, str]) -> None:
+    def duration_count(samples: dict[tuple[str, frozenset[tuple[str, str]]], float], **labels: str) -> float:
+        return samples.get(('http_request_duration_seconds_count', frozenset(labels.items())), 0)
+
+    def function_count(samples: dict[tuple[str, frozenset[tuple[str, str]]], float], function: str) -> float:
+        return samples.get(('function_duration_seconds_count', frozenset({('function', function)})), 0)
+
+    before = scrape(test_client)
+    test_client.post(url='/login', data=dict(username=seeded_user.login, password=seeded_user.password))
+    check_response = test_client.post(url='/checks', headers=new_user_headers, json={
+        'payment': {'amount': '10.00', 'method': PaymentMethod.CASH},
+        'items': [{'title': 'Tomato', 'price': '10.00', 'quantity': 1}]})
+    test_client.get(url=f'/checks/{check_response.json()["id"]}', headers=new_user_headers)
+    test_client.get(url='/missing')
+
+    after = scrape(test_client)
+
+    assert duration_count(after, method='POST', route='/login', status='200') == \
+        duration_count(before, method='POST', route='/login', status='200') + 1
+    assert duration_count(after, method='GET', route='/checks/{id}', status='200') == \
+        duration_count(before, method='GET', route='/checks/{id}', status='200') + 1
+    assert duration_count(after, method='GET', route=metrics.UNMATCHED_ROUTE, status='404') == \
+        duration_count(before, method='GET', route=metrics.UNMATCHED_ROUTE, status='404') + 1
+    assert after['http_requests_in_progress', frozenset({('method', 'GET')})] == 1  # the scrape itself
+    for function in ['Hash.verify', 'check_repo.create']:
+        assert function_count(after, function) == function_count(before, function) + 1
+    assert ('db_pool_checked_out_connections', frozenset({('engine', 'async')})) in after
+
+
+def test_metrics_aggregated_from_workers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    worker = ('import os\n'
+              'from app.infra.metrics import HASHING_PENDING, HTTP_REQUEST_DURATION\n'
+              "HTTP_REQUEST_DURATION.labels('GET', '/checks/{id}', '200').observe(0.01)\n"
+              'HASHING_PENDING.inc(2)\n')
+    pids = [subprocess.run([sys.executable, '-c', worker + 'print(os.getpid())'], check=True, capture_output=True,
+                           env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path)}).stdout.decode()
+            for _ in range(2)]
+    monkeypatch.setattr(metrics, 'PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+
+    def collect() -> dict[tuple[str, frozenset[tuple[str, str]]], float]:
+        content, _ = metrics.generate_metrics()
+        return {(sample.name, frozenset(sample.labels.items())): sample.value
+                for family in text_string_to_metric_families(content.decode()) for sample in family.samples}
+
+    samples = collect()
+    assert samples['http_request_duration_seconds_count', frozenset(
+        {('method', 'GET'), ('route', '/checks/{id}'), ('status', '200')})] == 2
+    assert samples['hashing_pending_operations', frozenset()] == 4
+    multiprocess.mark_process_dead(int(pids[0]), str(tmp_path))  # as gunicorn.conf.py does for the exited workers
+    assert collect()['hashing_pending_operations', frozenset()] == 2
+
+
+@pytest.mark.parametrize('token, environment, authorization, expected_status', [
+    ('', 'prod', None, status.HTTP_404_NOT_FOUND),
+    ('secret', 'dev', None, status.HTTP_401_UNAUTHORIZED),
+    ('secret', 'prod', 'Bearer other', status.HTTP_401_UNAUTHORIZED),
+    ('secret', 'prod', 'Bearer secret', status.HTTP_200_OK),
+])
+def test_metrics_access(test_client: TestClient, monkeypatch: pytest.MonkeyPatch, token: str, environment: str,
+                        authorization: str | None, expected_status: int) -> None:
+    monkeypatch.setattr(main, 'METRICS_TOKEN', token)
+    monkeypatch.setattr(main, 'ENVIRONMENT', environment)
+
+    response = test_client.get(url='/metrics', headers={'Authorization': authorization} if authorization else {})
+
+    assert response.status_code == expected_status
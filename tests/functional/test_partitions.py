@@ -0,0 +1,77 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterator
+from uuid import UUID
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from tests import SeededUser
+
+from app.infra.database import session_scope
+from app.infra.enums import PaymentMethod
+from app.infra.partitions import archive_partitions, create_partitions, month_start, partition_name
+from app.models.checks import Check, Item
+from app.repositories import check as check_repo
+from app.schemas.check import CheckFilters
+
+today = datetime.now(timezone.utc).date()
+
+
+@pytest.fixture
+def session() -> Iterator[Session]:
+    '''
+    Session rolled back at the end, along with the partitions it has changed
+    '''
+    with session_scope() as session:
+        yield session
+        session.rollback()
+
+
+def add_check(session: Session, creator_id: UUID, created_at: datetime) -> Check:
+    check = Check(creator_id=creator_id, payment_method=PaymentMethod.CASH, paid_amount=Decimal(100),
+                  created_at=created_at)
+    session.add(check)
+    session.flush()
+    session.add(Item(check_id=check.id, title='Item', price=Decimal(10), quantity=1))
+    session.flush()
+    return check
+
+
+@pytest.mark.parametrize('filters, scanned', [
+    (CheckFilters(period_start=today, period_end=today), {partition_name('checks', month_start(
+        datetime.now(timezone.utc)))}),
+    (CheckFilters(), None),  # all of them
+])
+def test_period_filters_prune_partitions(session: Session, seeded_user: SeededUser, filters: CheckFilters,
+                                         scanned: set[str] | None) -> None:
+    stmt = check_repo.filter_by_user(seeded_user.id, filters)
+    plan = session.scalars(text('EXPLAIN ' + str(stmt.compile(dialect=postgresql.dialect(),
+                                                              compile_kwargs={'literal_binds': True})))).all()
+    partitions = set(session.scalars(text(
+        "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'checks'::regclass")))
+    assert {partition for partition in partitions if any(f' on {partition} ' in line for line in plan)} == \
+        (scanned or partitions)
+
+
+def test_create_and_archive_partitions(session: Session, seeded_user: SeededUser) -> None:
+    assert create_partitions(session, datetime(2001, 1, 31, tzinfo=timezone.utc), datetime(2001, 2, 1)) == [
+        'checks_2001_01', 'checks_2001_02', 'items_2001_01', 'items_2001_02']
+    assert create_partitions(session, datetime(2001, 1, 1), datetime(2001, 2, 1)) == []
+    check = add_check(session, seeded_user.id, datetime(2001, 1, 15, tzinfo=timezone.utc))
+    assert session.scalar(text('SELECT count(*) FROM items_2001_01 WHERE check_id = :id'), {'id': check.id}) == 1
+
+    assert archive_partitions(session, datetime(2001, 2, 28, tzinfo=timezone.utc)) == [
+        'items_2001_01', 'checks_2001_01']
+    assert not session.scalar(select(func.count()).select_from(Check).filter(Check.id == check.id))
+    assert session.scalar(text('SELECT count(*) FROM archive.checks_2001_01')) == 1
+    assert session.scalar(text('SELECT count(*) FROM archive.items_2001_01')) == 1
+
+
+def test_create_partitions_skips_default_rows(session: Session, seeded_user: SeededUser) -> None:
+    add_check(session, seeded_user.id, datetime(1999, 6, 15, tzinfo=timezone.utc))
+
+    assert create_partitions(session, datetime(1999, 5, 1), datetime(1999, 6, 1)) == ['checks_1999_05',
+                                                                                      'items_1999_05']
+    assert session.scalar(text("SELECT count(*) FROM items_default WHERE created_at < '2000-01-01'")) == 1
@@ -0,0 +1,179 @@
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from itertools import combinations
+from typing import Any, Callable, Iterator, cast
+from uuid import UUID
+
+import pytest
+from fastapi.testclient import TestClient
+from fastapi_pagination import Params
+from fastapi_pagination.cursor import CursorParams
+from sqlalchemy import Table, event, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from starlette import status
+from tests import SeededUser
+from utils import explain_analyze
+
+from app.infra import query_plans
+from app.infra.database import engine, session_scope
+from app.infra.enums import PaymentMethod, StatsPeriod
+from app.infra.partitions import add_months, create_partitions, partition_name
+from app.models.checks import Check, CheckStats
+from app.models.users import User
+from app.repositories import check as check_repo
+from app.schemas.check import CheckFilters
+
+SEEDED_USERS = 50
+SEEDED_CHECKS = 1000  # per user
+SEEDED_FROM = datetime(2025, 2, 1, tzinfo=timezone.utc)
+SEEDED_MONTHS = 3
+SEEDED_PARTITIONS = {partition_name('checks', add_months(SEEDED_FROM, months)) for months in range(SEEDED_MONTHS)}
+
+FILTER_VALUES: dict[str, Any] = dict(period_start=date(2025, 3, 1), period_end=date(2025, 3, 10),
+                                     total_amount_ge=Decimal(900), total_amount_le=Decimal(950),
+                                     payment_method=PaymentMethod.CASH)
+FILTER_NAMES = [names for size in range(len(FILTER_VALUES) + 1) for names in combinations(FILTER_VALUES, size)]
+
+# The indexes the checks of a user are looked up by, led by the creator
+USER_INDEXES = {str(index.name) for index in cast(Table, Check.__table__).indexes
+                if index.name and next(iter(index.columns)).name == 'creator_id'}
+
+
+@pytest.fixture(scope='module')
+def seeded_session(test_client: TestClient) -> Iterator[tuple[Session, UUID]]:
+    '''
+    Session with many users having many checks (and their stats rollups), rolled back at the end. The tables are
+    analyzed, so the planner knows what is there. Along with the session the ID of one of the users is given
+    '''
+    # The application is started beforehand, its partitions maintenance would wait for the session otherwise
+    with session_scope() as session:
+        create_partitions(session, SEEDED_FROM, add_months(SEEDED_FROM, SEEDED_MONTHS - 1))
+        creator_ids = list(session.scalars(text(
+            "INSERT INTO users (id, name, login, email, password) SELECT gen_random_uuid(), 'Plans ' || i, "
+            "'plans' || i, 'plans' || i || '@example.com', '' FROM generate_series(1, :users) i RETURNING id"),
+            {'users': SEEDED_USERS}))
+        # The amounts, dates and payment methods are spread evenly and the same on every run
+        session.execute(text(
+            'INSERT INTO checks (id, creator_id, payment_method, paid_amount, total_amount, change, created_at) '
+            "SELECT gen_random_uuid(), creator_id, (CASE WHEN i % 2 = 0 THEN 'CASH' ELSE 'CREDIT_CARD' END)"
+            '::payment_method_enum, 1000, (i * 7919) % 100000 / 100.0 + 0.01, 0, '
+            "CAST(:start AS timestamptz) + i % (:months * 29) * interval '1 day' + i * interval '1 minute' "
+            'FROM unnest(CAST(:creator_ids AS uuid[])) creator_id, generate_series(1, :checks) i'),
+            {'start': SEEDED_FROM, 'months': SEEDED_MONTHS, 'creator_ids': creator_ids, 'checks': SEEDED_CHECKS})
+        check_repo.rebuild_stats(session, creator_ids)
+        session.execute(text(f'ANALYZE {Check.__tablename__}, {CheckStats.__tablename__}'))
+        yield session, creator_ids[0]
+        session.rollback()
+
+
+@contextmanager
+def capture_plans() -> Iterator[list[dict[str, Any]]]:
+    '''
+    Plans of the statements executed meanwhile by the sync engine, explained as they were sent to the driver
+    '''
+    plans: list[dict[str, Any]] = []
+
+    def after_cursor_execute(conn: Connection, cursor: Any, statement: str, parameters: Any, *args: Any) -> None:
+        plans.append(query_plans.explain_raw(conn.connection, statement, parameters, 'FORMAT JSON')[0][0]['Plan'])
+
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    try:
+        yield plans
+    finally:
+        event.remove(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def plan_nodes(plan: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def expected_indexes(filters: CheckFilters, ordered: bool) -> set[str]:
+    '''
+    Indexes one of which is expected to be used for the checks of the user, after the most selective filter
+    '''
+    if filters.total_amount_ge:
+        return {'idx_checks_creator_total_amount_date', 'idx_checks_creator_total_amount_date_payment_method'}
+    if filters.payment_method:
+        return {'idx_checks_creator_payment_method_date'}
+    if ordered:
+        return {'idx_checks_creator_date_id'}  # the keyset pages are read in the index order, without sorting
+    return USER_INDEXES
+
+
+QUERIES: dict[str, Callable[[Session, UUID, CheckFilters], Any]] = {
+    'page': lambda db, creator_id, filters: check_repo.get_all_by_user(db, creator_id, Params(size=50), filters),
+    'keyset page': lambda db, creator_id, filters: check_repo.get_keyset_page_by_user(
+        db, creator_id, CursorParams(size=50), filters, include_total=True),
+    'stats': lambda db, creator_id, filters: check_repo.get_stats(db, creator_id, filters, StatsPeriod.DAY, False),
+}
+
+
+@pytest.mark.parametrize('filter_names', FILTER_NAMES, ids=lambda names: '-'.join(names) or 'none')
+@pytest.mark.parametrize('query', QUERIES)
+def test_check_queries_use_indexes(seeded_session: tuple[Session, UUID], query: str,
+                                   filter_names: tuple[str, ...]) -> None:
+    session, creator_id = seeded_session
+    filters = CheckFilters(**{name: FILTER_VALUES[name] for name in filter_names})
+    # The partitions' indexes are named after the columns, the plans refer to them
+    parent_indexes: dict[str, str] = dict(session.execute(text(
+        'SELECT inhrelid::regclass::text, inhparent::regclass::text FROM pg_inherits')).tuples().all())
+
+    with capture_plans() as plans:
+        QUERIES[query](session, creator_id, filters)
+
+    nodes = [node for plan in plans for node in plan_nodes(plan)]
+    seq_scans = {node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'}
+    assert not seq_scans & (SEEDED_PARTITIONS | {CheckStats.__tablename__})
+    used = {parent_indexes.get(node['Index Name'], node['Index Name']) for node in nodes if 'Index Name' in node}
+    if query == 'stats' and not (filters.total_amount_ge or filters.total_amount_le):
+        # The rollups are aggregated instead of the checks
+        assert used == {'check_stats_creator_id_day_payment_method_key'}
+    else:
+        assert used & expected_indexes(filters, ordered=query == 'keyset page')
+
+
+def test_slow_query_log(test_client: TestClient, new_user_headers: dict[str, str], monkeypatch: pytest.MonkeyPatch,
+                        caplog: pytest.LogCaptureFixture) -> None:
+    monkeypatch.setattr(query_plans.logger, 'disabled', False)  # by the logging config of the alembic migrations
+
+    monkeypatch.setattr(query_plans, 'SLOW_QUERY_THRESHOLD', 10 ** 6)
+    with caplog.at_level(logging.WARNING, logger=query_plans.__name__):
+        response = test_client.get(url='/checks/own', headers=new_user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert not caplog.messages
+
+    monkeypatch.setattr(query_plans, 'SLOW_QUERY_THRESHOLD', 10 ** -6)
+    with caplog.at_level(logging.WARNING, logger=query_plans.__name__):
+        response = test_client.get(url='/checks/own', headers=new_user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert caplog.messages and all(message.startswith('Slow query, ') for message in caplog.messages)
+    assert any('FROM checks' in message and ' on checks_' in message for message in caplog.messages)  # the plan
+
+
+def test_slow_query_log_explain_failure(test_client: TestClient, new_user_headers: dict[str, str],
+                                        monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture) -> None:
+    monkeypatch.setattr(query_plans.logger, 'disabled', False)  # by the logging config of the alembic migrations
+    monkeypatch.setattr(query_plans, 'SLOW_QUERY_THRESHOLD', 10 ** -6)
+    monkeypatch.setattr(query_plans, 'explain_clause', lambda options: 'EXPLAIN (UNKNOWN_OPTION) ')
+
+    with caplog.at_level(logging.WARNING, logger=query_plans.__name__):
+        response = test_client.get(url='/checks/own', headers=new_user_headers)
+
+    # The transaction survives the failing EXPLAIN, the next statements of the request run
+    assert response.status_code == status.HTTP_200_OK
+    assert len(caplog.messages) > 1
+    assert all(message.startswith('Slow query, ') and '\nNo plan: ' in message for message in caplog.messages)
+
+
+def test_explain_analyze(seeded_user: SeededUser, capsys: pytest.CaptureFixture[str]) -> None:
+    with session_scope() as session:
+        explain_analyze(session, session.query(User).filter(User.login == 'user1'))
+        explain_analyze(session, select(User.id).filter(User.login == 'user1'))
+
+    output = capsys.readouterr().out
+    assert output.count('actual time=') >= 2 and 'Buffers: ' in output
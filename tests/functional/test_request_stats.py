@@ -0,0 +1,58 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette import status
+from tests import random_string
+
+from app.infra import request_stats
+from app.infra.database import count_statements
+from app.infra.enums import PaymentMethod, QueryBudgetAction
+from app.infra.request_stats import QueryBudgetExceeded
+
+
+def create_check(test_client: TestClient, headers: dict[str, str]) -> str:
+    response = test_client.post(url='/checks', headers=headers, json={
+        'payment': {'amount': '100.00', 'method': PaymentMethod.CASH},
+        'items': [{'title': random_string(), 'price': '10.00', 'quantity': 2}]})
+    assert response.status_code == status.HTTP_201_CREATED
+    return str(response.json()['id'])
+
+
+def test_server_timing(test_client: TestClient, new_user_headers: dict[str, str]) -> None:
+    check_id = create_check(test_client, new_user_headers)
+
+    with count_statements() as executed:
+        response = test_client.get(url=f'/checks/{check_id}', headers=new_user_headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    metrics = [metric.split(';') for metric in response.headers['server-timing'].split(', ')]
+    assert [metric[0] for metric in metrics] == ['db', 'auth', 'serialization', 'total']
+    assert all(float(metric[1].removeprefix('dur=')) >= 0 for metric in metrics)
+    assert metrics[0][2] == f'desc="{len(executed.statements)} statements / {executed.rows} rows"'
+
+
+def test_server_timing_disabled(test_client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(request_stats, 'SERVER_TIMING', False)
+
+    response = test_client.get(url='/metrics')
+
+    assert 'server-timing' not in response.headers
+
+
+def test_query_budget_exceeded(test_client: TestClient, new_user_headers: dict[str, str],
+                               monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture) -> None:
+    check_id = create_check(test_client, new_user_headers)
+    monkeypatch.setattr(request_stats, 'QUERY_BUDGET', 1)
+
+    monkeypatch.setattr(request_stats, 'QUERY_BUDGET_ACTION', QueryBudgetAction.FAIL)
+    with pytest.raises(QueryBudgetExceeded, match='2 statements issued, over the budget of 1. Executed 1 times: '):
+        test_client.get(url=f'/checks/{check_id}', headers=new_user_headers)
+
+    monkeypatch.setattr(request_stats, 'QUERY_BUDGET_ACTION', QueryBudgetAction.WARN)
+    monkeypatch.setattr(request_stats.logger, 'disabled', False)  # by the logging config of the alembic migrations
+    with caplog.at_level(logging.WARNING, logger=request_stats.__name__):
+        response = test_client.get(url=f'/checks/{check_id}', headers=new_user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(caplog.messages) == 1
+    assert caplog.messages[0].startswith(f'GET /checks/{check_id}: 2 statements issued, over the budget of 1. ')
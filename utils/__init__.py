@@ -1,17 +1,15 @@
 from typing import Any
 
-from sqlalchemy import text
-from sqlalchemy.dialects import postgresql
+from sqlalchemy import Select
 from sqlalchemy.orm import Query, Session
 
+from app.infra.query_plans import explain
 
-def explain_analyze(session: Session, query: Query[Any]) -> None:
-    # Compile the query to get the SQL string
-    compiled_query = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
-    
-    explain_query = text(f'EXPLAIN ANALYZE {compiled_query}')
-    
-    result = session.execute(explain_query)
 
-    # Print the execution plan
-    print('\n'.join(row[0] for row in result))
+def explain_analyze(session: Session, query: Query[Any] | Select[Any]) -> None:
+    '''
+    Print the plan the query is executed with, along with the time spent and the buffers read by every node.
+    The query is executed. For the plans of the slow queries in production set SLOW_QUERY_THRESHOLD instead
+    '''
+    stmt = query.statement if isinstance(query, Query) else query
+    print('\n'.join(explain(session, stmt, 'ANALYZE', 'BUFFERS')))
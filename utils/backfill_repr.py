@@ -0,0 +1,37 @@
+import argparse
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+
+from app.infra.database import session_scope
+from app.models.checks import Check
+from app.models.users import User
+from app.services.check_builder import built_text_representation
+
+BATCH_SIZE = 1000  # Number of checks rendered per transaction
+
+
+def backfill_repr(batch_size: int = BATCH_SIZE) -> None:
+    '''
+    Render and persist the text representation of the checks stored without it
+    '''
+    with session_scope() as session:
+        checks_count = 0
+        unrendered = select(Check).options(joinedload(Check.creator).load_only(User.name)).filter(
+            Check.repr.is_(None)).order_by(Check.id).limit(batch_size)
+        stmt = unrendered
+        while batch := session.scalars(stmt).all():
+            last_id = batch[-1].id
+            session.execute(update(Check), [  # updated by the primary key, which includes the partition key
+                {'id': check.id, 'created_at': check.created_at, 'repr': built_text_representation(check)}
+                for check in batch])
+            session.commit()
+            checks_count += len(batch)
+            print(f'Rendered the text representation of {checks_count} checks')
+            stmt = unrendered.filter(Check.id > last_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=backfill_repr.__doc__)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    backfill_repr(parser.parse_args().batch_size)
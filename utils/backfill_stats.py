@@ -0,0 +1,30 @@
+import argparse
+
+from sqlalchemy import select
+
+from app.infra.database import session_scope
+from app.models.users import User
+from app.repositories import check as check_repo
+
+BATCH_SIZE = 100  # Number of users whose stats are rebuilt per transaction
+
+
+def backfill_stats(batch_size: int = BATCH_SIZE) -> None:
+    '''
+    Rebuild the check stats rollups of all users from their existing checks
+    '''
+    with session_scope() as session:
+        users_count = 0
+        stmt = select(User.id).order_by(User.id).limit(batch_size)
+        while user_ids := session.scalars(stmt).all():
+            check_repo.rebuild_stats(session, user_ids)
+            session.commit()
+            users_count += len(user_ids)
+            print(f'Rebuilt the check stats of {users_count} users')
+            stmt = select(User.id).filter(User.id > user_ids[-1]).order_by(User.id).limit(batch_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=backfill_stats.__doc__)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    backfill_stats(parser.parse_args().batch_size)
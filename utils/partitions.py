@@ -0,0 +1,29 @@
+import argparse
+from datetime import date, datetime, timezone
+
+from app.infra.database import session_scope
+from app.infra.partitions import PARTITIONS_AHEAD, add_months, archive_partitions, ensure_partitions, month_start
+
+
+def manage_partitions(months_ahead: int = PARTITIONS_AHEAD, archive_before: date | None = None) -> None:
+    '''
+    Create the check partitions of the months ahead and archive the ones of the months before the given date
+    '''
+    with session_scope() as session:
+        for name in ensure_partitions(session, months_ahead):
+            print(f'Created partition {name}')
+        if archive_before:
+            for name in archive_partitions(session, datetime.combine(archive_before, datetime.min.time(),
+                                                                     timezone.utc)):
+                print(f'Archived partition {name}')
+        session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=manage_partitions.__doc__)
+    parser.add_argument('--months-ahead', type=int, default=PARTITIONS_AHEAD)
+    parser.add_argument('--archive-before', type=date.fromisoformat, default=None,
+                        help='Date (YYYY-MM-DD) the month of which is the oldest one kept live, i.e. '
+                        f'{add_months(month_start(datetime.now(timezone.utc)), -24).date()} keeps two years')
+    args = parser.parse_args()
+    manage_partitions(args.months_ahead, args.archive_before)
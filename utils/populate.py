@@ -1,19 +1,34 @@
+import argparse
+import os
 import random
 import string
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from typing import Any, cast
+from uuid import UUID, uuid4
 
-from app.infra.database import session_scope
+from sqlalchemy import Table
+
+from app.infra.database import copy_rows, engine, session_scope
 from app.infra.enums import PaymentMethod
-from app.models.checks import Check, Item
+from app.infra.partitions import create_partitions
+from app.models.checks import calculate_amount
 from app.models.users import User
+from app.repositories import check as check_repo
+from app.services.check_builder import render_text
 from app.services.hashing import Hash
 
 NUM_USERS = 10  # Number of dummy users to generate
 NUM_CHECKS = 100  # Number of dummy checks to generate for each user
 NUM_ITEMS = 5  # Number of dummy items per check
-DATE_START = datetime(2025, 2, 1, random.randint(0, 23), random.randint(0, 59), random.randint(0, 59))
-DATE_END = datetime(2025, 4, 1, random.randint(0, 23), random.randint(0, 59), random.randint(0, 59))
+WORKERS = os.cpu_count() or 1  # Processes generating and loading the checks, each one takes a DB connection
+BATCH_SIZE = 10000  # Checks loaded per COPY (and transaction) by a worker
+TITLES = 1000  # Distinct item titles generated by a worker
+DATE_START = datetime(2025, 2, 1, random.randint(0, 23), random.randint(0, 59), random.randint(0, 59),
+                      tzinfo=timezone.utc)
+DATE_END = datetime(2025, 4, 1, random.randint(0, 23), random.randint(0, 59), random.randint(0, 59),
+                    tzinfo=timezone.utc)
 NAME_PREFIXES = [
     "Premium", "Deluxe", "Eco", "Smart", "Advanced", "Compact", "Luxury", "Portable", "Innovative", "Exclusive",
     "Classic", "Modern", "Ergonomic", "Stylish", "Sustainable", "Comfortable", "High-end", "Durable", "Heavy-duty",
@@ -31,64 +46,113 @@ COMPANY_TYPES = ["LLC", "Corp.", "Inc.", "GmbH", "S.A.", "Co.", "LLP", "PLC", "B
 COMPANY_NAME_COMPONENTS = (NAME_PREFIXES, NOUNS, COMPANY_TYPES)
 
 
+def split_checks(users: list[tuple[UUID, str]], num_checks: int, workers: int) -> list[list[tuple[UUID, str, int]]]:
+    '''
+    Split the checks of all the users into contiguous ranges of about the same size, one per worker, each one as its
+    parts per user: (user ID, user name, number of checks). A user's checks may be split among the workers
+    '''
+    total = len(users) * num_checks
+    workers = min(workers, total)
+    shares = []
+    for worker in range(workers):
+        start, end = total * worker // workers, total * (worker + 1) // workers
+        shares.append([(*users[user], min(end, (user + 1) * num_checks) - max(start, user * num_checks))
+                       for user in range(start // num_checks, (end - 1) // num_checks + 1)])
+    return shares
+
+
+def generate_checks(share: list[tuple[UUID, str, int]], num_items: int, date_start: datetime, days: int,
+                    name_prefixes: list[str], batch_size: int = BATCH_SIZE) -> None:
+    '''
+    Generate the given number of checks of each user, along with their items, and load them with COPY by batches.
+    Run by each worker process for its share of the checks
+    '''
+    titles = [' '.join(random.sample(name_prefixes, random.randint(3, 10))) + ' Item' for _ in range(TITLES)]
+    prices = [Decimal(cents) / 100 for cents in range(1000, 10001)]
+    quantities = list(range(1, 11))
+    payment_methods = list(PaymentMethod)
+    with session_scope() as session:
+        check_rows: list[dict[str, Any]] = []
+        item_rows: list[dict[str, Any]] = []
+        for creator_id, creator_name, num_checks in share:
+            created_ats = [date_start + timedelta(days=day) for day in random.choices(range(days), k=num_checks)]
+            for created_at in created_ats:
+                items: list[dict[str, Any]] = [
+                    dict(title=title, price=price, quantity=quantity, amount=calculate_amount(quantity, price),
+                         created_at=created_at)
+                    for title, price, quantity in zip(random.choices(titles, k=num_items),
+                                                      random.choices(prices, k=num_items),
+                                                      random.choices(quantities, k=num_items))]
+                paid_amount = Decimal(random.randint(10000, 50000)) / 100
+                total_amount = sum((item['amount'] for item in items), Decimal('0.00'))
+                check_row = dict(id=uuid4(), creator_id=creator_id, payment_method=random.choice(payment_methods),
+                                 paid_amount=paid_amount, total_amount=total_amount,
+                                 change=paid_amount - total_amount, additional_info=None, created_at=created_at)
+                check_row['repr'] = render_text(creator_name, check_row, items)
+                check_rows.append(check_row)
+                item_rows.extend({**item, 'check_id': check_row['id']} for item in items)
+                if len(check_rows) == batch_size:
+                    check_repo.insert_many(session, check_rows, item_rows, copy=True)
+                    session.commit()
+                    check_rows, item_rows = [], []
+        if check_rows:
+            check_repo.insert_many(session, check_rows, item_rows, copy=True)
+            session.commit()
+
+
 def populate_data(num_users: int = NUM_USERS, num_checks: int = NUM_CHECKS, num_items: int = NUM_ITEMS,
                   date_start: datetime = DATE_START, date_end: datetime = DATE_END,
-                  company_name_components: tuple[list[str], list[str], list[str]] = COMPANY_NAME_COMPONENTS
-                  ) -> list[dict[str, str]]:
+                  company_name_components: tuple[list[str], list[str], list[str]] = COMPANY_NAME_COMPONENTS,
+                  workers: int = WORKERS) -> list[dict[str, str]]:
+    '''
+    Seed the DB with the users having the given number of checks each, returns their logins and passwords.
+    The users share a password, so it's hashed once. The checks are split evenly among the worker processes, whatever
+    the number of users, each one loading them with COPY, with the totals, daily stats and text representations
+    computed beforehand
+    '''
     name_prefixes, nouns, company_types = company_name_components
+    # The stats rollups are bucketed by the UTC days of the checks, so the naive dates aren't left to the local zone
+    date_start, date_end = (date.replace(tzinfo=date.tzinfo or timezone.utc) for date in (date_start, date_end))
+    password = ''.join(random.choices(string.ascii_lowercase + string.digits, k=10))
+    hashed_password = Hash.encrypt(password)
+    user_rows: list[dict[str, Any]] = [dict(
+        id=uuid4(),
+        name=f'{" ".join(random.sample(name_prefixes, random.randint(1, 3)))} {random.choice(nouns)} '
+             f'{random.randint(10, 2100)} {random.choice(company_types)}',
+        login=f'user{i + 1}',
+        email=f'user{i + 1}@example.com',
+        password=hashed_password,
+    ) for i in range(num_users)]
     with session_scope() as session:
-        # Generate Users
-        users: list[User] = []
-        logins_passwords: list[dict[str, str]] = []
-        for i in range(num_users):
-            prefix = ' '.join(random.sample(name_prefixes, random.randint(1, 3)))
-            password = ''.join(random.choices(string.ascii_lowercase + string.digits, k=10))
-            user = User(
-                name=f'{prefix} {random.choice(nouns)} {random.randint(10, 2100)} {random.choice(company_types)}',
-                login=f'user{i + 1}',
-                email=f'user{i + 1}@example.com',
-                password=Hash.encrypt(password)
-            )
-            users.append(user)
-            logins_passwords.append({'login': user.login, 'password': password})
-        session.add_all(users)
-        session.flush()
-
-        # Generate Checks and Items for each User
-        items = []
-        for user in users:
-            session.refresh(user)
-            for _ in range(num_checks):
-                check = Check(
-                    creator_id=user.id,
-                    payment_method=random.choice(list(PaymentMethod)),
-                    paid_amount=Decimal(random.randint(10000, 50000)) / Decimal(100),
-                    created_at=random.choice(
-                        [date_start + timedelta(days=i) for i in range((date_end - date_start).days)]
-                    ))
-                session.add(check)
-                session.flush()
-                session.refresh(check)
-
-                # Generate Items for each Check
-                for _ in range(num_items):
-                    title = ' '.join(random.sample(name_prefixes, random.randint(3, 10)))
-                    item = Item(
-                        check_id=check.id,
-                        title=f'{title} Item',
-                        price=Decimal(random.randint(1000, 10000)) / Decimal(100),
-                        quantity=random.randint(1, 10),
-                    )
-                    items.append(item)
-        if items:
-            session.add_all(items)
+        create_partitions(session, date_start, date_end)
+        if user_rows:
+            copy_rows(session, cast(Table, User.__table__), user_rows)
         session.commit()
 
+    users = [(row['id'], row['name']) for row in user_rows]
+    days = (date_end - date_start).days
+    shares = split_checks(users, num_checks, workers)
+    if len(shares) > 1:
+        # The workers are forked, so they leave the inherited pool connections to the parent and open their own
+        with ProcessPoolExecutor(len(shares), initializer=engine.dispose, initargs=(False,)) as pool:
+            for future in [pool.submit(generate_checks, share, num_items, date_start, days, name_prefixes)
+                           for share in shares]:
+                future.result()
+    elif shares:
+        generate_checks(shares[0], num_items, date_start, days, name_prefixes)
+
     print(f'Inserted {num_users} users and {num_users * num_checks} checks into the DB')
+    logins_passwords = [{'login': row['login'], 'password': password} for row in user_rows]
     for mapping in logins_passwords:
         print(f'User login: {mapping["login"]}, password: {mapping["password"]}')
     return logins_passwords
 
 
 if __name__ == '__main__':
-    populate_data()
+    parser = argparse.ArgumentParser(description=populate_data.__doc__)
+    parser.add_argument('--users', type=int, default=NUM_USERS)
+    parser.add_argument('--checks', type=int, default=NUM_CHECKS, help='Number of checks per user')
+    parser.add_argument('--items', type=int, default=NUM_ITEMS, help='Number of items per check')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+    populate_data(args.users, args.checks, args.items, workers=args.workers)